@@ -1,29 +1,86 @@
 import asyncio
 import argparse
 
-from src.crawl import produce_matches, process_match, enqueue_matches
-from src.settings import CHECK_LATEST_RESULT_PAGE
+from src.crawl import produce_matches, discover_matches, consume_matches, enqueue_matches, queue
+from src.ingest import ingest_files
+from src.backfill import backfill
+from src.buffer import write_buffer
+from src.client import HTTPClient
+from src.dedup import known_matches
+from src.cache import response_cache
+from src.scheduler import Scheduler
+from src.export import exporter
+from src.models import DBConnection
+from src.migrate import migrate
+from src import metrics
+from src.settings import CHECK_LATEST_RESULT_PAGE, CHECK_LATEST_RESULT_INTERVAL, NUM_MATCH_CONSUMERS, WRITE_BEHIND, \
+    INGEST_PROCESSES
 
 
 parser = argparse.ArgumentParser(description='Crawl data from website.')
-parser.add_argument('--mode', required=True, choices=['daemon', 'result', 'match'], help='mode of the program')
-parser.add_argument('--related-url', required=True, type=str, help='related url could be used in all modes')
+parser.add_argument('--mode', required=True,
+                    choices=['daemon', 'discover', 'result', 'match', 'ingest', 'backfill', 'export', 'migrate'],
+                    help='mode of the program')
+parser.add_argument('--related-url', type=str,
+                    help='related url could be used in all modes, comma separated result page urls of leagues in '
+                         'daemon and discover modes, a directory or glob of XML files in ingest and backfill modes, '
+                         'the output directory in export mode, not used in migrate mode. discover mode queues all '
+                         'matches of the leagues at once, fetching their result pages concurrently')
 parser.add_argument('--num-latest-pages', type=int, default=CHECK_LATEST_RESULT_PAGE,
-                    help='number of result pages to check in daemon mode.')
+                    help='max number of result pages to check per poll in daemon mode, the first poll of a league '
+                         'checking all of them concurrently.')
+parser.add_argument('--interval', type=int, default=CHECK_LATEST_RESULT_INTERVAL,
+                    help='seconds between two polls of result pages in daemon mode.')
+parser.add_argument('--num-workers', type=int, default=NUM_MATCH_CONSUMERS,
+                    help='number of concurrent match consumers.')
+parser.add_argument('--num-processes', type=int, default=INGEST_PROCESSES,
+                    help='number of processes parsing XML files in ingest and backfill modes.')
+parser.add_argument('--league-name', type=str, help='league of the XML files in ingest and backfill modes.')
+parser.add_argument('--offline', action='store_true', help='replay from the response cache, without network access.')
 
 
 if __name__ == '__main__':
-    # TODO: write scheduler myself
     # result_entry_url = f'{RESULT_URL_BASE}?ctl={DEFAULT_LEAGUE}_s{DEFAULT_SEASON}'
     args = parser.parse_args()
+    if args.mode != 'migrate' and args.related_url is None:
+        parser.error(f'--related-url is required in {args.mode} mode')
+    if args.offline:
+        response_cache.offline = response_cache.enabled = True
     loop = asyncio.get_event_loop()
-    tasks = [process_match(loop)]
-    if args.mode == 'match':
-        tasks.append(enqueue_matches([args.related_url], loop, one_off=True))
-    elif args.mode == 'result':
-        tasks.append(produce_matches(args.related_url, loop, latest=1, one_off=True))
-    elif args.mode == 'daemon':
-        tasks.append(produce_matches(args.related_url, loop, latest=args.num_latest_pages))
+    try:
+        if args.mode == 'ingest':
+            loop.run_until_complete(ingest_files(args.related_url, loop, args.num_processes,
+                                                 league_name=args.league_name))
+        elif args.mode == 'backfill':
+            loop.run_until_complete(backfill(args.related_url, loop, args.num_processes, league_name=args.league_name))
+        elif args.mode == 'migrate':
+            pool = loop.run_until_complete(DBConnection.get_pool(loop))
+            loop.run_until_complete(migrate(pool, DBConnection.backend))
+        elif args.mode == 'export':
+            exporter.root_dir = args.related_url
+            loop.run_until_complete(exporter.export_from_db(loop))
+        else:
+            loop.run_until_complete(known_matches.warm_up(loop, queue.dead_urls()))
+            queue.release_leased()
+            tasks = [consume_matches(loop, args.num_workers)]
+            if WRITE_BEHIND:
+                tasks.append(write_buffer.run(loop))
+            if args.mode == 'match':
+                tasks.append(enqueue_matches([args.related_url], loop, one_off=True))
+            elif args.mode == 'discover':
+                tasks.append(discover_matches(args.related_url.split(','), loop))
+            elif args.mode == 'result':
+                tasks.append(produce_matches(args.related_url, loop, latest=1, one_off=True))
+            elif args.mode == 'daemon':
+                scheduler = Scheduler(args.related_url.split(','), args.interval, args.num_latest_pages)
+                tasks.append(scheduler.run(loop))
 
-    loop.run_until_complete(asyncio.wait(tasks))
+            metrics_task = asyncio.ensure_future(metrics.run(loop), loop=loop)
+            loop.run_until_complete(asyncio.wait(tasks))
+            metrics_task.cancel()
+            loop.run_until_complete(asyncio.wait([metrics_task]))
+            loop.run_until_complete(HTTPClient.close())
+            queue.close()
+    finally:
+        loop.run_until_complete(DBConnection.close())
     loop.close()
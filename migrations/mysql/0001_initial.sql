@@ -1,4 +1,4 @@
-create table `league` (
+create table if not exists `league` (
     `id` int(11) unsigned NOT NULL AUTO_INCREMENT,
     `short_url_name` varchar(32),
     `long_url_name` varchar(64),
@@ -7,7 +7,7 @@ create table `league` (
     PRIMARY KEY (`id`)
 );
 
-create table `team` (
+create table if not exists `team` (
     `id` int(11) NOT NULL,
     `name` varchar(128),
     `short_name` varchar(64),
@@ -15,7 +15,7 @@ create table `team` (
     PRIMARY KEY (`id`)
 );
 
-create table `player` (
+create table if not exists `player` (
     `id` int(11) NOT NULL,
     `name` varchar(128),
     `date_of_birth` date,
@@ -26,7 +26,7 @@ create table `player` (
     PRIMARY KEY (`id`)
 );
 
-create table `participation` (
+create table if not exists `participation` (
     `player_id` int(11),
     `match_id` int(11),
     `team_id` int(11),
@@ -37,7 +37,7 @@ create table `participation` (
     PRIMARY KEY (`player_id`, `match_id`, `team_id`)
 );
 
-create table `match` (
+create table if not exists `match` (
     `id` int(11) NOT NULL,
     `url` varchar(1024),
     `league_name` varchar(64),
@@ -52,7 +52,7 @@ create table `match` (
     PRIMARY KEY (`id`)
 );
 
-create table `event` (
+create table if not exists `event` (
     `id` int(11) unsigned NOT NULL AUTO_INCREMENT,
     `player_id` int(11),
     `counterparty_id` int(11),
@@ -0,0 +1,7 @@
+-- event is partitioned by match, so that reading the events of a match touches a single partition whatever the
+-- number of seasons in the table. MySQL requires the partitioning column in every unique key, the primary key
+-- included, hence the (id, match_id) primary key.
+
+alter table `event` drop primary key, add primary key (`id`, `match_id`);
+
+alter table `event` partition by hash (`match_id`) partitions 32;
@@ -0,0 +1,81 @@
+create table if not exists `league` (
+    `id` integer PRIMARY KEY,
+    `short_url_name` varchar(32),
+    `long_url_name` varchar(64),
+    `human_readable_name` varchar(128),
+    `row_cre_ts` datetime DEFAULT current_timestamp
+);
+
+create table if not exists `team` (
+    `id` integer NOT NULL PRIMARY KEY,
+    `name` varchar(128),
+    `short_name` varchar(64),
+    `row_cre_ts` datetime DEFAULT current_timestamp
+);
+
+create table if not exists `player` (
+    `id` integer NOT NULL PRIMARY KEY,
+    `name` varchar(128),
+    `date_of_birth` date,
+    `weight` float,
+    `height` float,
+    `country` varchar(128),
+    `row_cre_ts` datetime DEFAULT current_timestamp
+);
+
+create table if not exists `participation` (
+    `player_id` integer,
+    `match_id` integer,
+    `team_id` integer,
+    `init_loc_0` float,
+    `init_loc_1` float,
+    `position` varchar(32),
+    `row_cre_ts` datetime DEFAULT current_timestamp,
+    PRIMARY KEY (`player_id`, `match_id`, `team_id`)
+);
+
+create table if not exists `match` (
+    `id` integer NOT NULL PRIMARY KEY,
+    `url` varchar(1024),
+    `league_name` varchar(64),
+    `kickoff_time` datetime,
+    `stadium` varchar(128),
+    `summary` varchar(256),
+    `home_team_id` integer,
+    `away_team_id` integer,
+    `home_score` integer DEFAULT 0,
+    `away_score` integer DEFAULT 0,
+    `row_cre_ts` datetime DEFAULT current_timestamp
+);
+
+create table if not exists `event` (
+    `id` integer PRIMARY KEY,
+    `player_id` integer,
+    `counterparty_id` integer,
+    `match_id` integer NOT NULL,
+    `minsec` integer NOT NULL,
+    `event_type` varchar(32),
+
+    `start_0` float,
+    `start_1` float,
+    `end_0` float,
+    `end_1` float,
+
+    `yz_plane_coord_0` float,
+    `yz_plane_coord_1` float,
+
+    `a` tinyint(1),
+    `action_type` varchar(32),
+    `card_type` varchar(16),
+    `gy` float,
+    `gz` float,
+    `headed` tinyint(1),
+    `injurytime_play` tinyint(1),
+    `k` tinyint(1),
+    `ot_id` integer,
+    `ot_outcome` tinyint(1),
+    `throw_ins` tinyint(1),
+    `type` varchar(32),
+    `uid` varchar(16),
+    `row_cre_ts` datetime DEFAULT current_timestamp
+);
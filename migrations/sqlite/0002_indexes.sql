@@ -0,0 +1,7 @@
+-- indexes of the access paths: dedup and exists_in_db by url, events of a match (by type), events of a player
+
+create index if not exists `idx_match_url` on `match` (`url`);
+
+create index if not exists `idx_event_match_type` on `event` (`match_id`, `event_type`);
+
+create index if not exists `idx_event_player_match` on `event` (`player_id`, `match_id`);
@@ -0,0 +1,2 @@
+-- SQLite has no table partitioning, the events of a match are found through idx_event_match_type instead.
+-- This version is kept so that both backends share the same schema versions.
@@ -0,0 +1,175 @@
+import os
+import datetime
+
+from .ingest import ingest_files
+from .export import exporter
+from .models import Match, Event, DBConnection
+from .storage import MySQLBackend
+from .settings import logger, INGEST_PROCESSES, BACKFILL_STAGING_DIR
+
+# secondary indexes of event, dropped during a load and rebuilt after it, see migrations/mysql/0002_indexes.sql
+EVENT_SECONDARY_INDEXES = {
+    'idx_event_match_type': '(`match_id`, `event_type`)',
+    'idx_event_player_match': '(`player_id`, `match_id`)',
+}
+
+
+def to_tsv_field(v):
+    """A value in the default format of LOAD DATA: tab separated, backslash escaped, \\N for NULL."""
+    if v is None:
+        return '\\N'
+    elif isinstance(v, bool):
+        return '1' if v else '0'
+    elif isinstance(v, datetime.datetime):
+        return v.strftime('%Y-%m-%d' if v.time() == datetime.time() else '%Y-%m-%d %H:%M:%S')
+    return str(v).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class StagingFiles:
+    """One TSV file per table, which the rows of parsed matches are appended to as they come. Rows of tables keyed
+    by a natural primary key (team, player, participation, match) are written once per key, as the same players
+    and teams appear in many matches.
+
+    :param staging_dir: directory of the files, created if needed
+    :param skip_match_ids: ids of the matches not to write, e.g. the ones already in DB
+    """
+    def __init__(self, staging_dir=BACKFILL_STAGING_DIR, skip_match_ids=()):
+        self.staging_dir = staging_dir
+        self.skip_match_ids = set(skip_match_ids)
+        self.match_ids = set()
+        self.num_matches = 0
+        self.num_rows = {}
+        self.columns = {}
+        self._files = {}
+        self._seen = {}
+        os.makedirs(staging_dir, exist_ok=True)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.staging_dir}: {self.num_matches} matches)'
+
+    def get_path(self, model):
+        return os.path.join(self.staging_dir, f'{model.__table_name__}.tsv')
+
+    @property
+    def models(self):
+        """The models with rows, in the order their tables should be loaded."""
+        return list(self._files)
+
+    def _write(self, model, rows):
+        if model not in self._files:
+            self._files[model] = open(self.get_path(model), 'w', encoding='utf-8', newline='\n')
+            self._seen[model] = set()
+            self.num_rows[model] = 0
+        f, seen, keyed = self._files[model], self._seen[model], model is not Event
+        for r in rows:
+            if self.columns.setdefault(model, tuple(r)) != tuple(r):
+                raise ValueError(f'Rows of {model.__table_name__} have different columns: {tuple(r)}.')
+            if keyed:
+                key = tuple(r[k] for k in model.__pk__)
+                if key in seen:
+                    continue
+                seen.add(key)
+            f.write('\t'.join(to_tsv_field(v) for v in r.values()) + '\n')
+            self.num_rows[model] += 1
+
+    async def add(self, match):
+        """:param match: Match or MatchRows"""
+        if match.id in self.skip_match_ids:
+            logger.info(f'Match <<< {match} >>> already exists in DB.')
+            return
+        self.skip_match_ids.add(match.id)
+        for model, rows in match.iter_table_rows():
+            self._write(model, rows)
+        self.match_ids.add(match.id)
+        self.num_matches += 1
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+    def remove(self):
+        self.close()
+        for model in self.models:
+            os.remove(self.get_path(model))
+
+
+def _load_data_sql(table_name, col_names):
+    return f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table_name}` CHARACTER SET utf8mb4 " \
+           f"({','.join([f'`{k}`' for k in col_names])})"
+
+
+def _upsert_from_staging_sql(table_name, col_names, pk):
+    cols = ','.join([f'`{k}`' for k in col_names])
+    col_name_values = ','.join([f'`{k}`=VALUES(`{k}`)' for k in col_names if k not in pk])
+    return f"INSERT INTO `{table_name}` ({cols}) SELECT {cols} FROM `{table_name}_staging`" + \
+           (f" ON DUPLICATE KEY UPDATE {col_name_values}" if col_name_values else '')
+
+
+async def load_staging_files(conn, staging):
+    """Loads the staging files with LOAD DATA LOCAL INFILE on conn (which must allow local_infile), in a single
+    transaction. Keyed tables are loaded into a temporary copy first and upserted from it, so rows already in DB
+    (players and teams mostly) are updated rather than rejected. Events are loaded straight into their table, with
+    its secondary indexes dropped beforehand and rebuilt in one pass afterwards, failure or not."""
+    async with conn.cursor() as cur:
+        if Event in staging.models:
+            await cur.execute('ALTER TABLE `event` ' + ', '.join([f'DROP INDEX IF EXISTS `{i}`'
+                                                                   for i in EVENT_SECONDARY_INDEXES]))
+        try:
+            await conn.begin()
+            for model in staging.models:
+                table_name, col_names = model.__table_name__, staging.columns[model]
+                logger.info(f'Loading {staging.num_rows[model]} rows into {table_name}.')
+                if model is Event:
+                    await cur.execute('SET SESSION unique_checks = 0')
+                    await cur.execute(_load_data_sql(table_name, col_names), (staging.get_path(model),))
+                    await cur.execute('SET SESSION unique_checks = 1')
+                    continue
+                await cur.execute(f'CREATE TEMPORARY TABLE `{table_name}_staging` LIKE `{table_name}`')
+                try:
+                    await cur.execute(_load_data_sql(f'{table_name}_staging', col_names),
+                                      (staging.get_path(model),))
+                    await cur.execute(_upsert_from_staging_sql(table_name, col_names, model.__pk__))
+                finally:
+                    await cur.execute(f'DROP TEMPORARY TABLE IF EXISTS `{table_name}_staging`')
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            if Event in staging.models:
+                logger.info('Rebuilding the secondary indexes of event.')
+                await cur.execute('ALTER TABLE `event` ' + ', '.join([f'ADD INDEX IF NOT EXISTS `{i}` {cols}'
+                                                                       for i, cols in EVENT_SECONDARY_INDEXES.items()]))
+
+
+async def backfill(path, loop, num_processes=INGEST_PROCESSES, league_name=None, staging_dir=BACKFILL_STAGING_DIR):
+    """Cold-start rebuild out of archived ingame XML files: matches are parsed as in ingest_files, but written to
+    per-table staging files and bulk loaded with LOAD DATA LOCAL INFILE at the end, which is several times faster
+    than INSERTs for seasons worth of events. Matches already in DB are skipped. Staging files are removed once
+    loaded, and kept for inspection if the load fails. The matches staged are exported once the load commits.
+
+    Bulk loading is MySQL only, other backends fall back to ingest_files.
+
+    :return: number of matches loaded
+    """
+    backend = DBConnection.backend
+    if not isinstance(backend, MySQLBackend):
+        logger.warn(f'{backend} has no bulk load, ingesting {path} instead.')
+        return await ingest_files(path, loop, num_processes, league_name=league_name)
+
+    staging = StagingFiles(staging_dir, skip_match_ids=await Match.all_values(loop, 'id'))
+    try:
+        await ingest_files(path, loop, num_processes, league_name=league_name, sink=staging.add)
+    finally:
+        staging.close()
+    logger.info(f'Staged {staging}, loading it.')
+
+    conn = await backend.connect(loop, local_infile=True)
+    try:
+        await load_staging_files(conn, staging)
+    finally:
+        conn.close()
+    staging.remove()
+    if exporter.enabled:
+        await exporter.export_from_db(loop, overwrite=True, match_ids=staging.match_ids)
+    return staging.num_matches
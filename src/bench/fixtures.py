@@ -0,0 +1,64 @@
+"""Test fixtures for the benchmarks, and a generator scaling them up to N times as many players and events."""
+import os
+import copy
+import xml.etree.ElementTree as ET
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test')
+FIXTURES = [(os.path.join(TEST_DIR, 'squawka.xml'), 34267), (os.path.join(TEST_DIR, 'squawka2.xml'), 34253)]
+
+# ids of the players of the k-th copy are shifted by k * PLAYER_ID_OFFSET, far above any real squawka player id
+PLAYER_ID_OFFSET = 10000000
+# attributes and child elements of an event that hold a player id
+PLAYER_ID_ATTRIBS = ('player_id', 'other_player')
+PLAYER_ID_CHILDREN = ('tackler', 'otherplayer')
+
+
+def _shift_player_id(v, offset):
+    return str(int(v) + offset) if v and v.isdigit() else v
+
+
+def _shift_event(event, offset):
+    event = copy.deepcopy(event)
+    for attr in PLAYER_ID_ATTRIBS:
+        if attr in event.attrib:
+            event.set(attr, _shift_player_id(event.get(attr), offset))
+    for tag in PLAYER_ID_CHILDREN:
+        child = event.find(tag)
+        if child is not None:
+            child.text = _shift_player_id(child.text, offset)
+    return event
+
+
+def scale_root(root, factor):
+    """Returns a copy of the ingame XML root with factor times as many players and events: every player gets
+    factor - 1 clones with shifted ids, and every event gets one clone per player clone, in the same time slice.
+
+    :param root: root element of an ingame XML
+    :param factor: int >= 1, 1 returns an unchanged copy
+    """
+    root = copy.deepcopy(root)
+    data_panel = root.find('data_panel')
+    players = data_panel.find('players')
+    originals = list(players)
+    for k in range(1, factor):
+        for p in originals:
+            clone = copy.deepcopy(p)
+            clone.set('id', _shift_player_id(p.get('id'), k * PLAYER_ID_OFFSET))
+            players.append(clone)
+
+    for event_group in data_panel.find('filters'):
+        for time_slice in event_group.findall('time_slice'):
+            events = time_slice.findall('event')
+            for k in range(1, factor):
+                time_slice.extend(_shift_event(e, k * PLAYER_ID_OFFSET) for e in events)
+    return root
+
+
+def load_fixture(path, factor=1):
+    root = ET.parse(path).getroot()
+    return root if factor == 1 else scale_root(root, factor)
+
+
+def write_scaled_fixture(path, factor, out_path):
+    """Writes the fixture at path scaled by factor to out_path, e.g. to feed ingest with bigger files."""
+    ET.ElementTree(load_fixture(path, factor)).write(out_path, encoding='utf-8', xml_declaration=True)
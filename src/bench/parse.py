@@ -0,0 +1,75 @@
+"""Benchmark of parsing match XML into models, on the (optionally scaled) test fixtures.
+
+Run from the repo root: python -m src.bench.parse
+"""
+import os
+import time
+import json
+import tracemalloc
+
+from ..models import Match, EventGroup, PlayerPool, TeamPool
+from .fixtures import FIXTURES, load_fixture
+
+
+def _best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def peak_memory(fn):
+    """Peak bytes allocated by Python while running fn, on top of what was allocated before."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_match_construction(root, match_id, repeat=20):
+    """Times Match construction out of an already parsed ElementTree, i.e. model building only."""
+    match, timings = _best_of(lambda: Match('dummy_url', root, match_id), repeat)
+    num_events = sum(len(eg.events) for eg in match.event_groups)
+    del match
+    PlayerPool.clear()
+    TeamPool.clear()
+    return {
+        'num_events': num_events,
+        'best_ms': min(timings) * 1000,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+        'events_per_sec': num_events / min(timings),
+        'peak_memory_kb': peak_memory(lambda: Match('dummy_url', root, match_id)) / 1024,
+    }
+
+
+def bench_event_classes(root, match_id, repeat=20):
+    """Events parsed per second for each event_class tag (the filters of the ingame XML)."""
+    results = {}
+    for f in root.find('data_panel').find('filters'):
+        eg, timings = _best_of(lambda: EventGroup(f, match_id), repeat)
+        if eg.events:
+            results[f.tag] = {'num_events': len(eg.events), 'events_per_sec': len(eg.events) / min(timings)}
+    return results
+
+
+def run(factors=(1,), repeat=20):
+    results = []
+    for path, match_id in FIXTURES:
+        for factor in factors:
+            root = load_fixture(path, factor)
+            results.append({'fixture': os.path.basename(path), 'scale': factor,
+                            'match': bench_match_construction(root, match_id, repeat),
+                            'event_classes': bench_event_classes(root, match_id, repeat)})
+    return results
+
+
+def main():
+    print(json.dumps(run(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
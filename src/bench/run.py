@@ -0,0 +1,84 @@
+"""Runs the parse and save benchmarks on the test fixtures scaled by each factor, writes the results as JSON and
+checks them against regression thresholds (thresholds.json next to this file by default).
+
+Run from the repo root: python -m src.bench.run --scale 1,4 --output bench.json --check
+The exit status is 1 if any threshold is violated with --check.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+from . import parse, save
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+# event classes with fewer events than this in a fixture are too noisy to be checked
+MIN_EVENTS_CHECKED = 50
+
+
+def _measures(parse_result, save_result):
+    """The measures the thresholds apply to, out of the results of a fixture at a scale."""
+    match = parse_result['match']
+    event_classes = [v['events_per_sec'] for v in parse_result['event_classes'].values()
+                     if v['num_events'] >= MIN_EVENTS_CHECKED]
+    return {
+        'match_events_per_sec': match['events_per_sec'],
+        'event_class_events_per_sec': min(event_classes) if event_classes else None,
+        'peak_memory_bytes_per_event': match['peak_memory_kb'] * 1024 / match['num_events'],
+        'save_rows_per_sec': save_result['save']['rows_per_sec'],
+    }
+
+
+def check(results, thresholds):
+    """Returns the list of violations, as human readable strings."""
+    violations = []
+    for r in results:
+        for name, value in r['measures'].items():
+            bounds = thresholds.get(name, {})
+            if value is None:
+                continue
+            if 'min' in bounds and value < bounds['min']:
+                violations.append(f"{r['fixture']} x{r['scale']}: {name} = {value:.1f} < {bounds['min']}")
+            if 'max' in bounds and value > bounds['max']:
+                violations.append(f"{r['fixture']} x{r['scale']}: {name} = {value:.1f} > {bounds['max']}")
+    return violations
+
+
+def run(factors, repeat, db='stand-in'):
+    loop = asyncio.new_event_loop()
+    try:
+        parse_results = parse.run(factors, repeat)
+        save_results = save.run(loop, factors, repeat, db)
+    finally:
+        loop.close()
+    return [dict(p, save=s['save'], measures=_measures(p, s)) for p, s in zip(parse_results, save_results)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark parse and save throughput.')
+    parser.add_argument('--scale', type=str, default='1,4', help='comma separated scale factors of the fixtures.')
+    parser.add_argument('--repeat', type=int, default=20, help='number of timed runs, the best one is reported.')
+    parser.add_argument('--db', choices=['stand-in', 'sqlite'], default='stand-in',
+                        help='what Match.save writes to: a stand-in of the MySQL pool or an embedded SQLite file.')
+    parser.add_argument('--output', type=str, help='file to write the JSON results to, stdout by default.')
+    parser.add_argument('--thresholds', type=str, default=THRESHOLDS_PATH, help='JSON file of regression thresholds.')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if a threshold is violated.')
+    args = parser.parse_args(argv)
+
+    results = run([int(f) for f in args.scale.split(',')], args.repeat, args.db)
+    with open(args.thresholds) as f:
+        violations = check(results, json.load(f))
+    report = json.dumps({'results': results, 'violations': violations}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print(report)
+    for v in violations:
+        print(f'Threshold violated: {v}', file=sys.stderr)
+    return 1 if args.check and violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
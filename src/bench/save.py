@@ -0,0 +1,159 @@
+"""Benchmark of Match.save throughput against a local stand-in of the DB pool, or an embedded SQLite database.
+
+The stand-in cursor does the client-side work of aiomysql (matching the multi-row INSERT form of executemany,
+escaping every value and rendering the statements) but never touches the network, so what's measured is the cost
+on our side of a save: building rows, skipping pooled ones, grouping and rendering them. It speaks MySQL only, so
+the statements are built by MySQLBackend whatever the backend configured. With db='sqlite' the rows are really
+written, into a temporary file.
+
+Run from the repo root: python -m src.bench.save [stand-in|sqlite]
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import tempfile
+
+from aiomysql.cursors import RE_INSERT_VALUES
+from pymysql.converters import escape_item
+
+from ..models import Match, DBConnection, PlayerPool, TeamPool
+from ..storage import MySQLBackend, SQLiteBackend
+from .fixtures import FIXTURES, load_fixture
+
+
+class StandInCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    @staticmethod
+    def _render(sql, args):
+        return sql % tuple(escape_item(v, 'utf8mb4') for v in args) if args else sql
+
+    async def execute(self, sql, args=None):
+        self.conn.record(self._render(sql, args))
+
+    async def executemany(self, sql, args):
+        m = RE_INSERT_VALUES.match(sql)
+        if m is None:
+            for a in args:
+                await self.execute(sql, a)
+            return
+        values = m.group(2).rstrip()
+        self.conn.record(m.group(1) + ','.join(self._render(values, a) for a in args) + (m.group(3) or ''))
+
+    async def fetchone(self):
+        return 0,
+
+    async def fetchall(self):
+        return []
+
+
+class StandInConnection:
+    def __init__(self):
+        self.num_statements = 0
+        self.num_bytes = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def record(self, statement):
+        self.num_statements += 1
+        self.num_bytes += len(statement.encode('utf-8', 'surrogateescape'))
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class StandInPool:
+    def __init__(self):
+        self.conn = StandInConnection()
+
+    def acquire(self):
+        return self.conn
+
+
+async def _forget(match, loop):
+    """Makes the next save of match write every table in full again."""
+    PlayerPool.clear()
+    TeamPool.clear()
+    pool = await DBConnection.get_pool(loop)
+    if not isinstance(pool, StandInPool):
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f'DELETE FROM `match` WHERE `id` = {DBConnection.backend.placeholder}', (match.id,))
+                await conn.commit()
+
+
+def bench_match_save(root, match_id, loop, repeat=20, db='stand-in'):
+    """Times Match.save of the same match repeat times, the match being forgotten before each save."""
+    backend, pool = DBConnection.backend, DBConnection._pool
+    tmp_dir = tempfile.TemporaryDirectory()
+    if db == 'sqlite':
+        DBConnection.backend, DBConnection._pool = SQLiteBackend({'path': os.path.join(tmp_dir.name, 'db')}), None
+    else:
+        DBConnection.backend, DBConnection._pool = MySQLBackend({}), StandInPool()
+    try:
+        match = Match('dummy_url', root, match_id)
+        num_rows = sum(len(rows) for _, rows in match.iter_table_rows())
+        timings = []
+        for _ in range(repeat):
+            loop.run_until_complete(_forget(match, loop))
+            start = time.perf_counter()
+            loop.run_until_complete(match.save(loop))
+            timings.append(time.perf_counter() - start)
+        result = {
+            'db': db,
+            'num_rows': num_rows,
+            'best_ms': min(timings) * 1000,
+            'mean_ms': sum(timings) / len(timings) * 1000,
+            'rows_per_sec': num_rows / min(timings),
+        }
+        if db != 'sqlite':
+            conn = DBConnection._pool.conn
+            result.update(num_statements=conn.num_statements // repeat, statement_kb=conn.num_bytes / repeat / 1024)
+        return result
+    finally:
+        if db == 'sqlite':
+            loop.run_until_complete(DBConnection.close())
+        DBConnection.backend, DBConnection._pool = backend, pool
+        PlayerPool.clear()
+        TeamPool.clear()
+        tmp_dir.cleanup()
+
+
+def run(loop, factors=(1,), repeat=20, db='stand-in'):
+    return [{'fixture': os.path.basename(path), 'scale': factor,
+             'save': bench_match_save(load_fixture(path, factor), match_id, loop, repeat, db)}
+            for path, match_id in FIXTURES for factor in factors]
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    try:
+        print(json.dumps(run(loop, db=sys.argv[1] if len(sys.argv) > 1 else 'stand-in'), indent=2))
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import time
+import asyncio
+
+from .models import Event, save_in_transaction
+from .metrics import registry
+from .utils import backoff
+from .settings import logger, WRITE_BUFFER_MAX_ROWS, WRITE_BUFFER_MAX_BYTES, WRITE_BUFFER_MAX_AGE, \
+    WRITE_BUFFER_MAX_RETRY_INTERVAL
+
+
+class WriteBuffer:
+    """Write-behind buffer that collects pending rows per table from all in-flight matches and writes them
+    in one transaction whenever it holds too many rows, too many bytes or its oldest row gets too old.
+
+    Rows of tables keyed by a natural primary key (team, player, participation, match) are coalesced by that
+    key, so a player appearing in many buffered matches is upserted only once per flush. Callers of add are
+    held back while the buffer is over twice its limits, which slows the save stage down to the DB's pace.
+
+    Matches being flushed count as buffered until their transaction commits, and the rows of a failed flush are
+    put back into the buffer, to be written by the next one."""
+    def __init__(self, max_rows=WRITE_BUFFER_MAX_ROWS, max_bytes=WRITE_BUFFER_MAX_BYTES, max_age=WRITE_BUFFER_MAX_AGE):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+        self._flushing_ids = set()
+        self._flushing_on_saved = []
+        self._adding = {}  # match id -> asyncio.Event set once the add of the match is over
+        self._reset()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} (rows: {self.num_rows}, bytes: {self.num_bytes}, ' \
+               f'matches: {len(self._match_ids)})'
+
+    def _reset(self):
+        self._pending = {}
+        self._match_ids = set()
+        self._replace_ids = set()
+        self._on_saved = []
+        self.num_rows = 0
+        self.num_bytes = 0
+        self._oldest = None
+
+    @staticmethod
+    def _sizeof(row):
+        return sum(len(str(v)) for v in row.values())
+
+    @property
+    def age(self):
+        return 0 if self._oldest is None else time.monotonic() - self._oldest
+
+    def is_full(self, factor=1):
+        return self.num_rows >= self.max_rows * factor or self.num_bytes >= self.max_bytes * factor
+
+    def is_stale(self):
+        return self.num_rows > 0 and self.age >= self.max_age
+
+    def contains_match(self, match_id):
+        return match_id in self._match_ids or match_id in self._flushing_ids
+
+    def _add_rows(self, model, rows):
+        keyed = model is not Event
+        table_rows = self._pending.setdefault(model, {} if keyed else [])
+        for r in rows:
+            if keyed:
+                key = tuple(r.get(k) for k in model.__pk__)
+                if key in table_rows:
+                    self.num_bytes -= self._sizeof(table_rows[key])
+                    self.num_rows -= 1
+                table_rows[key] = r
+            else:
+                table_rows.append(r)
+            self.num_bytes += self._sizeof(r)
+            self.num_rows += 1
+
+    async def add(self, match, loop, on_saved=None, on_committed=None, replace=False):
+        """Buffers all rows of match unless it's already buffered or in DB, flushing first if the buffer is
+        over its hard limit. on_saved is called once the rows are committed, or right away if they're in DB.
+        on_committed is called only once the rows buffered by this very call are committed. With replace, the
+        rows of match in DB are replaced by the flush, see save_in_transaction.
+
+        The match id is reserved before anything is awaited, so a concurrent add of the same match waits for this
+        one to be over and then finds the match buffered or in DB."""
+        adding = self._adding.get(match.id)
+        if adding is not None:
+            await adding.wait()
+            return await self.add(match, loop, on_saved, on_committed, replace)
+        if self.contains_match(match.id):
+            logger.info('Match <<< {} >>> is already buffered.'.format(match))
+            if on_saved is not None:
+                (self._flushing_on_saved if match.id in self._flushing_ids else self._on_saved).append(on_saved)
+            return
+
+        self._adding[match.id] = asyncio.Event()
+        try:
+            if not replace and await match.exists_in_db(loop, {'id': match.id}):
+                logger.info('Match <<< {} >>> already exists in DB.'.format(match))
+                if on_saved is not None:
+                    on_saved()
+                return
+
+            while self.is_full(factor=2):
+                logger.info(f'{self} is full, waiting for it to be flushed.')
+                await self.flush(loop)
+
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._match_ids.add(match.id)
+            if replace:
+                self._replace_ids.add(match.id)
+            self._on_saved.extend(c for c in (on_saved, on_committed) if c is not None)
+            for model, rows in match.iter_table_rows():
+                self._add_rows(model, rows)
+        finally:
+            self._adding.pop(match.id).set()
+
+        if self.is_full() or self.is_stale():
+            try:
+                await self.flush(loop)
+            except Exception:
+                pass  # rows of match are kept in the buffer, on_saved gets called once a later flush commits them
+
+    def _restore(self, table_rows, match_ids, replace_ids, on_saved, oldest):
+        """Puts the rows of a failed flush back, under the rows buffered since, which are newer."""
+        newer_rows, newer_match_ids, newer_replace_ids, newer_on_saved, newer_oldest = \
+            self._pending, self._match_ids, self._replace_ids, self._on_saved, self._oldest
+        self._reset()
+        for model, rows in table_rows:
+            self._add_rows(model, rows)
+        for model, rows in newer_rows.items():
+            self._add_rows(model, rows.values() if isinstance(rows, dict) else rows)
+        self._match_ids = match_ids | newer_match_ids
+        self._replace_ids = replace_ids | newer_replace_ids
+        self._on_saved = on_saved + newer_on_saved
+        self._oldest = oldest if newer_oldest is None else min(oldest, newer_oldest)
+
+    async def flush(self, loop):
+        async with self._flush_lock:
+            if self.num_rows == 0:
+                return
+            pending, match_ids, replace_ids, num_rows, oldest = \
+                self._pending, self._match_ids, self._replace_ids, self.num_rows, self._oldest
+            self._flushing_ids, self._flushing_on_saved = match_ids, self._on_saved
+            self._reset()
+            logger.info(f'Flushing {num_rows} buffered rows of {len(match_ids)} matches.')
+            table_rows = [(model, list(rows.values()) if isinstance(rows, dict) else rows)
+                          for model, rows in pending.items()]
+            try:
+                await save_in_transaction(loop, table_rows, replace_match_ids=replace_ids)
+            except Exception as e:
+                logger.error(f'Failed to flush buffered rows of matches {sorted(match_ids)}, keeping them for the '
+                             f'next flush. err_msg: {e}')
+                self._restore(table_rows, match_ids, replace_ids, self._flushing_on_saved, oldest)
+                raise
+            else:
+                on_saved = self._flushing_on_saved
+            finally:
+                self._flushing_ids, self._flushing_on_saved = set(), []
+            for callback in on_saved:
+                callback()
+
+    async def run(self, loop):
+        """Flushes the buffer whenever its oldest row exceeds max_age, until close is called. A failed flush is
+        retried with backoff, the rows staying in the buffer meanwhile."""
+        num_failures = 0
+        while not self._closed:
+            await asyncio.sleep(min(self.max_age, 1))
+            if not self.is_stale():
+                continue
+            try:
+                await self.flush(loop)
+                num_failures = 0
+            except Exception as e:
+                num_failures += 1
+                delay = backoff(num_failures, min(self.max_age, 1), WRITE_BUFFER_MAX_RETRY_INTERVAL)
+                logger.warn(f'Flush #{num_failures} of {self} failed, retrying in {delay:.1f}s. err_msg: {e}')
+                await asyncio.sleep(delay)
+
+    async def close(self, loop):
+        self._closed = True
+        await self.flush(loop)
+
+
+write_buffer = WriteBuffer()
+registry.gauge('squawka_write_buffer_rows', 'Rows waiting in the write buffer.', lambda: write_buffer.num_rows)
@@ -0,0 +1,118 @@
+import os
+import gzip
+import json
+import hashlib
+
+from .settings import logger, CACHE_ENABLED, CACHE_DIR, CACHE_OFFLINE, PARSER_VERSION
+
+
+class CacheEntry:
+    __slots__ = ('url', 'content_hash', 'etag', 'last_modified', 'encoding')
+
+    def __init__(self, url, content_hash, etag=None, last_modified=None, encoding=None):
+        self.url = url
+        self.content_hash = content_hash
+        self.etag = etag
+        self.last_modified = last_modified
+        self.encoding = encoding
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.url}: {self.content_hash})'
+
+    def to_dict(self):
+        return {f: getattr(self, f) for f in self.__slots__}
+
+
+class ResponseCache:
+    """On-disk cache of raw HTTP responses, keyed by url.
+
+    Bodies are gzip-compressed and content-addressed (blobs/<sha1[:2]>/<sha1>.gz, so identical bodies are stored
+    once), per-url metadata (content hash, ETag, Last-Modified, encoding) lives in meta/<sha1(url)>.json. Cached
+    urls are revalidated with If-None-Match / If-Modified-Since, and in offline mode they are served without
+    any network access at all. It also remembers which content of which match has been processed by which
+    PARSER_VERSION, see crawl.check_processed."""
+    def __init__(self, cache_dir=CACHE_DIR, enabled=CACHE_ENABLED, offline=CACHE_OFFLINE):
+        self.cache_dir = cache_dir
+        self.enabled = enabled or offline
+        self.offline = offline
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.cache_dir}{", offline" if self.offline else ""})'
+
+    @staticmethod
+    def _hash(data):
+        return hashlib.sha1(data).hexdigest()
+
+    def _path(self, kind, key, ext):
+        return os.path.join(self.cache_dir, kind, key[:2], f'{key}{ext}')
+
+    def _meta_path(self, url):
+        return self._path('meta', self._hash(url.encode()), '.json')
+
+    @staticmethod
+    def _write_atomically(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, url):
+        if not self.enabled:
+            return None
+        try:
+            with open(self._meta_path(url)) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        return CacheEntry(**{f: meta.get(f) for f in CacheEntry.__slots__})
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def read(self, entry):
+        with gzip.open(self._path('blobs', entry.content_hash, '.gz'), 'rb') as f:
+            return f.read()
+
+    def store(self, url, body, headers=None, encoding=None, persist=True):
+        headers = headers or {}
+        entry = CacheEntry(url, self._hash(body), headers.get('ETag'), headers.get('Last-Modified'), encoding)
+        if not self.enabled or not persist:
+            return entry
+        blob_path = self._path('blobs', entry.content_hash, '.gz')
+        if not os.path.exists(blob_path):
+            self._write_atomically(blob_path, gzip.compress(body))
+        self._write_atomically(self._meta_path(url), json.dumps(entry.to_dict()).encode())
+        logger.debug(f'Cached {entry}')
+        return entry
+
+    def _processed_path(self, url):
+        return self._path('processed', self._hash(url.encode()), '')
+
+    def get_processed(self, url):
+        """The (parser version, content hash) processed for url last time, None if it never was."""
+        if not self.enabled:
+            return None
+        try:
+            with open(self._processed_path(url)) as f:
+                version, _, content_hash = f.read().partition(':')
+        except FileNotFoundError:
+            return None
+        return int(version), content_hash
+
+    def is_processed(self, url, content_hash):
+        """Whether content_hash is what has been processed for url last time, by the current PARSER_VERSION."""
+        return self.get_processed(url) == (PARSER_VERSION, content_hash)
+
+    def mark_processed(self, url, content_hash):
+        if self.enabled and content_hash is not None:
+            self._write_atomically(self._processed_path(url), f'{PARSER_VERSION}:{content_hash}'.encode())
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,71 @@
+from aiohttp import ClientSession, TCPConnector
+
+from .cache import response_cache
+from .error import NotInCache, RetryableHTTPError
+from .ratelimit import rate_limiter
+from .utils import parse_retry_after
+from .settings import HTTP_POOL_SIZE, HTTP_POOL_SIZE_PER_HOST, HTTP_KEEPALIVE_TIMEOUT, HTTP_DNS_CACHE_TTL, \
+    HTTP_CONN_TIMEOUT, HTTP_READ_TIMEOUT, STREAM_CHUNK_SIZE, RETRYABLE_STATUSES
+
+
+class HTTPClient:
+    """Application-wide HTTP session: one keep-alive connection pool (with per-host limits and a DNS cache) shared
+    by every result page and match fetch, closed once at shutdown."""
+    _session = None
+
+    @classmethod
+    def get_session(cls, loop):
+        if cls._session is None or cls._session.closed:
+            connector = TCPConnector(loop=loop, limit=HTTP_POOL_SIZE, limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+                                     keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT, use_dns_cache=True,
+                                     ttl_dns_cache=HTTP_DNS_CACHE_TTL)
+            cls._session = ClientSession(loop=loop, connector=connector, conn_timeout=HTTP_CONN_TIMEOUT,
+                                         read_timeout=HTTP_READ_TIMEOUT)
+        return cls._session
+
+    @classmethod
+    async def fetch(cls, url, loop, on_chunk=None, chunk_size=STREAM_CHUNK_SIZE):
+        """Rate limited GET of url through response_cache.
+
+        :param url:
+        :param loop:
+        :param on_chunk: called with each chunk of a freshly downloaded body as it arrives
+        :param chunk_size:
+        :return: (body, cache entry, fresh), fresh being False if body is served from the cache, i.e. the server
+                 answered 304 Not Modified or we are offline (in which case NotInCache is raised on a miss).
+                 RetryableHTTPError is raised on 429 and 5xx responses.
+        """
+        entry = response_cache.lookup(url)
+        if response_cache.offline:
+            if entry is None:
+                raise NotInCache(f'{url} is not in {response_cache}.')
+            return response_cache.read(entry), entry, False
+
+        sess = cls.get_session(loop)
+        async with rate_limiter.get(sess, url, headers=response_cache.conditional_headers(entry)) as resp:
+            if resp.status == 304 and entry is not None:
+                return response_cache.read(entry), entry, False
+            if resp.status in RETRYABLE_STATUSES:
+                raise RetryableHTTPError(url, resp.status, parse_retry_after(resp.headers.get('Retry-After')))
+            chunks = []
+            while True:
+                chunk = await resp.content.read(chunk_size)
+                if not chunk:
+                    break
+                if on_chunk is not None:
+                    on_chunk(chunk)
+                chunks.append(chunk)
+            body = b''.join(chunks)
+            entry = response_cache.store(url, body, resp.headers, resp.charset, persist=resp.status == 200)
+        return body, entry, True
+
+    @classmethod
+    async def fetch_text(cls, url, loop):
+        body, entry, _ = await cls.fetch(url, loop)
+        return body.decode(entry.encoding or 'utf-8', errors='replace')
+
+    @classmethod
+    async def close(cls):
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
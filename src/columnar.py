@@ -0,0 +1,126 @@
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ColumnarEventGroup:
+    """Column-oriented form of an EventGroup, each column being a typed NumPy array (numpy is optional for the
+    rest of the package but required here). Missing ids are stored as -1, missing coordinates as NaN and
+    missing flags as False. Rows are only materialized as EventRow namedtuples on access.
+
+    Conditions accepted by filter / count are col=value, col=[values] (membership) or col=(lo, hi)
+    (lo <= value < hi), e.g. group.count(player_id=843, minsec=(0, 45 * 60))."""
+    int_cols = ['player_id', 'counterparty_id', 'match_id', 'minsec', 'team_id', 'ot_id']
+    float_cols = ['start_0', 'start_1', 'end_0', 'end_1', 'yz_plane_coord_0', 'yz_plane_coord_1', 'gy', 'gz']
+    bool_cols = ['a', 'headed', 'injurytime_play', 'k', 'ot_outcome', 'throw_ins']
+    str_cols = ['event_type', 'action_type', 'type']
+    columns = int_cols + float_cols + bool_cols + str_cols
+
+    def __init__(self, name, arrays):
+        self.name = name
+        self.arrays = arrays
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} {self.name} ({len(self)})'
+
+    def __len__(self):
+        return len(self.arrays['minsec'])
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['arrays'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return EventRow(*(self._to_py(c, self.arrays[c][item]) for c in self.columns))
+        return self.__class__(self.name, {c: a[item] for c, a in self.arrays.items()})
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @classmethod
+    def _to_py(cls, col, v):
+        if col in cls.int_cols:
+            return None if v == -1 else int(v)
+        elif col in cls.float_cols:
+            return None if np.isnan(v) else float(v)
+        elif col in cls.bool_cols:
+            return bool(v)
+        return v
+
+    @classmethod
+    def from_events(cls, name, events):
+        if np is None:
+            raise ImportError(f'numpy is required by {cls.__name__}.')
+
+        def _column(col, dtype, missing):
+            return np.array([missing if getattr(e, col) is None else getattr(e, col) for e in events], dtype=dtype)
+
+        arrays = {}
+        arrays.update({c: _column(c, np.int64, -1) for c in cls.int_cols})
+        arrays.update({c: _column(c, np.float64, np.nan) for c in cls.float_cols})
+        arrays.update({c: _column(c, np.bool_, False) for c in cls.bool_cols})
+        arrays.update({c: _column(c, object, None) for c in cls.str_cols})
+        return cls(name, arrays)
+
+    @classmethod
+    def from_event_group(cls, event_group):
+        return cls.from_events(event_group.name, event_group.events)
+
+    @classmethod
+    def concat(cls, groups, name=None):
+        """Stacks groups (e.g. the same event group of all matches of a season) into a single one."""
+        groups = list(groups)
+        name = name or (groups[0].name if groups else None)
+        if not groups:
+            return cls.from_events(name, [])
+        return cls(name, {c: np.concatenate([g.arrays[c] for g in groups]) for c in cls.columns})
+
+    def mask(self, **conditions):
+        m = np.ones(len(self), dtype=np.bool_)
+        for col, cond in conditions.items():
+            arr = self.arrays[col]
+            if isinstance(cond, tuple):
+                m &= (arr >= cond[0]) & (arr < cond[1])
+            elif isinstance(cond, (list, set, np.ndarray)):
+                m &= np.isin(arr, list(cond))
+            else:
+                m &= arr == cond
+        return m
+
+    def filter(self, mask=None, **conditions):
+        m = self.mask(**conditions)
+        if mask is not None:
+            m &= mask
+        return self[m]
+
+    def count(self, **conditions):
+        return int(np.count_nonzero(self.mask(**conditions)))
+
+    def count_by(self, col, **conditions):
+        values, counts = np.unique(self.arrays[col][self.mask(**conditions)], return_counts=True)
+        return {self._to_py(col, v): int(c) for v, c in zip(values, counts)}
+
+    def count_by_player(self, **conditions):
+        return self.count_by('player_id', **conditions)
+
+    def count_by_time_window(self, window=5 * 60, **conditions):
+        """Number of events in each time window of window seconds, index i covering [i*window, (i+1)*window)."""
+        minsec = self.arrays['minsec'][self.mask(**conditions)]
+        return np.bincount(minsec[minsec >= 0] // window)
+
+    def group_by(self, col):
+        order = np.argsort(self.arrays[col], kind='stable')
+        values, starts = np.unique(self.arrays[col][order], return_index=True)
+        return {self._to_py(col, v): self[idx] for v, idx in zip(values, np.split(order, starts[1:]))}
+
+    def group_by_player(self):
+        return self.group_by('player_id')
+
+
+EventRow = namedtuple('EventRow', ColumnarEventGroup.columns)
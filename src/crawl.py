@@ -1,25 +1,101 @@
 import re
 import asyncio
+from functools import partial
+from html.parser import HTMLParser
 
-from aiohttp import ClientSession
 from bs4 import BeautifulSoup
 import xml.etree.ElementTree as ET
 
-from .error import UnrecognizedURLFormat, PageNumNotPresentInURL
+from .error import UnrecognizedURLFormat, PageNumNotPresentInURL, ContentUnchanged
 from .models import Match
-from .utils import jitter, get_league_name, retry
-from .settings import RESULT_URL_BASE, MATCH_CONSUME_INTERVAL, MAX_NUM_RETRY, RETRY_INTERVAL, logger
+from .buffer import write_buffer
+from .dedup import known_matches
+from .stream import MatchStreamParser
+from .ratelimit import TokenBucket
+from .client import HTTPClient
+from .cache import response_cache
+from .executor import get_executor, parse_match_data
+from .workqueue import WorkQueue
+from .export import exporter
+from .metrics import registry, page_fetch_seconds, xml_fetch_seconds, parse_seconds, processed_matches
+from .utils import get_league_name, retry
+from .settings import RESULT_URL_BASE, RESULT_PAGE_CONCURRENCY, RESULT_PAGE_RATE, NUM_MATCH_CONSUMERS, MAX_NUM_RETRY, \
+    RETRY_INTERVAL, RETRY_MAX_INTERVAL, WRITE_BEHIND, STREAM_PARSE, PARSE_EXECUTOR, PARSE_WORKERS, PARSE_QUEUE_SIZE, \
+    SAVE_QUEUE_SIZE, PARSER_VERSION, logger
+
+
+queue = WorkQueue()  # its SQLite file is opened on first use
+# looked up on each scrape, so it's the queue in use (e.g. one swapped in by tests) that gets opened and counted
+registry.gauge('squawka_queue_depth', 'Match urls ready or leased in the work queue.', lambda: queue.qsize())
+
+
+class ResultPageParser(HTMLParser):
+    """Pulls the match urls (href of the first link in each td.match-centre) and the last page urls (href of the
+    a.pageing_text_arrow links saying last) out of a result page in a single pass, without building a tree. It
+    follows the html.parser tree builder of BeautifulSoup, so that results are the same as searching its soup: an
+    end tag closes the latest element of its kind still open, and tds left open contain whatever comes next."""
+    def __init__(self):
+        super().__init__()
+        self.match_urls = []
+        self.last_page_urls = []
+        self._tds = []  # open tds, as the index of their match url if they're match-centre ones, else None
+        self._arrow = None  # [href, text] of the open a.pageing_text_arrow
 
-
-queue = asyncio.Queue()
+    @staticmethod
+    def _has_class(attrs, cls):
+        return cls in (attrs.get('class') or '').split()
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'td':
+            attrs = dict(attrs)
+            if self._has_class(attrs, 'match-centre'):
+                self._tds.append(len(self.match_urls))
+                self.match_urls.append(None)
+            else:
+                self._tds.append(None)
+        elif tag == 'a':
+            attrs = dict(attrs)
+            for i in self._tds:
+                if i is not None and self.match_urls[i] is None:
+                    self.match_urls[i] = attrs.get('href')
+            if self._arrow is None and self._has_class(attrs, 'pageing_text_arrow'):
+                self._arrow = [attrs.get('href'), '']
+
+    def handle_endtag(self, tag):
+        if tag == 'td' and self._tds:
+            self._tds.pop()
+        elif tag == 'a' and self._arrow is not None:
+            href, text = self._arrow
+            if href is not None and 'last' in text.lower():
+                self.last_page_urls.append(href)
+            self._arrow = None
+
+    def handle_data(self, data):
+        if self._arrow is not None:
+            self._arrow[1] += data
+
+    @classmethod
+    def parse(cls, html):
+        """:return: (match urls, last page urls)"""
+        parser = cls()
+        parser.feed(html)
+        parser.close()
+        return [u for u in parser.match_urls if u is not None], parser.last_page_urls
 
 
 class ResultPage:
+    """A page of match results. The match urls and the number of the last page are pulled out of its html by
+    ResultPageParser, unless a BeautifulSoup of it is given, which is searched instead."""
+    _league_id_pattern = re.compile(RESULT_URL_BASE + r'\?ctl=([1-9a-zA-Z-]+).*')
+    _season_pattern = re.compile(RESULT_URL_BASE + r'\?ctl=(?:[1-9a-zA-Z-]+)_s(\d+).*')
+
     def __init__(self, url, html: str=None, soup: BeautifulSoup=None):
         self._url = url
         if html is None and soup is None:
             raise ValueError('At least one kind of input should be provided, html text or soup object.')
-        self.soup = soup or BeautifulSoup(html, 'html.parser')
+        self.soup = soup
+        self._match_urls, self._last_page_urls = (None, None) if soup is not None else ResultPageParser.parse(html)
+        self._page_url = self._league_id = self._season = None
 
     def __repr__(self):
         return self.url
@@ -43,129 +119,343 @@ class ResultPage:
 
     @property
     def url(self):
-        try:
-            self._get_page_num_from_url(self._url)
-            return self._url
-        except PageNumNotPresentInURL as e:
-            return self._url + '&pg=1'
+        if self._page_url is None:
+            try:
+                self._get_page_num_from_url(self._url)
+                self._page_url = self._url
+            except PageNumNotPresentInURL as e:
+                self._page_url = self._url + '&pg=1'
+        return self._page_url
 
     def get_max_page_num(self):
-        nav_buttons = self.soup.find_all('a', attrs={'class': 'pageing_text_arrow'})
-        last_page_url = list(set([b['href'] for b in nav_buttons if 'last' in b.string.lower()]))
+        if self.soup is None:
+            last_page_url = self._last_page_urls
+        else:
+            nav_buttons = self.soup.find_all('a', attrs={'class': 'pageing_text_arrow'})
+            last_page_url = list(set([b['href'] for b in nav_buttons if 'last' in b.string.lower()]))
         if not last_page_url:
             return 1
         return self._get_page_num_from_url(last_page_url[0])
 
     @property
     def league_id(self):
-        m = re.search(RESULT_URL_BASE + r'\?ctl=([1-9a-zA-Z-]+).*', self.url)
-        try:
-            league_name = m.group(1)
-        except AttributeError as e:
-            logger.warn(f'Cannot extract league id out of url: {self.url}. err_msg: {e}')
-            league_name = 'unknown'
-        return league_name
+        if self._league_id is None:
+            m = self._league_id_pattern.search(self.url)
+            try:
+                self._league_id = m.group(1)
+            except AttributeError as e:
+                logger.warn(f'Cannot extract league id out of url: {self.url}. err_msg: {e}')
+                self._league_id = 'unknown'
+        return self._league_id
 
     @property
     def season(self):
-        m = re.search(RESULT_URL_BASE + r'\?ctl=(?:[1-9a-zA-Z-]+)_s(\d+).*', self.url)
-        try:
-            season = m.group(1)
-        except AttributeError as e:
-            logger.warn(f'Cannot extract season out of url: {self.url}. err_msg: {e}')
-            season = 'unknown'
-        return season
+        if self._season is None:
+            m = self._season_pattern.search(self.url)
+            try:
+                self._season = m.group(1)
+            except AttributeError as e:
+                logger.warn(f'Cannot extract season out of url: {self.url}. err_msg: {e}')
+                self._season = 'unknown'
+        return self._season
+
+    def get_page_url(self, pg_num):
+        return f'{RESULT_URL_BASE}?ctl={self.league_id}_s{self.season}&pg={pg_num}'
 
     def generate_result_urls(self, max_pg_num=None, exclude_self=True):
-        url_base = f'{RESULT_URL_BASE}?ctl={self.league_id}_s{self.season}'
-        generated_urls = {f'{url_base}&pg={i+1}' for i in range(max_pg_num)}
+        generated_urls = {self.get_page_url(i + 1) for i in range(max_pg_num)}
         return list(generated_urls - {self.url}) if exclude_self else list(generated_urls)
 
     def get_match_urls(self):
+        if self.soup is None:
+            return list(self._match_urls)
         return [td.a['href'] for td in self.soup.find_all('td', attrs={'class': 'match-centre'})]
 
 
-async def enqueue_if_not_exist(match_url, loop):
-    if not await Match.exists_in_db(loop, {'url': match_url}):
-        await queue.put(match_url)
-        logger.info('Put match {} into the queue.'.format(match_url))
-
-
-@retry(max_retry=MAX_NUM_RETRY, sec_to_sleep=RETRY_INTERVAL, logger=logger)
-async def get_result_page_content(sess, url):
-    async with sess.get(url) as resp:
-        return await resp.text()
+@retry(max_retry=MAX_NUM_RETRY, sec_to_sleep=RETRY_INTERVAL, logger=logger, max_sec_to_sleep=RETRY_MAX_INTERVAL)
+async def get_result_page_content(url, loop):
+    with page_fetch_seconds.time():
+        return await HTTPClient.fetch_text(url, loop)
 
 
 async def enqueue_matches(match_urls, loop, one_off=False):
-    [await enqueue_if_not_exist(m, loop) for m in match_urls]
+    """Queues the urls of match_urls that are neither in DB nor in flight, and returns them."""
+    new_urls = await known_matches.filter_new(match_urls, loop)
+    for m in new_urls:
+        await queue.put(m)
+        logger.info('Put match {} into the queue.'.format(m))
     if one_off:
         await queue.put(None)
-
-
-async def produce_matches(result_page_url, loop, latest=None, one_off=False):
+    return new_urls
+
+
+async def process_result_page(pg_url, loop, semaphore=None, page_rate=None):
+    """Fetches and parses one result page, at most semaphore-many at a time and page_rate-limited, and enqueues
+    its matches right away."""
+    if semaphore is None:
+        pg = ResultPage(pg_url, await get_result_page_content(pg_url, loop))
+    else:
+        async with semaphore:
+            if page_rate is not None:
+                await page_rate.acquire()
+            pg = ResultPage(pg_url, await get_result_page_content(pg_url, loop))
+    await enqueue_matches(pg.get_match_urls(), loop)
+    return pg
+
+
+async def process_result_pages(pg_urls, loop, concurrency=RESULT_PAGE_CONCURRENCY, page_rate=RESULT_PAGE_RATE):
+    """Processes result pages concurrently, see process_result_page, returning the ResultPage of each url in
+    pg_urls, or None if it failed (which is logged)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(page_rate, concurrency)
+    results = await asyncio.gather(*[process_result_page(u, loop, semaphore, bucket) for u in pg_urls],
+                                   return_exceptions=True)
+    pages = []
+    for pg_url, r in zip(pg_urls, results):
+        if isinstance(r, Exception):
+            logger.error(f'Failed to process result page {pg_url}. err_msg: {r}')
+            r = None
+        pages.append(r)
+    return pages
+
+
+async def produce_matches(result_page_url, loop, latest=None, one_off=False, concurrency=RESULT_PAGE_CONCURRENCY,
+                          page_rate=RESULT_PAGE_RATE):
     """produce matches from result page url
 
     :param result_page_url:
     :param loop:
     :param latest: if None, will process all pages, otherwise will only process latest several days that been given.
     :param one_off: indicates whether the process should go in infinite schedules
+    :param concurrency: max number of result pages being fetched at the same time, pages are processed in any order
+    :param page_rate: max number of result pages fetched per second
     :return:
     """
-    async with ClientSession(loop=loop) as sess:
-        cur_pg = ResultPage(result_page_url, await get_result_page_content(sess, result_page_url))
-        await enqueue_matches(cur_pg.get_match_urls(), loop)
+    cur_pg = await process_result_page(result_page_url, loop)
 
-        if one_off:
-            await queue.put(None)
-        else:
-            max_pg_num = cur_pg.get_max_page_num()
-            pg_urls = cur_pg.generate_result_urls(max_pg_num) if latest is None else cur_pg.generate_result_urls(latest)
-            for pg_url in pg_urls:
-                await asyncio.sleep(jitter(15))
-                pg = ResultPage(pg_url, await get_result_page_content(sess, pg_url))
-                await enqueue_matches(pg.get_match_urls(), loop)
+    if one_off:
+        await queue.put(None)
+    else:
+        max_pg_num = cur_pg.get_max_page_num()
+        pg_urls = cur_pg.generate_result_urls(max_pg_num) if latest is None else cur_pg.generate_result_urls(latest)
+        await process_result_pages(pg_urls, loop, concurrency, page_rate)
 
 
-@retry(max_retry=MAX_NUM_RETRY, sec_to_sleep=RETRY_INTERVAL, logger=logger)
-async def get_data_xml(match_url, loop):
-    async with ClientSession(loop=loop) as sess:
-        async with sess.get(match_url) as resp:
-            text = await resp.text()
+async def discover_matches(result_page_urls, loop):
+    """Queues all matches of each league and season of result_page_urls, their result pages being fetched
+    concurrently (see produce_matches), then the stop signal once they're all queued."""
+    for url in result_page_urls:
+        try:
+            await produce_matches(url, loop, latest=None)
+        except Exception as e:
+            logger.error(f'Failed to discover matches of {url}. err_msg: {e}')
+    await queue.put(None)
+
+
+async def get_match_id(match_url, loop):
+    text = await HTTPClient.fetch_text(match_url, loop)
+
+    m = re.search("chatClient\.roomID\s*=\s*parseInt\(\\'(\d+)\\'\)", text)
+    return int(m.group(1))
 
-        m = re.search("chatClient\.roomID\s*=\s*parseInt\(\\'(\d+)\\'\)", text)
-        match_id = m.group(1)
 
-        # chat_data_url = f'http://s3-irl-laliga.squawka.com/chat/{match_id}'
-        ingame_data_url3 = f'http://s3-irl-{get_league_name(match_url)}.squawka.com/dp/ingame/{match_id}'
-        # ingame_rdp_data_url2 = f'http://s3-irl-laliga.squawka.com/dp/ingame_rdp/{match_id}'
+def get_ingame_data_url(match_url, match_id):
+    # chat_data_url = f'http://s3-irl-laliga.squawka.com/chat/{match_id}'
+    # ingame_rdp_data_url2 = f'http://s3-irl-laliga.squawka.com/dp/ingame_rdp/{match_id}'
+    return f'http://s3-irl-{get_league_name(match_url)}.squawka.com/dp/ingame/{match_id}'
 
-        async with sess.get(ingame_data_url3) as resp:
-            data = await resp.text()
 
-        return int(match_id), ET.fromstring(data)
+async def check_processed(match_url, match_id, content_hash, loop):
+    """Raises ContentUnchanged if content_hash has been processed by the current PARSER_VERSION last time and the
+    match is still in DB. If another content or parser version was processed, the rows in DB are stale and it
+    returns True: the save stage is to replace them, within the transaction writing the new ones. A match missing
+    from DB (e.g. the DB being rebuilt while replaying from the cache) is always processed."""
+    processed = response_cache.get_processed(match_url)
+    if processed is None or not await Match.exists_in_db(loop, {'id': match_id}):
+        return False
+    if processed == (PARSER_VERSION, content_hash):
+        raise ContentUnchanged(f'Ingame data of {match_url} is unchanged since processed last time.')
+    logger.info(f'Match {match_url} was processed out of other data or by parser {processed[0]}, '
+                f'its rows are to be replaced.')
+    return True
 
 
-async def process_match(loop):
+@retry(max_retry=MAX_NUM_RETRY, sec_to_sleep=RETRY_INTERVAL, logger=logger, max_sec_to_sleep=RETRY_MAX_INTERVAL)
+async def get_match_data(match_url, loop):
+    """Returns match_id, the raw ingame XML, its content hash and whether the rows of the match in DB are to be
+    replaced. Raises ContentUnchanged if the XML is the one processed last time, see check_processed."""
+    with xml_fetch_seconds.time():
+        match_id = await get_match_id(match_url, loop)
+        data, entry, _ = await HTTPClient.fetch(get_ingame_data_url(match_url, match_id), loop)
+    replace = await check_processed(match_url, match_id, entry.content_hash, loop)
+
+    return match_id, data, entry.content_hash, replace
+
+
+async def get_data_xml(match_url, loop):
+    match_id, data, content_hash, replace = await get_match_data(match_url, loop)
+    return match_id, ET.fromstring(data), content_hash, replace
+
+
+@retry(max_retry=MAX_NUM_RETRY, sec_to_sleep=RETRY_INTERVAL, logger=logger, max_sec_to_sleep=RETRY_MAX_INTERVAL)
+async def get_match_streaming(match_url, loop):
+    """It feeds the ingame XML into a MatchStreamParser chunk by chunk while downloading, so parsing overlaps
+    with the download. Returns None if data of the match is not ready yet, and raises ContentUnchanged if it's
+    the one processed last time (a cached XML is then not parsed at all)."""
+    with xml_fetch_seconds.time(streaming=True):
+        match_id = await get_match_id(match_url, loop)
+        parser = MatchStreamParser(match_url, match_id)
+        data, entry, fresh = await HTTPClient.fetch(get_ingame_data_url(match_url, match_id), loop,
+                                                    on_chunk=parser.feed)
+    replace = await check_processed(match_url, match_id, entry.content_hash, loop)
+    if not fresh:
+        parser.feed(data)
+
+    match = parser.close()
+    if match is not None:
+        match.source_hash, match.replace = entry.content_hash, replace
+    return match
+
+
+async def get_match(match_url, loop):
+    """Fetches and parses the match on the event loop."""
+    if STREAM_PARSE:
+        return await get_match_streaming(match_url, loop)
+
+    match_id, root, content_hash, replace = await get_data_xml(match_url, loop)
+    if root.tag == 'Error':
+        return None
+    with parse_seconds.time(executor=None):
+        match = Match(match_url, root, match_id)
+    match.source_hash, match.replace = content_hash, replace
+    return match
+
+
+def finish_match(url, result, content_hash=None):
+    """Acks url in the queue once its rows are committed (result being saved or unchanged), or nacks it so that
+    it's retried later."""
+    saved = result in ('saved', 'unchanged')
+    processed_matches.inc(result=result)
+    if saved:
+        queue.ack(url)
+        response_cache.mark_processed(url, content_hash)
+        known_matches.mark_done(url)
+    else:
+        known_matches.mark_done(url, saved=False, dead=queue.nack(url))
+
+
+async def fetch_match(loop, parse_queue, save_queue, parse_off_loop=True):
+    """The fetch stage: it takes match urls from the queue until the stop signal (None) is received, which is
+    then put back for the other fetchers. Raw ingame XMLs go to parse_queue if they're to be parsed off the loop,
+    otherwise matches are parsed right here and go to save_queue. Politeness comes from HTTPClient.fetch, which
+    goes through ratelimit.rate_limiter for every request."""
     while True:
         logger.info('Waiting for match url in queue...')
         url = await queue.get()
 
         if url is None:
-            logger.info('Stop signal received. End process_match.')
+            logger.info('Stop signal received. End fetch_match.')
+            queue.task_done()
+            await queue.put(None)
             break
 
         logger.info('Consume match {} from queue. Start to process.'.format(url))
-        match_id, root = await get_data_xml(url, loop)
+        try:
+            if parse_off_loop:
+                match_id, data, content_hash, replace = await get_match_data(url, loop)
+                await parse_queue.put((url, match_id, data, content_hash, replace))
+            else:
+                match = await get_match(url, loop)
+                await save_queue.put((url, match, getattr(match, 'source_hash', None),
+                                      getattr(match, 'replace', False)))
+        except ContentUnchanged as e:
+            logger.info(f'{e} Skip re-parsing and re-saving it.')
+            finish_match(url, 'unchanged')
+        except Exception as e:
+            logger.error(f'Failed to fetch match {url}. err_msg: {e}')
+            finish_match(url, 'fetch_failed')
+
+        queue.task_done()
 
-        if root.tag == 'Error':
+
+async def parse_match(loop, executor, parse_queue, save_queue):
+    """The parse stage: it builds matches out of raw ingame XMLs in executor, off the event loop, until the stop
+    signal (None) is received."""
+    while True:
+        item = await parse_queue.get()
+        if item is None:
+            break
+
+        url, match_id, data, content_hash, replace = item
+        try:
+            with parse_seconds.time(executor=executor.__class__.__name__):
+                match = await loop.run_in_executor(executor, parse_match_data, url, match_id, data)
+        except Exception as e:
+            logger.error(f'Failed to parse match {url}. err_msg: {e}')
+            finish_match(url, 'parse_failed')
+            continue
+        await save_queue.put((url, match, content_hash, replace))
+
+
+async def save_match(loop, save_queue):
+    """The save stage: it hands parsed matches over to the DB writer until the stop signal (None) is received.
+    Stale rows of matches in DB are replaced in the transaction writing the new ones, see check_processed."""
+    while True:
+        item = await save_queue.get()
+        if item is None:
+            break
+
+        url, match, content_hash, replace = item
+        if match is None:
             logger.warn('Data of match {} not ready yet. Skip this time.'.format(url))
-        else:
-            match = Match(url, root, match_id)
-            await match.save(loop)
-            logger.info('Match {} is done.'.format(url))
+            finish_match(url, 'not_ready')
+            continue
 
-        queue.task_done()
-        logger.info('Sleep for a while...')
-        await asyncio.sleep(jitter(MATCH_CONSUME_INTERVAL))
-        logger.info("Wake up from sleep. I'm going to work now.")
+        saved = partial(finish_match, url, 'saved', content_hash)
+        try:
+            if WRITE_BEHIND:
+                await write_buffer.add(match, loop, on_saved=saved,
+                                       on_committed=partial(exporter.append_later, match, loop), replace=replace)
+            else:
+                if await match.save(loop, replace=replace):
+                    exporter.append_later(match, loop)
+                saved()
+        except Exception as e:
+            logger.error(f'Failed to save match {url}. err_msg: {e}')
+            finish_match(url, 'save_failed')
+            continue
+        logger.info('Match {} is done.'.format(url))
+
+
+async def consume_matches(loop, num_workers=NUM_MATCH_CONSUMERS, executor_kind=PARSE_EXECUTOR,
+                          num_parsers=PARSE_WORKERS):
+    """Processes match urls from the queue in a pipeline of overlapping stages: num_workers fetchers, then
+    num_parsers parsers running in an executor of executor_kind (see executor.get_executor, parsing happens on
+    the loop while fetching if it's None) and a saver, with bounded queues in between so a slow stage holds
+    the earlier ones back. It returns once the stop signal is received and everything fetched is saved."""
+    executor = get_executor(executor_kind, num_parsers)
+    parse_queue = asyncio.Queue(maxsize=PARSE_QUEUE_SIZE)
+    save_queue = asyncio.Queue(maxsize=SAVE_QUEUE_SIZE)
+    registry.gauge('squawka_parse_queue_depth', 'Fetched ingame XMLs waiting to be parsed.', parse_queue.qsize)
+    registry.gauge('squawka_save_queue_depth', 'Parsed matches waiting to be saved.', save_queue.qsize)
+
+    async def _stage(workers, next_queue, num_next_workers):
+        await asyncio.gather(*workers)
+        for _ in range(num_next_workers):
+            await next_queue.put(None)
+
+    fetchers = [fetch_match(loop, parse_queue, save_queue, executor is not None) for _ in range(num_workers)]
+    if executor is None:
+        stages = [_stage(fetchers, save_queue, 1)]
+    else:
+        stages = [_stage(fetchers, parse_queue, num_parsers),
+                  _stage([parse_match(loop, executor, parse_queue, save_queue) for _ in range(num_parsers)],
+                         save_queue, 1)]
+    try:
+        await asyncio.gather(*stages, save_match(loop, save_queue))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if WRITE_BEHIND:
+        await write_buffer.close(loop)
+    await exporter.join()
@@ -0,0 +1,86 @@
+import math
+import hashlib
+
+from .models import Match
+from .settings import logger, DEDUP_USE_BLOOM, DEDUP_BLOOM_CAPACITY, DEDUP_BLOOM_ERROR_RATE
+
+
+class BloomFilter:
+    """Fixed-size set membership test with no false negatives and a false positive rate of about error_rate as
+    long as no more than capacity keys are added."""
+    def __init__(self, capacity, error_rate):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} (bits: {self.num_bits}, hashes: {self.num_hashes})'
+
+    def _positions(self, key):
+        digest = hashlib.sha1(key.encode()).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:16], 'little')
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+    def update(self, keys):
+        for k in keys:
+            self.add(k)
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+class KnownMatches:
+    """Dedup layer in front of the match queue.
+
+    known holds the urls of matches already in DB (a set, or a BloomFilter for very large histories, in which
+    case a new match is skipped with probability error_rate), warmed from DB at startup and kept up to date as
+    matches get saved. in_flight holds the urls queued but not processed yet, so a url is never queued twice, and
+    dead the urls given up on by the queue (see WorkQueue.nack), which are never queued again. Only urls in none
+    of them are looked up in DB, with one batched query per call of filter_new."""
+    def __init__(self, use_bloom=DEDUP_USE_BLOOM, capacity=DEDUP_BLOOM_CAPACITY, error_rate=DEDUP_BLOOM_ERROR_RATE):
+        self.known = BloomFilter(capacity, error_rate) if use_bloom else set()
+        self.in_flight = set()
+        self.dead = set()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} (in flight: {len(self.in_flight)}, dead: {len(self.dead)})'
+
+    async def warm_up(self, loop, dead_urls=()):
+        """:param dead_urls: urls given up on by a previous run, see WorkQueue.dead_urls"""
+        urls = await Match.all_values(loop, 'url')
+        self.known.update(urls)
+        self.dead.update(dead_urls)
+        logger.info(f'Warmed up known matches with {len(urls)} urls from DB and {len(self.dead)} dead urls.')
+
+    async def filter_new(self, match_urls, loop):
+        """Returns urls of match_urls that are neither in DB, in flight nor dead, in order, and marks them in
+        flight. Candidates are marked in flight before the DB lookup, so a concurrent call never returns them too."""
+        candidates = list(dict.fromkeys(u for u in match_urls
+                                        if u not in self.known and u not in self.in_flight and u not in self.dead))
+        if not candidates:
+            return []
+        self.in_flight.update(candidates)
+        try:
+            in_db = await Match.values_in_db(loop, 'url', candidates)
+        except Exception:
+            self.in_flight.difference_update(candidates)
+            raise
+        self.known.update(in_db)
+        self.in_flight.difference_update(in_db)
+        return [u for u in candidates if u not in in_db]
+
+    def mark_done(self, match_url, saved=True, dead=False):
+        """To be called once a queued url has been processed, saved tells whether the match is now in DB, and dead
+        whether the queue gave up on it."""
+        self.in_flight.discard(match_url)
+        if saved:
+            self.known.add(match_url)
+        elif dead:
+            self.dead.add(match_url)
+
+
+known_matches = KnownMatches()
@@ -15,4 +15,21 @@ class PageNumNotPresentInURL(Error):
 
 
 class ExceedsMaxRetry(Error):
-    pass
\ No newline at end of file
+    pass
+
+
+class NotInCache(Error):
+    pass
+
+
+class ContentUnchanged(Error):
+    pass
+
+
+class RetryableHTTPError(Error):
+    """A response worth retrying (429 or 5xx), retry_after being the seconds the server asks us to wait."""
+    def __init__(self, url, status, retry_after=None):
+        super().__init__(f'{url} responded {status}.')
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
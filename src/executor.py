@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import xml.etree.ElementTree as ET
+
+from .models import Match, MatchRows
+from .settings import PARSE_EXECUTOR, PARSE_WORKERS
+
+
+def get_executor(kind=PARSE_EXECUTOR, max_workers=PARSE_WORKERS):
+    """The executor matches are parsed in, off the event loop: 'process', 'thread' or None (parse on the loop)."""
+    if kind is None:
+        return None
+    elif kind == 'process':
+        return ProcessPoolExecutor(max_workers)
+    elif kind == 'thread':
+        return ThreadPoolExecutor(max_workers)
+    raise ValueError(f'Unknown kind of executor: {kind}, it should be one of "process", "thread" or None.')
+
+
+def parse_match_data(url, match_id, data, league_name=None):
+    """It parses ingame XML data (bytes or str) into the MatchRows of the match, possibly in a worker process.
+    Returns None if it's not a squawka XML, e.g. the error XML of a match that isn't ready yet."""
+    root = ET.fromstring(data)
+    if root.tag != 'squawka':
+        return None
+    match = Match(url, root, match_id)
+    if league_name is not None:
+        match.league_name = league_name
+    return MatchRows(match)
@@ -0,0 +1,147 @@
+import os
+import asyncio
+import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from .models import Match, Event, DBConnection, event_cols
+from .settings import logger, EXPORT_DIR, EXPORT_COMPRESSION
+
+int_cols = ['player_id', 'counterparty_id', 'match_id', 'minsec', 'ot_id']
+float_cols = ['start_0', 'start_1', 'end_0', 'end_1', 'yz_plane_coord_0', 'yz_plane_coord_1', 'gy', 'gz']
+bool_cols = ['a', 'headed', 'injurytime_play', 'k', 'ot_outcome', 'throw_ins']
+dict_cols = ['event_type', 'action_type', 'card_type', 'type']  # few distinct values, dictionary-encoded
+
+
+def get_season(kickoff_time):
+    """The season a match belongs to is the year it started in, seasons starting in July: 2017 for 2017/18."""
+    if isinstance(kickoff_time, str):
+        kickoff_time = datetime.datetime.fromisoformat(kickoff_time)
+    return kickoff_time.year if kickoff_time.month >= 7 else kickoff_time.year - 1
+
+
+def _arrow_type(col):
+    if col in int_cols:
+        return pa.int32()
+    elif col in float_cols:
+        return pa.float32()
+    elif col in bool_cols:
+        return pa.bool_()
+    elif col in dict_cols:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
+
+
+class ParquetExporter:
+    """Writes the events of matches to Parquet files for analytical reads, partitioned by league and season in the
+    hive layout (league_name=laliga/season=2017/34267.parquet), one file per match. Exporting a newly crawled match
+    just adds its file, so the dataset grows incrementally and a match exported again is replaced atomically.
+
+    Events have the columns of the event table, coordinates being float32 columns and event_type, action_type,
+    card_type and type dictionary-encoded. pyarrow is optional for the rest of the package but required here.
+
+    :param root_dir: root of the dataset, export is disabled if it's None
+    """
+    def __init__(self, root_dir=EXPORT_DIR, compression=EXPORT_COMPRESSION):
+        self.root_dir = root_dir
+        self.compression = compression
+        self._pending = set()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.root_dir})'
+
+    @property
+    def enabled(self):
+        return self.root_dir is not None
+
+    @staticmethod
+    def schema():
+        if pa is None:
+            raise ImportError(f'pyarrow is required by {ParquetExporter.__name__}.')
+        return pa.schema([pa.field(c, _arrow_type(c)) for c in event_cols])
+
+    def get_path(self, match_row):
+        """Path of the file of the match, out of its row in the match table."""
+        return os.path.join(self.root_dir, f"league_name={match_row['league_name']}",
+                            f"season={get_season(match_row['kickoff_time'])}", f"{match_row['id']}.parquet")
+
+    def to_table(self, event_rows):
+        schema = self.schema()
+        arrays = []
+        for field in schema:
+            values = [r.get(field.name) for r in event_rows]
+            if field.name in bool_cols:
+                values = [None if v is None else bool(v) for v in values]
+            if field.name in dict_cols:
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def export_rows(self, match_row, event_rows):
+        """Writes the events of a match to its file, returning the path of it."""
+        path = self.get_path(match_row)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        pq.write_table(self.to_table(event_rows), tmp_path, compression=self.compression)
+        os.replace(tmp_path, path)
+        logger.debug(f'Exported {len(event_rows)} events of match {match_row["id"]} to {path}')
+        return path
+
+    def export_match(self, match):
+        """:param match: Match or MatchRows"""
+        table_rows = dict(match.iter_table_rows())
+        return self.export_rows(table_rows[Match][0], table_rows[Event])
+
+    async def append(self, match, loop):
+        """Exports match off the event loop if export is enabled, errors being logged only, as the dataset can
+        always be caught up with export_from_db."""
+        if not self.enabled:
+            return
+        try:
+            await loop.run_in_executor(None, self.export_match, match)
+        except Exception as e:
+            logger.error(f'Failed to export match {match}. err_msg: {e}')
+
+    def append_later(self, match, loop):
+        """Schedules append of match, e.g. as the on_committed callback of WriteBuffer.add so that only matches
+        committed to DB are exported. join waits for the scheduled ones."""
+        if not self.enabled:
+            return
+        task = loop.create_task(self.append(match, loop))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def join(self):
+        if self._pending:
+            await asyncio.wait(list(self._pending))
+
+    async def export_from_db(self, loop, overwrite=False, match_ids=None):
+        """Exports the matches in DB (only the ones of match_ids if given), only the ones not exported yet unless
+        overwrite, returning how many were."""
+        ph = DBConnection.backend.placeholder
+        pool = await DBConnection.get_pool(loop)
+        num_exported = 0
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute('SELECT `id`, `league_name`, `kickoff_time` FROM `match`')
+                match_rows = [dict(zip(('id', 'league_name', 'kickoff_time'), r)) for r in await cur.fetchall()]
+                if match_ids is not None:
+                    match_rows = [r for r in match_rows if r['id'] in match_ids]
+                for match_row in match_rows:
+                    if not overwrite and os.path.exists(self.get_path(match_row)):
+                        continue
+                    await cur.execute(f"SELECT {','.join([f'`{c}`' for c in event_cols])} FROM `event` "
+                                      f"WHERE `match_id` = {ph}", (match_row['id'],))
+                    event_rows = [dict(zip(event_cols, r)) for r in await cur.fetchall()]
+                    await loop.run_in_executor(None, self.export_rows, match_row, event_rows)
+                    num_exported += 1
+        logger.info(f'Exported {num_exported} of {len(match_rows)} matches in DB to {self.root_dir}')
+        return num_exported
+
+
+exporter = ParquetExporter()
@@ -0,0 +1,81 @@
+import os
+import re
+import glob
+import asyncio
+import pathlib
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from .executor import parse_match_data
+from .buffer import write_buffer
+from .export import exporter
+from .settings import logger, INGEST_PROCESSES, INGEST_MAX_IN_FLIGHT, WRITE_BEHIND
+
+
+def iter_xml_files(path):
+    """Lazily yields the XML files in directory path, or the files matching path if it's a glob pattern."""
+    if os.path.isdir(path):
+        path = os.path.join(path, '*.xml')
+    return glob.iglob(path, recursive=True)
+
+
+def get_match_id_from_path(path):
+    """The match id is the last number in the file name, e.g. 12345.xml or squawka-12345.xml as archived from
+    dp/ingame/12345. Returns None if there is no number in it."""
+    m = re.search(r'(\d+)\D*$', os.path.basename(path))
+    return int(m.group(1)) if m else None
+
+
+def parse_match_file(path, match_id, league_name=None):
+    """It runs in a worker process, returning the MatchRows of the ingame XML file, or None if it's not a
+    squawka XML (e.g. the error XML of a match that wasn't ready)."""
+    with open(path, 'rb') as f:
+        return parse_match_data(pathlib.Path(path).resolve().as_uri(), match_id, f.read(), league_name)
+
+
+async def ingest_files(path, loop, num_processes=INGEST_PROCESSES, max_in_flight=INGEST_MAX_IN_FLIGHT,
+                       league_name=None, sink=None):
+    """Rebuilds matches from archived ingame XML files without any network access.
+
+    :param path: a directory of XML files or a glob pattern
+    :param loop:
+    :param num_processes: files are parsed in a pool of num_processes worker processes
+    :param max_in_flight: max files being parsed or saved at the same time, which bounds memory usage however
+                          many files there are, as rows are handed over to the DB writer as soon as they're parsed
+    :param league_name: league of the matches, which can't be told from the file names
+    :param sink: coroutine function called with each parsed match instead of saving it, see backfill.backfill
+    :return: number of matches ingested
+    """
+    paths = iter_xml_files(path)
+    num_ingested = 0
+
+    async def _ingest(executor):
+        nonlocal num_ingested
+        for p in paths:
+            match_id = get_match_id_from_path(p)
+            if match_id is None:
+                logger.warn(f'Cannot extract match id out of file name: {p}. Skip it.')
+                continue
+            try:
+                match = await loop.run_in_executor(executor, parse_match_file, p, match_id, league_name)
+            except Exception as e:
+                logger.error(f'Failed to parse {p}. err_msg: {e}')
+                continue
+            if match is None:
+                logger.warn(f'{p} is not a squawka XML. Skip it.')
+                continue
+            if sink is not None:
+                await sink(match)
+            elif WRITE_BEHIND:
+                await write_buffer.add(match, loop, on_committed=partial(exporter.append_later, match, loop))
+            elif await match.save(loop):
+                await exporter.append(match, loop)
+            num_ingested += 1
+            logger.info('Match {} from {} is done.'.format(match, p))
+
+    with ProcessPoolExecutor(num_processes) as executor:
+        await asyncio.gather(*[_ingest(executor) for _ in range(max_in_flight)])
+    if sink is None and WRITE_BEHIND:
+        await write_buffer.close(loop)
+        await exporter.join()
+    return num_ingested
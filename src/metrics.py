@@ -0,0 +1,189 @@
+import time
+import json
+import asyncio
+import contextlib
+
+from .settings import logger, METRICS_HOST, METRICS_PORT, METRICS_DUMP_INTERVAL
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def samples(self):
+        return [(self.name, key, v) for key, v in self.values.items()]
+
+    def snapshot(self):
+        return {_format_labels(key) or 'value': v for key, v in self.values.items()}
+
+
+class Gauge(Counter):
+    """A gauge whose value is either set or, if fn is given, read from fn() whenever it's collected."""
+    type = 'gauge'
+
+    def __init__(self, name, help, fn=None):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        self.values[_label_key(labels)] = value
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                self.values[()] = self.fn()
+            except Exception as e:
+                logger.warn(f'Failed to collect gauge {self.name}. err_msg: {e}')
+        return super().samples()
+
+    def snapshot(self):
+        self.samples()
+        return super().snapshot()
+
+
+class Histogram:
+    type = 'histogram'
+    default_buckets = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+    def __init__(self, name, help, buckets=default_buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values = {}  # label key -> [count of each bucket, sum, count]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        if key not in self.values:
+            self.values[key] = [[0] * len(self.buckets), 0, 0]
+        counts, _, _ = v = self.values[key]
+        for i, le in enumerate(self.buckets):
+            if value <= le:
+                counts[i] += 1
+                break
+        v[1] += value
+        v[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observes the seconds spent in the with block, e.g. `with parse_seconds.time():`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get_count(self, **labels):
+        return self.values.get(_label_key(labels), [None, 0, 0])[2]
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for le, c in zip(self.buckets, counts):
+                cumulative += c
+                samples.append((f'{self.name}_bucket', key + (('le', '+Inf' if le == float('inf') else le),),
+                                cumulative))
+            samples.append((f'{self.name}_sum', key, total))
+            samples.append((f'{self.name}_count', key, count))
+        return samples
+
+    def snapshot(self):
+        return {_format_labels(key) or 'value': {'count': count, 'sum': round(total, 6),
+                                                 'avg': round(total / count, 6) if count else None}
+                for key, (_, total, count) in self.values.items()}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            return self.metrics[metric.name]
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help):
+        return self._register(Counter(name, help))
+
+    def gauge(self, name, help, fn=None):
+        gauge = self._register(Gauge(name, help, fn))
+        gauge.fn = fn or gauge.fn
+        return gauge
+
+    def histogram(self, name, help, buckets=Histogram.default_buckets):
+        return self._register(Histogram(name, help, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for m in self.metrics.values():
+            lines.append(f'# HELP {m.name} {m.help}')
+            lines.append(f'# TYPE {m.name} {m.type}')
+            lines.extend(f'{name}{_format_labels(key)} {value}' for name, key, value in m.samples())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        return {name: m.snapshot() for name, m in self.metrics.items()}
+
+
+registry = Registry()
+
+page_fetch_seconds = registry.histogram('squawka_page_fetch_seconds', 'Time to fetch a result page.')
+xml_fetch_seconds = registry.histogram('squawka_xml_fetch_seconds', 'Time to fetch the ingame XML of a match.')
+parse_seconds = registry.histogram('squawka_parse_seconds', 'Time to build a match out of its ingame XML.')
+save_seconds = registry.histogram('squawka_save_seconds', 'Time to upsert the rows of a table in a transaction.')
+saved_rows = registry.counter('squawka_saved_rows_total', 'Rows upserted, per table.')
+skipped_rows = registry.counter('squawka_skipped_rows_total', 'Unchanged rows not written again, per table.')
+processed_matches = registry.counter('squawka_matches_total', 'Matches processed, per result.')
+retries = registry.counter('squawka_retries_total', 'Retried calls, per function.')
+
+
+async def handle_scrape(reader, writer):
+    try:
+        await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        pass
+    body = registry.render().encode()
+    writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n'
+                 + f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+    await writer.drain()
+    writer.close()
+
+
+async def run(loop, host=METRICS_HOST, port=METRICS_PORT, dump_interval=METRICS_DUMP_INTERVAL):
+    """Serves the metrics on http://host:port/ (any path) if port is given, and logs them every dump_interval
+    seconds if it's given, until cancelled."""
+    server = None
+    if port is not None:
+        server = await asyncio.start_server(handle_scrape, host, port)
+        logger.info(f'Serving metrics on http://{host}:{port}/metrics')
+    try:
+        while True:
+            await asyncio.sleep(dump_interval or 3600)
+            if dump_interval:
+                logger.info(f'Metrics: {json.dumps(registry.snapshot())}')
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
@@ -0,0 +1,86 @@
+import os
+import re
+
+from .settings import logger
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+SCHEMA_VERSION_DDL = 'CREATE TABLE IF NOT EXISTS `schema_version` (' \
+                     '`version` int NOT NULL PRIMARY KEY, ' \
+                     '`name` varchar(128), ' \
+                     '`applied_at` datetime DEFAULT CURRENT_TIMESTAMP)'
+
+_migration_file_pattern = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+
+class Migration:
+    """A versioned SQL file of migrations/<backend>/, e.g. 0002_indexes.sql is version 2."""
+    __slots__ = ('version', 'name', 'path')
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.version:04}_{self.name})'
+
+    @property
+    def statements(self):
+        with open(self.path) as f:
+            return split_statements(f.read())
+
+
+def split_statements(sql):
+    """Splits a SQL script on semicolons into its statements, dropping -- comments."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [s.strip() for s in '\n'.join(lines).split(';') if s.strip()]
+
+
+def load_migrations(backend_name, migrations_dir=MIGRATIONS_DIR):
+    """The migrations of a backend, ordered by version."""
+    migrations = []
+    for f in os.listdir(os.path.join(migrations_dir, backend_name)):
+        m = _migration_file_pattern.match(f)
+        if m:
+            migrations.append(Migration(int(m.group(1)), m.group(2), os.path.join(migrations_dir, backend_name, f)))
+    return sorted(migrations, key=lambda m: m.version)
+
+
+async def get_schema_version(cur):
+    await cur.execute(SCHEMA_VERSION_DDL)
+    await cur.execute('SELECT MAX(`version`) FROM `schema_version`')
+    version, = await cur.fetchone()
+    return version or 0
+
+
+async def migrate(pool, backend, target=None, migrations_dir=MIGRATIONS_DIR):
+    """Brings the schema of the database behind pool up to version target (the latest if None), applying the
+    pending migrations in order, each one in its own transaction, and recording them in schema_version. Applied
+    migrations are never run again, and they're written with IF NOT EXISTS where possible so that a migration
+    interrupted halfway (MySQL commits DDL statements implicitly) can be run again.
+
+    :param pool: pool of the database, as created by backend
+    :param backend: storage.StorageBackend
+    :return: versions applied
+    """
+    applied = []
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            current = await get_schema_version(cur)
+            for m in load_migrations(backend.name, migrations_dir):
+                if m.version <= current or (target is not None and m.version > target):
+                    continue
+                logger.info(f'Applying {m} to {backend}')
+                await conn.begin()
+                try:
+                    for statement in m.statements:
+                        await cur.execute(statement)
+                    await cur.execute(f'INSERT INTO `schema_version` (`version`, `name`) '
+                                      f'VALUES ({backend.placeholder}, {backend.placeholder})', (m.version, m.name))
+                    await conn.commit()
+                except Exception as e:
+                    await conn.rollback()
+                    logger.error(f'Failed to apply {m}. err_msg: {e}')
+                    raise
+                applied.append(m.version)
+    return applied
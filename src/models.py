@@ -1,26 +1,25 @@
 import re
-import asyncio
+import sys
 import datetime
-
-import aiomysql
-
-from .settings import logger, CONFIG
+from .metrics import registry, save_seconds, saved_rows, skipped_rows
+from .settings import logger, CONFIG, SAVE_BATCH_SIZE
 from .error import EventGroupNameNotFound
 from .utils import flatten, get_league_name
+from .storage import get_backend
 
 
 class DBConnection:
+    """The pool of the storage backend set in CONFIG['data_db'], MySQL unless the stage picks another one (e.g.
+    SQLite in the embedded stage), see storage.StorageBackend."""
     _pool = None
+    backend = get_backend(CONFIG['data_db'])
 
     @classmethod
     async def get_pool(cls, event_loop):
         """Notes: it's critical to make sure the 1st time this method get called is not something like
         asyncio.gather or asyncio.wait, otherwise single pool assumption here will be break."""
         if cls._pool is None:
-            cls._pool = await aiomysql.create_pool(host=CONFIG['data_db']['host'], port=CONFIG['data_db']['port'],
-                                                   user=CONFIG['data_db']['username'],
-                                                   password=CONFIG['data_db']['password'],
-                                                   db='squawka', maxsize=50, loop=event_loop)
+            cls._pool = await cls.backend.create_pool(event_loop)
         return cls._pool
 
     @classmethod
@@ -28,59 +27,61 @@ class DBConnection:
         if cls._pool is not None:
             cls._pool.close()
             await cls._pool.wait_closed()
+            cls._pool = None
+
+
+registry.gauge('squawka_db_pool_size', 'Open connections of the DB pool.',
+               lambda: DBConnection._pool.size if DBConnection._pool is not None else 0)
+registry.gauge('squawka_db_pool_free', 'Idle connections of the DB pool.',
+               lambda: DBConnection._pool.freesize if DBConnection._pool is not None else 0)
 
 
 class DBModel:
+    __slots__ = ()
     __table_name__ = ''
     __pk__ = []
     __static_fields__ = []
+    __pool__ = None  # the ModelPool of the model if any, see save_in_transaction
 
-    def __getattr__(self, name):
-        # Deal with field of type Coordinate
-        if name[-2:] in ['_0', '_1']:
-            if hasattr(self, name[:-2]):
-                if isinstance(getattr(self, name[:-2]), Coordinate):
-                    return getattr(self, name[:-2]).x[int(name[-1:])]
+    def _get_field_name_value_pairs(self, static_fields, pk, id_auto_increment):
+        all_cols = [f for f in static_fields + [k for k in pk if k not in static_fields]
+                    if not (id_auto_increment and f == 'id')]
+        return {f: getattr(self, f) for f in all_cols}
 
-        # Deal with field which is actually a reference to another DBModel object
-        if name[-3:] == '_id':
-            if hasattr(self, name[:-3]):
-                if isinstance(getattr(self, name[:-3]), DBModel):
-                    return getattr(self, name[:-3]).id
+    def get_row(self, static_fields=None, pk=None, id_auto_increment=False):
+        """Returns the {col_name: value} pairs that represent this object as a row of its table, the columns being
+        always in the same order for a given model."""
+        return self._get_field_name_value_pairs(static_fields or self.__static_fields__, pk or self.__pk__,
+                                                id_auto_increment)
 
     @staticmethod
-    def _properize(val):
-        if val is None:
-            return "NULL"
-        elif isinstance(val, int) or isinstance(val, float):
-            return f"{val}"
-        elif isinstance(val, datetime.datetime):
-            return f"'{datetime.datetime.strftime(val, '%Y-%m-%d %H:%M:%S')}'"
-        else:
-            val = val.replace("'", "")
-            return f"'{val}'"
+    def _build_upsert_sql(table_name, col_names, pk):
+        """The parameterized upsert of a row of col_names into table_name in the dialect of the backend, built once
+        per (table, columns)."""
+        return DBConnection.backend.upsert_sql(table_name, col_names, pk)
 
-    def _get_field_name_value_pairs(self, static_fields, pk, id_auto_increment):
-        all_cols = set(static_fields + pk) - ({'id'} if id_auto_increment else set())
-        return {f: self._properize(getattr(self, f)) for f in all_cols}
+    @classmethod
+    async def save_rows(cls, cur, rows, table_name=None, pk=None, batch_size=SAVE_BATCH_SIZE):
+        """It upserts rows (as returned by get_row) with executemany of at most batch_size rows each, using the
+        given cursor. Committing is left to the caller."""
+        table_name = table_name or cls.__table_name__
+        pk = tuple(pk or cls.__pk__)
+        groups = {}
+        for r in rows:
+            groups.setdefault(tuple(r), []).append(tuple(r.values()))
+        for col_names, group in groups.items():
+            sql = cls._build_upsert_sql(table_name, col_names, pk)
+            for i in range(0, len(group), batch_size):
+                logger.debug(f'{sql} ({len(group[i:i+batch_size])} rows)')
+                await cur.executemany(sql, group[i:i+batch_size])
 
     async def save(self, loop, static_fields=None, pk=None, id_auto_increment=False):
         """It saves the object into DB by performing an upsert operation."""
-        static_fields = static_fields or self.__static_fields__
         pk = pk or self.__pk__
         pool = await DBConnection.get_pool(loop)
-        logger.debug(f'id(pool)={id(pool)}, pool.size={pool.size}, pool.freesize={pool.freesize}')
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
-                pairs = self._get_field_name_value_pairs(static_fields, pk, id_auto_increment)
-                col_names = ','.join([f'`{k}`' for k in pairs.keys()])
-                col_values = ','.join([v for v in pairs.values()])
-                col_name_values = ','.join([f'`{k}`={v}' for k, v in pairs.items() if k not in pk])
-                sql = f"INSERT INTO `{self.__table_name__}` ({col_names}) " \
-                      f"values ({col_values}) " \
-                      f"on duplicate key update {col_name_values}"
-                logger.debug(sql)
-                await cur.execute(sql)
+                await self.save_rows(cur, [self.get_row(static_fields, pk, id_auto_increment)], pk=pk)
                 await conn.commit()
 
     @classmethod
@@ -89,24 +90,103 @@ class DBModel:
         async with pool.acquire() as conn:
             async with conn.cursor() as cur:
                 sql = f"SELECT COUNT(*) as cnt FROM `{cls.__table_name__}` WHERE "\
-                      + ' AND '.join([f'`{k}` = {cls._properize(v)}' for k, v in cond.items()])
-                await cur.execute(sql)
+                      + ' AND '.join([f'`{k}` = {DBConnection.backend.placeholder}' for k in cond])
+                await cur.execute(sql, tuple(cond.values()))
                 r, = await cur.fetchone()
                 return r > 0
 
+    @classmethod
+    async def values_in_db(cls, loop, col, values):
+        """Returns the subset of values present in column col, with one batched IN (...) lookup."""
+        values = list(set(values))
+        if not values:
+            return set()
+        pool = await DBConnection.get_pool(loop)
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                sql = f"SELECT `{col}` FROM `{cls.__table_name__}` WHERE `{col}` IN (" \
+                      + ','.join([DBConnection.backend.placeholder] * len(values)) + ")"
+                await cur.execute(sql, values)
+                return {r for r, in await cur.fetchall()}
+
+    @classmethod
+    async def all_values(cls, loop, col):
+        pool = await DBConnection.get_pool(loop)
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"SELECT `{col}` FROM `{cls.__table_name__}`")
+                return [r for r, in await cur.fetchall()]
+
+
+async def save_in_transaction(loop, table_rows, batch_size=SAVE_BATCH_SIZE, replace_match_ids=()):
+    """It upserts [(model_class, rows), ...] in the given order on a single connection within a single
+    transaction, which is rolled back entirely if anything goes wrong. The rows of the matches of replace_match_ids
+    already in DB are deleted first within the same transaction, see Match.delete_rows."""
+    written = []
+    pool = await DBConnection.get_pool(loop)
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await conn.begin()
+            try:
+                if replace_match_ids:
+                    await Match.delete_rows(cur, sorted(replace_match_ids))
+                for model, rows in table_rows:
+                    if model.__pool__ is not None:
+                        num_rows, rows = len(rows), model.__pool__.unwritten_rows(rows)
+                        skipped_rows.inc(num_rows - len(rows), table=model.__table_name__)
+                        written.append((model.__pool__, rows))
+                    with save_seconds.time(table=model.__table_name__):
+                        await model.save_rows(cur, rows, batch_size=batch_size)
+                    saved_rows.inc(len(rows), table=model.__table_name__)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+    for model_pool, rows in written:
+        model_pool.mark_written(rows)
+
+
+MAX_SHARED_VALUES = 1 << 16
+_shared_ints = {}
+_shared_floats = {}
+
+
+def _shared(values, text, conv):
+    """conv(text), the very same object for the same text as long as values holds less than MAX_SHARED_VALUES, so
+    that values repeated across thousands of events (coordinates, minsec, player ids) are single objects."""
+    v = values.get(text)
+    if v is None:
+        v = conv(text)
+        if len(values) < MAX_SHARED_VALUES:
+            values[text] = v
+    return v
+
+
+class Coordinate(tuple):
+    """An immutable (x0, x1) pair, missing values are None."""
+    __slots__ = ()
+
+    def __new__(cls, x0, x1):
+        def _to_coord(v):
+            if v is None or v == '':
+                return None
+            return _shared(_shared_floats, v, float) if isinstance(v, str) else float(v)
+
+        return super().__new__(cls, (_to_coord(x0), _to_coord(x1)))
 
-class Coordinate:
-    def __init__(self, x0, x1):
-        def _is_missing(v):
-            return v is None or v == ''
+    def __getnewargs__(self):
+        return tuple(self)
 
-        self.x = None if _is_missing(x0) else float(x0), None if _is_missing(x1) else float(x1)
+    @property
+    def x(self):
+        return self
 
     def __repr__(self):
-        return f'({self.x[0]}, {self.x[1]})'
+        return f'({self[0]}, {self[1]})'
 
 
 class Player(DBModel):
+    __slots__ = ('id', 'name', 'date_of_birth', 'weight', 'height', 'country')
     __table_name__ = 'player'
     __pk__ = ['id']
     __static_fields__ = ['name', 'date_of_birth', 'weight', 'height', 'country']
@@ -116,7 +196,7 @@ class Player(DBModel):
         self.name = root.find('name').text.strip()
         self.weight = float(root.find('weight').text) if root.find('weight').text != 'Unknown' else None
         self.height = float(root.find('height').text) if root.find('height').text != 'Unknown' else None
-        self.country = root.find('country').text.strip() if root.find('country') else None
+        self.country = root.find('country').text.strip() if root.find('country') is not None else None
         try:
             self.date_of_birth = datetime.datetime.strptime(root.find('dob').text, '%d/%m/%Y')
         except ValueError:
@@ -127,18 +207,34 @@ class Player(DBModel):
 
 
 class Participant(DBModel):
+    """It's different from Player. It stores player info related only to this match, while Player is static."""
+    __slots__ = ('match', 'player', 'team_id', 'init_loc', 'position')
     __table_name__ = 'participation'
     __pk__ = ['player_id', 'match_id', 'team_id']
     __static_fields__ = ['init_loc_0', 'init_loc_1', 'position']
 
-    """It's different from Player. It stores player info related only to this match, while Player is static."""
     def __init__(self, root, match):
         self.match = match
-        self.player = Player(root)
+        self.player = PlayerPool.intern(Player(root))
         self.team_id = int(root.attrib.get('team_id'))
         self.init_loc = Coordinate(root.find('x_loc').text, root.find('y_loc').text)
         self.position = root.find('position').text.strip()
-        # self.player = PlayerPool.get(root.attrib.get('id'))
+
+    @property
+    def player_id(self):
+        return self.player.id
+
+    @property
+    def match_id(self):
+        return self.match.id
+
+    @property
+    def init_loc_0(self):
+        return self.init_loc[0]
+
+    @property
+    def init_loc_1(self):
+        return self.init_loc[1]
 
     async def _save_players(self, loop):
         await self.player.save(loop)
@@ -152,6 +248,7 @@ class Participant(DBModel):
 
 
 class Team(DBModel):
+    __slots__ = ('id', 'name', 'short_name')
     __table_name__ = 'team'
     __pk__ = ['id']
     __static_fields__ = ['name', 'short_name']
@@ -165,6 +262,68 @@ class Team(DBModel):
         return f'{self.name} (id: {self.id})'
 
 
+class ModelPool:
+    """Process-wide registry of the instances of a model keyed by primary key, shared by all matches, e.g. the
+    Player of each player rather than one per appearance. It also remembers a hash of the row last written of
+    each, so save_in_transaction never sends an unchanged row to DB again."""
+    __model__ = None
+    _instances = None
+    _written = None
+
+    @classmethod
+    def _key(cls, row):
+        return tuple(row[k] for k in cls.__model__.__pk__)
+
+    @staticmethod
+    def _hash(row):
+        return hash(tuple(row.items()))
+
+    @classmethod
+    def get(cls, *pk):
+        return cls._instances.get(pk)
+
+    @classmethod
+    def intern(cls, obj):
+        """Returns the registered instance equal to obj, registering obj if there is none."""
+        pk = tuple(getattr(obj, k) for k in cls.__model__.__pk__)
+        registered = cls._instances.get(pk)
+        if registered is not None and registered.get_row() == obj.get_row():
+            return registered
+        cls._instances[pk] = obj
+        return obj
+
+    @classmethod
+    def unwritten_rows(cls, rows):
+        """The rows that differ from what has been written."""
+        return [r for r in rows if cls._written.get(cls._key(r)) != cls._hash(r)]
+
+    @classmethod
+    def mark_written(cls, rows):
+        """To be called once rows are committed."""
+        cls._written.update((cls._key(r), cls._hash(r)) for r in rows)
+
+    @classmethod
+    def clear(cls):
+        cls._instances.clear()
+        cls._written.clear()
+
+
+class PlayerPool(ModelPool):
+    __model__ = Player
+    _instances = {}
+    _written = {}
+
+
+class TeamPool(ModelPool):
+    __model__ = Team
+    _instances = {}
+    _written = {}
+
+
+Player.__pool__ = PlayerPool
+Team.__pool__ = TeamPool
+
+
 class Match(DBModel):
     __table_name__ = 'match'
     __pk__ = ['id']
@@ -172,16 +331,21 @@ class Match(DBModel):
                          'home_team_id', 'away_team_id']
 
     def __init__(self, url, root, match_id):
+        data_panel = root.find('data_panel')
+        self._init_summary(url, match_id, data_panel.find('system').find('headline').text, data_panel.find('game'))
+        self.participants = [Participant(p, self) for p in data_panel.find('players')]
+        self.event_groups = [EventGroup(f, self.id) for f in data_panel.find('filters')]
+
+    def _init_summary(self, url, match_id, headline, game):
         self.url = url
         self.league_name = get_league_name(self.url)
-        game = root.find('data_panel').find('game')
         teams = list(game.findall('team'))
         self.id = match_id
-        self.summary = root.find('data_panel').find('system').find('headline').text.strip()
+        self.summary = headline.strip()
         self.kickoff_time = datetime.datetime.strptime(game.find('kickoff').text, '%a, %d %b %Y %H:%M:%S %z')
         self.stadium = game.find('venue').text.strip()
-        self.home_team = Team(teams[0])
-        self.away_team = Team(teams[1])
+        self.home_team = TeamPool.intern(Team(teams[0]))
+        self.away_team = TeamPool.intern(Team(teams[1]))
 
         m = re.search(r'(\d+) - (\d+)', self.summary)
         try:
@@ -190,13 +354,28 @@ class Match(DBModel):
             logger.error(f'Cannot extract scores out of summary: {self.summary}. err_msg: {e}')
             self.home_score, self.away_score = -1, -1
 
-        # PlayerPool.update(root.find('data_panel').find('players'))
-        self.participants = [Participant(p, self) for p in root.find('data_panel').find('players')]
-        self.event_groups = [EventGroup(f, self.id) for f in root.find('data_panel').find('filters')]
+    @classmethod
+    def from_parts(cls, url, match_id, headline, game, participants, event_groups):
+        """It builds a match out of already parsed participants and event groups, see stream.MatchStreamParser"""
+        match = cls.__new__(cls)
+        match._init_summary(url, match_id, headline, game)
+        for p in participants:
+            p.match = match
+        match.participants = participants
+        match.event_groups = event_groups
+        return match
 
     def __repr__(self):
         return f'{self.summary} (id: {self.id})'
 
+    @property
+    def home_team_id(self):
+        return self.home_team.id
+
+    @property
+    def away_team_id(self):
+        return self.away_team.id
+
     def find_event_group(self, event_group_name):
         for eg in self.event_groups:
             if eg.name == event_group_name:
@@ -204,18 +383,63 @@ class Match(DBModel):
         raise EventGroupNameNotFound(f'Event group name {event_group_name} not found. '
                                      f'Valid event group names are: {[eg.name for eg in self.event_groups]}')
 
+    @classmethod
+    async def delete_rows(cls, cur, match_ids):
+        """Deletes the rows of the matches of match_ids (their events, participations and the matches themselves)
+        on cur, for them to be saved again out of newer data or a newer parser. Players and teams are kept."""
+        ph = ','.join([DBConnection.backend.placeholder] * len(match_ids))
+        for table_name, col in ((Event.__table_name__, 'match_id'), (Participant.__table_name__, 'match_id'),
+                                (cls.__table_name__, 'id')):
+            await cur.execute(f"DELETE FROM `{table_name}` WHERE `{col}` IN ({ph})", tuple(match_ids))
+
     async def _save_match(self, loop):
         await super().save(loop)
 
-    async def save(self, loop, static_fields=None, pk=None, id_auto_increment=False):
-        exists = await self.exists_in_db(loop, {'id': self.id})
-        if not exists:
-            tasks = [self.home_team.save(loop), self.away_team.save(loop), self._save_match(loop)] \
-                    + [p.save(loop) for p in self.participants] \
-                    + [e.save(loop) for eg in self.event_groups for e in eg]
-            await asyncio.wait(tasks)
-        else:
-            logger.info('Match <<< {} >>> already exists in DB.'.format(self))
+    def iter_table_rows(self):
+        """Yields (model_class, rows) in the order the tables should be written: team, player, participation,
+        match, event."""
+        yield Team, [self.home_team.get_row(), self.away_team.get_row()]
+        yield Player, [p.player.get_row() for p in self.participants]
+        yield Participant, [p.get_row() for p in self.participants]
+        yield Match, [self.get_row()]
+        yield Event, [e.get_row() for eg in self.event_groups for e in eg]
+
+    async def save(self, loop, static_fields=None, pk=None, id_auto_increment=False, batch_size=SAVE_BATCH_SIZE,
+                   replace=False):
+        """It saves the whole match on a single connection within a single transaction, so that a failure
+        never leaves a half-written match in DB. Returns whether it was written, i.e. it wasn't in DB yet or
+        replace is set, in which case its rows in DB are replaced within the same transaction."""
+        if not replace:
+            exists = await self.exists_in_db(loop, {'id': self.id})
+            if exists:
+                logger.info('Match <<< {} >>> already exists in DB.'.format(self))
+                return False
+
+        await save_in_transaction(loop, self.iter_table_rows(), batch_size=batch_size,
+                                  replace_match_ids=[self.id] if replace else ())
+        return True
+
+
+class MatchRows:
+    """The rows of a Match per table, standing in for the match wherever only its rows are needed. It's what
+    gets shipped out of a parsing worker process, as plain dicts pickle several times faster than the tree of
+    Participant, Team and Event objects."""
+    __slots__ = ('id', 'url', 'summary', 'table_rows')
+
+    def __init__(self, match):
+        self.id = match.id
+        self.url = match.url
+        self.summary = match.summary
+        self.table_rows = [(model, list(rows)) for model, rows in match.iter_table_rows()]
+
+    def __repr__(self):
+        return f'{self.summary} (id: {self.id})'
+
+    def iter_table_rows(self):
+        return iter(self.table_rows)
+
+    exists_in_db = Match.exists_in_db
+    save = Match.save
 
 
 class EventGroup:
@@ -225,9 +449,22 @@ class EventGroup:
         self.events = [Event.from_element_root(e, root.tag, match_id) for tc in root.findall('time_slice')
                        for e in tc.findall('event')]
 
+    @classmethod
+    def from_events(cls, name, match_id, events):
+        eg = cls.__new__(cls)
+        eg.name = name
+        eg.match_id = match_id
+        eg.events = events
+        return eg
+
     def __iter__(self):
         return (e for e in self.events)
 
+    def to_columnar(self):
+        """Returns the columnar (NumPy-backed) form of this group, see columnar.ColumnarEventGroup"""
+        from .columnar import ColumnarEventGroup
+        return ColumnarEventGroup.from_event_group(self)
+
     def __getitem__(self, item):
         return self.events[item]
 
@@ -235,19 +472,153 @@ class EventGroup:
         return f'{self.__class__.__name__} ({len(self.events)})'
 
 
+controlled_event_cols = ['player_id', 'counterparty_id', 'match_id', 'minsec', 'event_type', 'start', 'end',
+                         'yz_plane_coord', 'a', 'action_type', 'card_type', 'gy', 'gz', 'headed', 'injurytime_play',
+                         'k', 'ot_id', 'ot_outcome', 'throw_ins', 'type', 'uid']
+coord_event_cols = ['start', 'end', 'yz_plane_coord']
+# columns of the event table, with Coordinate fields split into their _0 / _1 parts
+event_cols = flatten([[f'{f}_0', f'{f}_1'] if f in coord_event_cols else f for f in controlled_event_cols])
+
+
+def _to_int(v):
+    if v.isdigit() or (v[:1] == '-' and v[1:].isdigit()):
+        return _shared(_shared_ints, v, int)
+    logger.warn(f'Cannot convert {v!r} to int, use default value None.')
+
+
+_float_pattern = re.compile(r'[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\Z')
+
+
+def _to_float(v):
+    if _float_pattern.match(v.strip()):
+        return _shared(_shared_floats, v, float)
+    logger.warn(f'Cannot convert {v!r} to float, use default value None.')
+
+
+_bool_values = {'1': True, 'true': True, 'True': True, '0': False, 'false': False, 'False': False}
+
+
+def _to_bool(v):
+    if v in _bool_values:
+        return _bool_values[v]
+    logger.warn(f'Cannot convert {v!r} to bool, use default value None.')
+
+
+class ParsePlan:
+    """It compiles, once per Event subclass, a straight-line function that fills a new event out of its XML
+    element: every attribute listed in Event.attr_key_type is read with a single attrib.get and converted by
+    a validating converter (no try / except), coordinates are read from the child elements declared in the
+    class' __coords__ and texts of the children declared in __child_texts__ are converted, so nothing is
+    looked up per event but the element itself. The generated source is kept in self.source."""
+    converters = {int: _to_int, float: _to_float, bool: _to_bool}
+
+    def __init__(self, event_cls):
+        self.event_cls = event_cls
+        attr_slots = dict(Event.attr_slots, **event_cls.__attr_slots__)
+        namespace = {'Coordinate': Coordinate, 'logger': logger, 'known_attrs': frozenset(attr_slots),
+                     'finish': event_cls._finish}
+        layout = event_cls.layout()
+        lines = ['def fill(ev, root, match_id):',
+                 '    get = root.attrib.get',
+                 '    ev._sparse = None',
+                 '    ev.match_id = match_id',
+                 f'    ev.event_type = {event_cls.__name__!r}']
+        assigned = {'_sparse', 'match_id', 'event_type'}
+        for i, (key, slot) in enumerate(sorted(attr_slots.items())):
+            namespace[f'conv_{i}'] = self.converters.get(Event.attr_key_type[key], Event.attr_key_type[key])
+            lines.append(f'    v = get({key!r})')
+            if slot in layout:
+                lines.append(f'    ev.{slot} = None if v is None else conv_{i}(v)')
+            else:
+                lines.append('    if v is not None:')
+                lines.append(f'        ev.{slot} = conv_{i}(v)')
+            assigned.add(slot)
+        for slot, (tag, conv) in event_cls.__child_texts__.items():
+            namespace[f'conv_{slot}'] = conv
+            lines.append(f'    ev.{slot} = conv_{slot}(root.find({tag!r}).text)')
+            assigned.add(slot)
+        for tag, slots in self._group_coords(event_cls.__coords__).items():
+            text = 'root.text' if tag == '.' else f'root.find({tag!r}).text'
+            lines.append(f'    {" = ".join(f"ev.{s}_0, ev.{s}_1" for s in slots)} = Coordinate(*{text}.split(","))')
+            assigned.update(f'{s}_{i}' for s in slots for i in (0, 1))
+        lines += [f'    ev.{slot} = None' for slot in layout if slot not in assigned]
+        lines += ['    if not known_attrs.issuperset(root.attrib):',
+                  '        ev.extra_attrs = {k: v for k, v in root.attrib.items() if k not in known_attrs}',
+                  '        logger.warn(f"Type of attr-keys {list(ev.extra_attrs)} not been set yet, use str instead.")',
+                  '    ev.minsec = ev.minsec or ev.mins * 60 + ev.secs',
+                  '    finish(ev, root)']
+        self.source = '\n'.join(lines)
+        exec(compile(self.source, f'<parse plan of {event_cls.__name__}>', 'exec'), namespace)
+        self.fill = namespace['fill']
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.event_cls.__name__})'
+
+    @staticmethod
+    def _group_coords(coords):
+        """{'start': 'loc', 'end': 'loc'} -> {'loc': ['start', 'end']}, so that one child fills both."""
+        groups = {}
+        for slot, tag in coords.items():
+            groups.setdefault(tag, []).append(slot)
+        return groups
+
+    def __call__(self, root, match_id):
+        ev = self.event_cls.__new__(self.event_cls)
+        self.fill(ev, root, match_id)
+        return ev
+
+
+class SparseAttr:
+    """An attribute of Event that most event types never have. It's None unless set, and then it's kept in the
+    _sparse dict of the event rather than in a slot of every event. Subclasses declare the attributes their events
+    do have in their __slots__, which take precedence over it."""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.name})'
+
+    def __get__(self, ev, owner=None):
+        if ev is None:
+            return self
+        return None if ev._sparse is None else ev._sparse.get(self.name)
+
+    def __set__(self, ev, value):
+        if value is None:
+            if ev._sparse is not None:
+                ev._sparse.pop(self.name, None)
+        elif ev._sparse is None:
+            ev._sparse = {self.name: value}
+        else:
+            ev._sparse[self.name] = value
+
+
 class Event(DBModel):
+    """Subclasses describe how they are parsed declaratively (see ParsePlan):
+        __slots__: the fields their events have on top of the ones of every event, the other fields being
+                   SparseAttr
+        __coords__: {slot: child tag to read 'x,y' from ('.' is the event element's own text)}
+        __child_texts__: {slot: (child tag, converter)}
+        __attr_slots__: {xml attribute: slot}, overriding attr_slots
+        _finish(root): hook for whatever can't be declared"""
     __table_name__ = 'event'
     __pk__ = ['id']
+    __coords__ = {}
+    __child_texts__ = {}
+    __attr_slots__ = {}
 
+    # repetitive string values are interned so that thousands of events share the same str objects
     attr_key_type = {
-        'action_type': str,
+        'action_type': sys.intern,
         'headed': bool,
         'mins': int,
         'minsec': int,
         'player_id': int,
         'secs': int,
         'team_id': int,
-        'type': str,
+        'type': sys.intern,
         'injurytime_play': bool,
         'uid': str,
         'throw_ins': bool,
@@ -263,62 +634,82 @@ class Event(DBModel):
         'k': bool,
         'a': bool
     }
+    attr_slots = dict({k: k for k in attr_key_type}, other_player='counterparty_id')
+
+    # all attributes of events, extra_attrs holding the xml attributes whose type is not listed in attr_key_type
+    fields = tuple(sorted((set(attr_key_type) | set(controlled_event_cols) | {'extra_attrs'}) - {'other_player'}))
+    # start and end are kept as their 4 floats rather than as 2 Coordinate objects
+    __slots__ = ('event_type', 'match_id', 'player_id', 'mins', 'secs', 'minsec', 'injurytime_play', 'start_0',
+                 'start_1', 'end_0', 'end_1', '_sparse')
 
     def __init__(self, root, match_id):
-        self.match_id = match_id
-        self.event_type = self.__class__.__name__
-        self.counterparty_id = None
-        for k, v in root.items():
-            if k == 'player_id':
-                self.player_id = int(v)
-                # self.player = PlayerPool.get(v)
-            elif k == 'other_player':
-                try:
-                    self.counterparty_id = int(v)
-                    # self.counterparty = PlayerPool.get(v)
-                except ValueError as e:
-                    logger.warn('Cannot convert counterparty_id {}, use default value None. err_msg: {}'.format(v, e))
-            else:
-                try:
-                    super().__setattr__(k, self.attr_key_type[k](v))
-                except KeyError as e:
-                    logger.warn('Type of attr-key {} not been set yet, use str instead. err_msg: {}'.format(k, e))
-                    super().__setattr__(k, v)
-                except ValueError as e:
-                    logger.warn('Cannot convert {} to {} when init {}. err_msg: {}'.format(v, self.attr_key_type[k],
-                                                                                           k, e))
-                    super().__setattr__(k, None)
-
-        self.minsec = self.__dict__.get('minsec') or self.mins * 60 + self.secs
+        parse_plans[self.__class__].fill(self, root, match_id)
 
     def __repr__(self):
         base = f'[{self.mins:2}:{self.secs:2}] Player-{self.player_id} {self.__class__.__name__.lower()}'
         final = base + (f' at {self.start}' if self.start == self.end else f' from {self.start} to {self.end}')
         return final
 
+    def _finish(self, root):
+        pass
+
+    @classmethod
+    def layout(cls):
+        """Names of the slots of the events of cls."""
+        return [s for c in reversed(cls.__mro__) for s in c.__dict__.get('__slots__', ())]
+
+    @property
+    def start(self):
+        return None if self.start_0 is None and self.start_1 is None else Coordinate(self.start_0, self.start_1)
+
+    @start.setter
+    def start(self, coord):
+        self.start_0, self.start_1 = (None, None) if coord is None else coord
+
+    @property
+    def end(self):
+        return None if self.end_0 is None and self.end_1 is None else Coordinate(self.end_0, self.end_1)
+
+    @end.setter
+    def end(self, coord):
+        self.end_0, self.end_1 = (None, None) if coord is None else coord
+
+    @property
+    def yz_plane_coord_0(self):
+        return None if self.yz_plane_coord is None else self.yz_plane_coord[0]
+
+    @property
+    def yz_plane_coord_1(self):
+        return None if self.yz_plane_coord is None else self.yz_plane_coord[1]
+
     @classmethod
     def from_element_root(cls, root, tag, match_id):
-        return event_class[tag](root, match_id)
+        return parse_plans[event_class[tag]](root, match_id)
+
+    def get_row(self, static_fields=None, pk=None, id_auto_increment=True):
+        static_fields = static_fields or event_cols
+        return super().get_row(static_fields=static_fields, pk=pk, id_auto_increment=id_auto_increment)
+
+    async def save(self, loop, static_fields=None, pk=None, id_auto_increment=True):
+        await super().save(loop, static_fields=static_fields, pk=pk, id_auto_increment=id_auto_increment)
 
-    async def save(self, loop, static_fields=None, pk=None, id_auto_increment=False):
-        controlled = [k for k in self.__dict__.keys() if k in controlled_event_cols]
-        coord_fields = flatten([[f'{f}_0', f'{f}_1'] for f in controlled if isinstance(getattr(self, f), Coordinate)])
-        non_coord_fields = [f for f in controlled if not isinstance(getattr(self, f), Coordinate)]
-        static_fields = [f for f in coord_fields + non_coord_fields if getattr(self, f) is not None]
-        await super().save(loop, static_fields=static_fields, id_auto_increment=True)
+
+for f in Event.fields:
+    if not hasattr(Event, f):
+        setattr(Event, f, SparseAttr(f))
 
 
 class GoalKeeping(Event):
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.text.split(',')))
+    __slots__ = ('action_type', 'headed', 'team_id', 'type')
+    __coords__ = {'start': '.', 'end': '.'}
 
 
 class GoalAttempt(Event):
     """gmouth_y and gmouth_z are in YZ plane (Z is the height of a shot when crossing the gate line),
     stored in self.yz_plane"""
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
+    __slots__ = ('action_type', 'team_id', 'type', 'uid', 'yz_plane_coord')
+
+    def _finish(self, root):
         coordinates = root.find('coordinates')
         self.start = Coordinate(coordinates.attrib['start_x'], coordinates.attrib['start_y'])
 
@@ -332,125 +723,112 @@ class GoalAttempt(Event):
 
 class ActionArea(Event):
     """It's something like heat map. The id of an action_area indicates the position in the pitch"""
-    pass
+    __slots__ = ()
 
 
 class HeadedDual(Event):
     """Only reflects the headed duals that a player won, failed will only stored to the counterparty, not current one"""
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
-        self.counterparty_id = int(root.find('otherplayer').text)
-        # self.counterparty = PlayerPool.get(root.find('otherplayer').text)
+    __slots__ = ('action_type', 'counterparty_id', 'team_id', 'type')
+    __coords__ = {'start': 'loc', 'end': 'loc'}
+    __child_texts__ = {'counterparty_id': ('otherplayer', int)}
+    # self.counterparty = PlayerPool.get(root.find('otherplayer').text)
 
 
 class Interception(Event):
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
+    __slots__ = ('action_type', 'team_id')
+    __coords__ = {'start': 'loc', 'end': 'loc'}
 
 
 class Clearance(Event):
     """There's a boolean tag 'headed' to identify whether the clearence is done by head."""
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
+    __slots__ = ('action_type', 'headed', 'team_id', 'type')
+    __coords__ = {'start': 'loc', 'end': 'loc'}
 
 
 class Pass(Event):
     """There's tagging on each pass event, such as long_ball, assist."""
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = Coordinate(*(p for p in root.find('start').text.split(',')))
-        self.end = Coordinate(*(p for p in root.find('end').text.split(',')))
+    __slots__ = ('a', 'action_type', 'k', 'team_id', 'throw_ins', 'type')
+    __coords__ = {'start': 'start', 'end': 'end'}
 
 
 class Tackle(Event):
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
-        self.player_id = int(root.find('tackler').text)
-        self.counterparty_id = int(root.attrib['player_id'])
-        # self.player = PlayerPool.get(root.find('tackler').text)
-        # self.counterparty = PlayerPool.get(root.attrib['player_id'])
+    """player_id attribute of a tackle is the player being tackled, the tackler is in the tackler child."""
+    __slots__ = ('action_type', 'counterparty_id', 'team', 'type')
+    __coords__ = {'start': 'loc', 'end': 'loc'}
+    __child_texts__ = {'player_id': ('tackler', int)}
+    __attr_slots__ = {'player_id': 'counterparty_id'}
+    # self.player = PlayerPool.get(root.find('tackler').text)
+    # self.counterparty = PlayerPool.get(root.attrib['player_id'])
 
 
 class Cross(Event):
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = Coordinate(*(p for p in root.find('start').text.split(',')))
-        self.end = Coordinate(*(p for p in root.find('end').text.split(',')))
+    __slots__ = ('a', 'k', 'team', 'type')
+    __coords__ = {'start': 'start', 'end': 'end'}
 
 
 class Corner(Event):
     """swere could be inward / outward, which means the curve direction of a corner"""
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = Coordinate(*(p for p in root.find('start').text.split(',')))
-        self.end = Coordinate(*(p for p in root.find('end').text.split(',')))
+    __slots__ = ('team', 'type')
+    __coords__ = {'start': 'start', 'end': 'end'}
 
 
 class Offside(Event):
-    pass
+    __slots__ = ('team',)
 
 
 class KeeperSweeper(Event):
     """KeeperSweeper means the goal keeper proactively runs out of the box."""
-    pass
+    __slots__ = ('team',)
 
 
 class OneOnOne(Event):
-    pass
+    __slots__ = ()
 
 
 class SetPiece(Event):
     """Goals that due to SetPiece"""
-    pass
+    __slots__ = ('gy', 'gz', 'team', 'type', 'uid')
 
 
 class TakeOn(Event):
     """TakeOn means one player takes the ball to pass the defence of another player."""
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
+    __slots__ = ('action_type', 'counterparty_id', 'other_team', 'type')
+    __coords__ = {'start': 'loc', 'end': 'loc'}
 
 
 class Foul(Event):
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
-        self.counterparty_id = int(root.find('otherplayer').text)
-        # self.counterparty = PlayerPool.get(root.find('otherplayer').text)
+    __slots__ = ('counterparty_id', 'team', 'type')
+    __coords__ = {'start': 'loc', 'end': 'loc'}
+    __child_texts__ = {'counterparty_id': ('otherplayer', int)}
+    # self.counterparty = PlayerPool.get(root.find('otherplayer').text)
 
 
 class Card(Event):
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
-        self.card_type = root.find('card').text
+    __slots__ = ('card_type', 'team')
+    __coords__ = {'start': 'loc', 'end': 'loc'}
+    __child_texts__ = {'card_type': ('card', str)}
 
 
 class Block(Event):
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        if root.find('loc'):
-            self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
-        elif root.find('start') and root.find('end'):
-            self.start = self.end = Coordinate(*(p for p in root.find('end').text.split(',')))
+    __slots__ = ('action_type', 'shot_player', 'shot_team', 'team_id', 'type')
+
+    def _finish(self, root):
+        loc = root.find('loc')
+        if loc is None:
+            loc = root.find('end')
+        if loc is not None:
+            self.start = self.end = Coordinate(*loc.text.split(','))
 
 
 class ExtraHeatMap(Event):
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = self.end = Coordinate(*(p for p in root.find('loc').text.split(',')))
+    __slots__ = ('action_type', 'ot_id', 'ot_outcome', 'team_id')
+    __coords__ = {'start': 'loc', 'end': 'loc'}
 
 
 class BallOut(Event):
     """Ball-Out means a player caused the ball going out of the boundary."""
-    def __init__(self, root, match_id):
-        super().__init__(root, match_id)
-        self.start = Coordinate(*(p for p in root.find('start').text.split(',')))
-        self.end = Coordinate(*(p for p in root.find('end').text.split(',')))
+    __slots__ = ('action_type', 'team_id', 'type')
+    __coords__ = {'start': 'start', 'end': 'end'}
 
 
 event_class = {
@@ -476,6 +854,4 @@ event_class = {
     'balls_out': BallOut
 }
 
-controlled_event_cols = ['player_id', 'counterparty_id', 'match_id', 'minsec', 'event_type', 'start', 'end',
-                         'yz_plane_coord', 'a', 'action_type', 'card_type', 'gy', 'gz', 'headed', 'injurytime_play',
-                         'k', 'ot_id', 'ot_outcome', 'throw_ins', 'type', 'uid']
+parse_plans = {cls: ParsePlan(cls) for cls in event_class.values()}
@@ -0,0 +1,200 @@
+import time
+import asyncio
+from urllib.parse import urlparse
+
+from .utils import RETRYABLE_EXCEPTIONS
+from .metrics import registry
+from .settings import logger, HOST_RATE, HOST_BURST, HOST_MIN_RATE, HOST_MAX_RATE, SLOW_RESPONSE_SECS, \
+    RETRYABLE_STATUSES, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT, BREAKER_MAX_RESET_TIMEOUT
+
+
+class TokenBucket:
+    """Token bucket whose rate adapts AIMD-style: it's halved on a slow or failed response (down to min_rate)
+    and grows back by a tenth of its initial rate on each good one (up to max_rate)."""
+    def __init__(self, rate, capacity, min_rate=None, max_rate=None, clock=time.monotonic):
+        self.rate = self.initial_rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate or rate
+        self.max_rate = max_rate or rate
+        self.tokens = capacity
+        self._clock = clock
+        self._last = clock()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} (rate: {self.rate:.3f}/s, tokens: {self.tokens:.2f})'
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self):
+        """Takes a token if there is one, otherwise returns the seconds to wait until there will be."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def slow_down(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def speed_up(self):
+        self.rate = min(self.max_rate, self.rate + self.initial_rate / 10)
+
+
+class CircuitBreaker:
+    """After failure_threshold consecutive failures the circuit opens: every request is held back for
+    reset_timeout seconds. Then a single trial request goes through (half open), which closes the circuit if it
+    succeeds, or opens it again for twice as long (up to max_reset_timeout) if it fails."""
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT,
+                 max_reset_timeout=BREAKER_MAX_RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = self.initial_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.failures = 0
+        self._clock = clock
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.state}, failures: {self.failures})'
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return 'closed'
+        return 'open' if self._clock() - self._opened_at < self.reset_timeout else 'half_open'
+
+    def try_pass(self):
+        """Lets a request through if the circuit allows it, otherwise returns the seconds to wait before asking
+        again."""
+        state = self.state
+        if state == 'closed':
+            return 0
+        elif state == 'open':
+            return self.reset_timeout - (self._clock() - self._opened_at)
+        elif self._trial_in_flight:
+            return min(self.reset_timeout, 1)
+        self._trial_in_flight = True
+        return 0
+
+    async def wait(self):
+        while True:
+            wait = self.try_pass()
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info(f'Circuit closed again after {self.reset_timeout}s.')
+        self.failures = 0
+        self.reset_timeout = self.initial_reset_timeout
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight:
+            self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+        self._trial_in_flight = False
+
+
+class HostRateLimiter:
+    """One TokenBucket and one CircuitBreaker per host, e.g. www.squawka.com and each s3-irl-<league>.squawka.com,
+    so a failing host pauses the workers requesting it without holding back the others."""
+    def __init__(self, rate=HOST_RATE, capacity=HOST_BURST, min_rate=HOST_MIN_RATE, max_rate=HOST_MAX_RATE,
+                 slow_response_secs=SLOW_RESPONSE_SECS, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout=BREAKER_RESET_TIMEOUT, max_reset_timeout=BREAKER_MAX_RESET_TIMEOUT):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.slow_response_secs = slow_response_secs
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.buckets = {}
+        self.breakers = {}
+
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.capacity, self.min_rate, self.max_rate)
+        return self.buckets[host]
+
+    def breaker(self, url):
+        host = urlparse(url).netloc
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout, self.max_reset_timeout)
+        return self.breakers[host]
+
+    async def acquire(self, url):
+        await self.breaker(url).wait()
+        await self.bucket(url).acquire()
+
+    def get(self, sess, url, **kwargs):
+        """Rate limited sess.get(url), to be used as `async with rate_limiter.get(sess, url) as resp:`"""
+        return _LimitedRequest(self, sess, url, kwargs)
+
+    def report(self, url, elapsed=None, ok=True, failed=None):
+        """Feeds the outcome of a request back, so the rate of its host adapts. failed tells whether the host
+        failed (e.g. 5xx rather than 404), which defaults to not ok, for its circuit breaker."""
+        bucket, breaker = self.bucket(url), self.breaker(url)
+        if not ok or (elapsed is not None and elapsed > self.slow_response_secs):
+            bucket.slow_down()
+            logger.info(f'Slow down requests to {urlparse(url).netloc}: {bucket}')
+        else:
+            bucket.speed_up()
+
+        if failed is None:
+            failed = not ok
+        if failed:
+            breaker.record_failure()
+            if breaker.state != 'closed':
+                logger.warn(f'Requests to {urlparse(url).netloc} are paused for {breaker.reset_timeout}s: {breaker}')
+        else:
+            breaker.record_success()
+
+
+class _LimitedRequest:
+    def __init__(self, limiter, sess, url, kwargs):
+        self.limiter = limiter
+        self.sess = sess
+        self.url = url
+        self.kwargs = kwargs
+        self._ctx = self.resp = None
+        self._start = None
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.url)
+        self._start = time.monotonic()
+        self._ctx = self.sess.get(self.url, **self.kwargs)
+        try:
+            self.resp = await self._ctx.__aenter__()
+        except Exception:
+            self.limiter.report(self.url, ok=False)
+            raise
+        return self.resp
+
+    async def __aexit__(self, exc_type, exc, tb):
+        status = self.resp.status
+        failed = status in RETRYABLE_STATUSES or (exc_type is not None and issubclass(exc_type, RETRYABLE_EXCEPTIONS))
+        self.limiter.report(self.url, time.monotonic() - self._start, ok=exc_type is None and status < 400,
+                            failed=failed)
+        return await self._ctx.__aexit__(exc_type, exc, tb)
+
+
+rate_limiter = HostRateLimiter()
+registry.gauge('squawka_open_circuits', 'Hosts whose requests are paused by their circuit breaker.',
+               lambda: sum(b.state != 'closed' for b in rate_limiter.breakers.values()))
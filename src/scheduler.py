@@ -0,0 +1,137 @@
+import time
+import asyncio
+import sqlite3
+import datetime
+
+from .crawl import ResultPage, get_result_page_content, enqueue_matches, process_result_pages
+from .utils import get_match_date
+from .settings import logger, QUEUE_DB_PATH, CHECK_LATEST_RESULT_INTERVAL, CHECK_LATEST_RESULT_PAGE
+
+
+class Watermarks:
+    """Per league and season, the date of the newest match discovered so far, kept in the SQLite file of the
+    work queue so that it survives restarts."""
+    def __init__(self, path=QUEUE_DB_PATH):
+        self.path = path
+        self._conn = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.path})'
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS `watermark` ('
+                               '`league_id` TEXT NOT NULL, '
+                               '`season` TEXT NOT NULL, '
+                               '`newest_match_date` TEXT NOT NULL, '
+                               '`updated_at` REAL NOT NULL, '
+                               'PRIMARY KEY (`league_id`, `season`))')
+        return self._conn
+
+    def get(self, league_id, season):
+        row = self.conn.execute('SELECT `newest_match_date` FROM `watermark` WHERE `league_id` = ? AND `season` = ?',
+                                (league_id, season)).fetchone()
+        return None if row is None else datetime.date.fromisoformat(row[0])
+
+    def set(self, league_id, season, newest_match_date):
+        self.conn.execute('INSERT OR REPLACE INTO `watermark` VALUES (?, ?, ?, ?)',
+                          (league_id, season, newest_match_date.isoformat(), time.time()))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _newest_match_date(match_urls, newest=None):
+    dates = [d for d in map(get_match_date, match_urls) if d is not None]
+    return newest if not dates else max(dates) if newest is None else max(newest, *dates)
+
+
+async def poll_result_pages(result_page_url, loop, watermarks, max_pages=CHECK_LATEST_RESULT_PAGE):
+    """Walks the result pages of a league and season from the newest one, queueing new matches, and stops at
+    the first page without any new match, at the first page reaching back to the watermark (the newest match
+    date discovered by the previous polls) or after max_pages pages (all pages if None).
+
+    With no watermark yet (the first poll of a league and season), there is no stopping early nor max_pages: all
+    other pages are fetched concurrently with crawl.process_result_pages, and the watermark is set only if they
+    all were.
+
+    :param result_page_url: the newest result page of the league and season
+    :param loop:
+    :param watermarks: Watermarks
+    :param max_pages:
+    :return: number of result pages fetched
+    """
+    pg_url, pg_num = result_page_url, 1
+    while True:
+        pg = ResultPage(pg_url, await get_result_page_content(pg_url, loop))
+        if pg_num == 1:
+            league_id, season = pg.league_id, pg.season
+            watermark = newest = watermarks.get(league_id, season)
+            if watermark is None:
+                return await _poll_all_result_pages(pg, loop, watermarks)
+            max_pg_num = pg.get_max_page_num() if max_pages is None else min(pg.get_max_page_num(), max_pages)
+
+        match_urls = pg.get_match_urls()
+        new_urls = await enqueue_matches(match_urls, loop)
+        dates = [d for d in map(get_match_date, match_urls) if d is not None]
+        newest = _newest_match_date(match_urls, newest)
+
+        if not new_urls:
+            logger.info(f'No new match on {pg_url}, stop paging.')
+            break
+        if watermark is not None and dates and min(dates) <= watermark:
+            logger.info(f'{pg_url} reaches back to the watermark {watermark}, stop paging.')
+            break
+        if pg_num >= max_pg_num:
+            break
+        pg_num += 1
+        pg_url = pg.get_page_url(pg_num)
+
+    if newest is not None and newest != watermark:
+        watermarks.set(league_id, season, newest)
+    return pg_num
+
+
+async def _poll_all_result_pages(first_pg, loop, watermarks):
+    """The first poll of a league and season, see poll_result_pages."""
+    max_pg_num = first_pg.get_max_page_num()
+    await enqueue_matches(first_pg.get_match_urls(), loop)
+    pages = [first_pg] + await process_result_pages([first_pg.get_page_url(n) for n in range(2, max_pg_num + 1)],
+                                                    loop)
+    newest = _newest_match_date([u for pg in pages if pg is not None for u in pg.get_match_urls()])
+    if newest is not None and all(pg is not None for pg in pages):
+        watermarks.set(first_pg.league_id, first_pg.season, newest)
+    return max_pg_num
+
+
+class Scheduler:
+    """Polls the result pages of each league and season every interval seconds, see poll_result_pages. In
+    steady state a poll costs one result page fetch, and no DB query as known urls are kept in memory."""
+    def __init__(self, result_page_urls, interval=CHECK_LATEST_RESULT_INTERVAL, max_pages=CHECK_LATEST_RESULT_PAGE,
+                 watermarks=None):
+        self.result_page_urls = result_page_urls
+        self.interval = interval
+        self.max_pages = max_pages
+        self.watermarks = watermarks or Watermarks()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({len(self.result_page_urls)} leagues, every {self.interval}s)'
+
+    async def tick(self, loop):
+        for url in self.result_page_urls:
+            try:
+                num_pages = await poll_result_pages(url, loop, self.watermarks, self.max_pages)
+                logger.info(f'Polled {num_pages} result pages of {url}.')
+            except Exception as e:
+                logger.error(f'Failed to poll result pages of {url}. err_msg: {e}')
+
+    async def run(self, loop):
+        while True:
+            start = loop.time()
+            await self.tick(loop)
+            await asyncio.sleep(max(0, self.interval - (loop.time() - start)))
@@ -12,9 +12,60 @@ DEFAULT_LEAGUE = '-1'
 RESULT_URL_BASE = 'http://www.squawka.com/match-results'
 CHECK_LATEST_RESULT_PAGE = 3
 CHECK_LATEST_RESULT_INTERVAL = 30 * 60  # in seconds
-MATCH_CONSUME_INTERVAL = 60  # in seconds
+NUM_MATCH_CONSUMERS = 4
+DEDUP_USE_BLOOM = False  # keep known match urls in a Bloom filter rather than a set, see dedup.KnownMatches
+DEDUP_BLOOM_CAPACITY = 1000000
+DEDUP_BLOOM_ERROR_RATE = 0.001
+RESULT_PAGE_CONCURRENCY = 4  # result pages fetched at the same time when discovering matches
+RESULT_PAGE_RATE = 1  # result pages fetched per second when discovering matches
+HOST_RATE = 0.5  # initial requests per second to each host, see ratelimit.HostRateLimiter
+HOST_BURST = 2
+HOST_MIN_RATE = 1 / 60
+HOST_MAX_RATE = 2
+SLOW_RESPONSE_SECS = 10  # responses slower than this make the rate of their host drop
+HTTP_POOL_SIZE = 32  # max open connections of the shared HTTP session, see client.HTTPClient
+HTTP_POOL_SIZE_PER_HOST = 8
+HTTP_KEEPALIVE_TIMEOUT = 60  # in seconds
+HTTP_DNS_CACHE_TTL = 10 * 60  # in seconds
+HTTP_CONN_TIMEOUT = 10  # in seconds
+HTTP_READ_TIMEOUT = 60  # in seconds
 MAX_NUM_RETRY = 3
-RETRY_INTERVAL = 30
+RETRY_INTERVAL = 30  # in seconds, base of the exponential backoff between retries, see utils.retry
+RETRY_MAX_INTERVAL = 10 * 60  # in seconds
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+BREAKER_FAILURE_THRESHOLD = 5  # consecutive failures that open the circuit of a host, see ratelimit.CircuitBreaker
+BREAKER_RESET_TIMEOUT = 30  # in seconds
+BREAKER_MAX_RESET_TIMEOUT = 10 * 60  # in seconds
+SAVE_BATCH_SIZE = 500  # max rows per multi-row INSERT
+WRITE_BEHIND = True  # buffer rows of many matches and write them together, see buffer.WriteBuffer
+WRITE_BUFFER_MAX_ROWS = 20000
+WRITE_BUFFER_MAX_BYTES = 8 * 1024 * 1024
+WRITE_BUFFER_MAX_AGE = 30  # in seconds
+WRITE_BUFFER_MAX_RETRY_INTERVAL = 5 * 60  # in seconds, max backoff between retries of a failed flush
+STREAM_PARSE = True  # parse ingame XML while downloading it, see stream.MatchStreamParser
+STREAM_CHUNK_SIZE = 16 * 1024  # in bytes
+PARSE_EXECUTOR = 'process'  # 'process', 'thread' or None (parse on the event loop), see executor.get_executor
+PARSE_WORKERS = os.cpu_count() or 1
+PARSE_QUEUE_SIZE = 2 * PARSE_WORKERS  # max fetched ingame XMLs waiting to be parsed
+SAVE_QUEUE_SIZE = 16  # max parsed matches waiting to be saved
+INGEST_PROCESSES = os.cpu_count() or 1  # worker processes parsing XML files in ingest mode, see ingest.ingest_files
+INGEST_MAX_IN_FLIGHT = 2 * INGEST_PROCESSES  # max XML files being parsed or saved at the same time
+BACKFILL_STAGING_DIR = os.environ.get('SQUAWKA_BACKFILL_DIR', 'backfill')  # TSV files of backfill.backfill
+QUEUE_DB_PATH = os.environ.get('SQUAWKA_QUEUE_DB', 'queue.sqlite3')  # see workqueue.WorkQueue
+QUEUE_VISIBILITY_TIMEOUT = 10 * 60  # in seconds, a leased url not acked within it is handed out again
+QUEUE_MAX_ATTEMPTS = 5
+QUEUE_RETRY_DELAY = 10 * 60  # in seconds, a nacked url is handed out again after it
+QUEUE_POLL_INTERVAL = 1  # in seconds
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108  # Prometheus text endpoint, None to disable it, see metrics.run
+METRICS_DUMP_INTERVAL = 5 * 60  # in seconds, None to never log a metrics dump
+CACHE_ENABLED = True  # keep raw responses on disk and revalidate them, see cache.ResponseCache
+CACHE_DIR = os.environ.get('SQUAWKA_CACHE_DIR', 'cache')
+CACHE_OFFLINE = os.environ.get('SQUAWKA_OFFLINE') == '1'  # replay from cache only, no network access at all
+EXPORT_DIR = os.environ.get('SQUAWKA_EXPORT_DIR')  # Parquet dataset saved matches go to, None to not export them
+EXPORT_COMPRESSION = 'zstd'
+PARSER_VERSION = 1  # bump it whenever parsing or the schema changes, so processed matches are re-parsed and their
+# rows in DB replaced, see crawl.check_processed
 
 #####################
 #  Load Auth file   #
@@ -59,6 +110,21 @@ FULL_CONFIG = {
         'test': TEST_CONFIG
     },
 
+    'embedded': {
+        'deploy': {
+            'data_db': {
+                'backend': 'sqlite',
+                'path': os.environ.get('SQUAWKA_SQLITE_DB') or 'squawka.sqlite3',
+            }
+        },
+        'test': {
+            'data_db': {
+                'backend': 'sqlite',
+                'path': ':memory:',
+            }
+        }
+    },
+
     'local': {
         'deploy': {
             'data_db': {
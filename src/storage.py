@@ -0,0 +1,167 @@
+import asyncio
+import sqlite3
+import datetime
+import functools
+
+import aiomysql
+
+from .migrate import migrate
+from .settings import logger
+
+sqlite3.register_adapter(datetime.datetime, lambda v: v.isoformat(' '))
+sqlite3.register_adapter(datetime.date, lambda v: v.isoformat())
+
+
+class StorageBackend:
+    """What DBModel needs from a database: a pool of connections in the aiomysql fashion (acquire, cursor, begin,
+    commit, rollback, execute, executemany, fetchone, fetchall), the placeholder of its parameterized statements and
+    how an upsert is spelled.
+
+    :param config: the data_db section of the config, see settings.FULL_CONFIG
+    """
+    name = ''
+    placeholder = '%s'
+
+    def __init__(self, config):
+        self.config = config
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.name})'
+
+    async def create_pool(self, loop):
+        raise NotImplementedError
+
+    def upsert_sql(self, table_name, col_names, pk):
+        raise NotImplementedError
+
+
+class MySQLBackend(StorageBackend):
+    name = 'mysql'
+
+    async def create_pool(self, loop):
+        return await aiomysql.create_pool(host=self.config['host'], port=self.config['port'],
+                                          user=self.config['username'], password=self.config['password'],
+                                          db='squawka', maxsize=50, loop=loop)
+
+    async def connect(self, loop, **kwargs):
+        """A connection of its own, outside of the pool, e.g. connect(loop, local_infile=True) for bulk loads."""
+        return await aiomysql.connect(host=self.config['host'], port=self.config['port'],
+                                      user=self.config['username'], password=self.config['password'],
+                                      db='squawka', loop=loop, **kwargs)
+
+    @functools.lru_cache(maxsize=None)
+    def upsert_sql(self, table_name, col_names, pk):
+        """Run with executemany, aiomysql rewrites it into a single multi-row INSERT."""
+        col_name_values = ','.join([f'`{k}`=VALUES(`{k}`)' for k in col_names if k not in pk])
+        return f"INSERT INTO `{table_name}` ({','.join([f'`{k}`' for k in col_names])}) " \
+               f"VALUES ({','.join(['%s'] * len(col_names))})" + \
+               (f" ON DUPLICATE KEY UPDATE {col_name_values}" if col_name_values else '')
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded database in a single file (config['path']), in WAL mode. Its schema is migrated to the latest
+    version on first connect, see migrate.migrate."""
+    name = 'sqlite'
+    placeholder = '?'
+
+    async def create_pool(self, loop):
+        pool = SQLitePool(self.config.get('path', ':memory:'))
+        await migrate(pool, self)
+        return pool
+
+    @functools.lru_cache(maxsize=None)
+    def upsert_sql(self, table_name, col_names, pk):
+        """Run with executemany, sqlite3 prepares it once and binds every row to it."""
+        col_name_values = ','.join([f'`{k}`=excluded.`{k}`' for k in col_names if k not in pk])
+        conflict_cols = [k for k in pk if k in col_names]
+        return f"INSERT INTO `{table_name}` ({','.join([f'`{k}`' for k in col_names])}) " \
+               f"VALUES ({','.join(['?'] * len(col_names))})" + \
+               (f" ON CONFLICT ({','.join([f'`{k}`' for k in conflict_cols])}) DO UPDATE SET {col_name_values}"
+                if col_name_values and conflict_cols else '')
+
+
+class SQLiteCursor:
+    def __init__(self, cur):
+        self._cur = cur
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self._cur.close()
+
+    async def execute(self, sql, args=()):
+        self._cur.execute(sql, args or ())
+
+    async def executemany(self, sql, args):
+        self._cur.executemany(sql, args)
+
+    async def fetchone(self):
+        return self._cur.fetchone()
+
+    async def fetchall(self):
+        return self._cur.fetchall()
+
+
+class SQLiteConnection:
+    """The connection of a SQLitePool, held by one coroutine at a time."""
+    def __init__(self, pool):
+        self._pool = pool
+
+    async def __aenter__(self):
+        await self._pool.lock.acquire()
+        return self
+
+    async def __aexit__(self, *args):
+        if self._pool.conn.in_transaction:
+            self._pool.conn.rollback()
+        self._pool.lock.release()
+
+    def cursor(self):
+        return SQLiteCursor(self._pool.conn.cursor())
+
+    async def begin(self):
+        self._pool.conn.execute('BEGIN')
+
+    async def commit(self):
+        self._pool.conn.commit()
+
+    async def rollback(self):
+        self._pool.conn.rollback()
+
+
+class SQLitePool:
+    """Stands in for an aiomysql pool over a single sqlite3 connection. SQLite has a single writer anyway, and the
+    statements are run right on the event loop as they don't wait on any network."""
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.lock = asyncio.Lock()
+        logger.info(f'Opened SQLite database {path}')
+
+    @property
+    def size(self):
+        return 1
+
+    @property
+    def freesize(self):
+        return 0 if self.lock.locked() else 1
+
+    def acquire(self):
+        return SQLiteConnection(self)
+
+    def close(self):
+        self.conn.close()
+
+    async def wait_closed(self):
+        pass
+
+
+backends = {b.name: b for b in (MySQLBackend, SQLiteBackend)}
+
+
+def get_backend(config):
+    """The backend named by config['backend'], MySQL if it's not given."""
+    return backends[config.get('backend', MySQLBackend.name)](config)
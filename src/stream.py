@@ -0,0 +1,80 @@
+import xml.etree.ElementTree as ET
+
+from .models import Match, Participant, EventGroup, Event
+
+
+class MatchStreamParser:
+    """It builds a Match incrementally out of chunks of its ingame XML, e.g. as they arrive from the socket.
+
+    Each data_panel/players/player and data_panel/filters/*/time_slice/event element is turned into a
+    Participant / Event as soon as it is complete and then dropped from the tree, as is everything else
+    not needed to build the match. So memory held by the parser is about one event rather than the whole
+    document. Usage:
+
+        parser = MatchStreamParser(url, match_id)
+        for chunk in chunks:
+            parser.feed(chunk)
+        match = parser.close()  # None if data of the match is not ready yet
+    """
+    def __init__(self, url, match_id):
+        self.url = url
+        self.match_id = match_id
+        self.root_tag = None
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._elems = []
+        self._headline = None
+        self._game = None
+        self._participants = []
+        self._event_groups = []
+        self._events = []
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+        self._process_events()
+
+    def close(self):
+        self._parser.close()
+        self._process_events()
+        if self.root_tag != 'squawka':
+            return None
+        return Match.from_parts(self.url, self.match_id, self._headline, self._game, self._participants,
+                                self._event_groups)
+
+    def _process_events(self):
+        for ev, elem in self._parser.read_events():
+            if ev == 'start':
+                if self.root_tag is None:
+                    self.root_tag = elem.tag
+                self._elems.append(elem)
+            else:
+                self._elems.pop()
+                self._on_end(elem)
+
+    def _on_end(self, elem):
+        depth = len(self._elems) + 1
+        if depth < 3:
+            return
+        section = self._elems[2].tag if depth > 3 else elem.tag
+
+        if section in ('system', 'game'):
+            if depth == 4 and section == 'system' and elem.tag == 'headline':
+                self._headline = elem.text
+            elif depth == 3 and section == 'game':
+                self._game = elem
+            if depth > 3:
+                return
+        elif section == 'players':
+            if depth > 4:
+                return
+            if depth == 4:
+                self._participants.append(Participant(elem, None))
+        elif section == 'filters':
+            if depth > 6:
+                return
+            if depth == 6 and elem.tag == 'event':
+                self._events.append(Event.from_element_root(elem, self._elems[3].tag, self.match_id))
+            elif depth == 4:
+                self._event_groups.append(EventGroup.from_events(elem.tag, self.match_id, self._events))
+                self._events = []
+
+        self._elems[-1].remove(elem)
@@ -0,0 +1,7 @@
+class FakeClock:
+    """Stands in for time.monotonic / time.time, tests move it forward by setting now."""
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,97 @@
+import sys
+import datetime
+import xml.etree.ElementTree as ET
+sys.path.append('..')
+
+import pytest
+
+from ..models import Match, MatchRows, Player, Event
+from ..backfill import to_tsv_field, StagingFiles, load_staging_files
+
+
+def test_to_tsv_field():
+    assert to_tsv_field(None) == '\\N'
+    assert to_tsv_field(True) == '1'
+    assert to_tsv_field(54.3) == '54.3'
+    assert to_tsv_field(datetime.datetime(1990, 1, 2)) == '1990-01-02'
+    assert to_tsv_field(datetime.datetime(2017, 10, 1, 15, 15)) == '2017-10-01 15:15:00'
+    assert to_tsv_field('a\tb\\c\nd') == 'a\\tb\\\\c\\nd'
+
+
+@pytest.mark.asyncio
+async def test_staging_files(event_loop, tmpdir):
+    root = ET.parse('squawka.xml').getroot()
+    num_events = sum(len(eg.events) for eg in Match('dummy_url', root, 1).event_groups)
+    staging = StagingFiles(str(tmpdir), skip_match_ids=[3])
+    for match_id in [1, 2, 3, 1]:
+        await staging.add(MatchRows(Match('dummy_url', root, match_id)))
+    staging.close()
+
+    assert staging.num_matches == 2 and staging.match_ids == {1, 2}
+    assert staging.models[0].__table_name__ == 'team' and staging.models[-1] is Event
+    assert staging.num_rows[Player] == 36
+    with open(staging.get_path(Event)) as f:
+        lines = f.readlines()
+    assert len(lines) == staging.num_rows[Event] == 2 * num_events
+    assert all(len(line.rstrip('\n').split('\t')) == len(staging.columns[Event]) for line in lines)
+    staging.remove()
+    assert tmpdir.listdir() == []
+
+
+class RecordingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def execute(self, sql, args=None):
+        self.conn.executed.append(sql)
+        if self.conn.fail_on and sql.startswith(self.conn.fail_on):
+            raise RuntimeError('load failed')
+
+
+class RecordingConn:
+    def __init__(self, fail_on=None):
+        self.executed = []
+        self.fail_on = fail_on
+        self.committed = self.rolled_back = False
+
+    def cursor(self):
+        return RecordingCursor(self)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+@pytest.mark.asyncio
+async def test_load_staging_files(event_loop, tmpdir):
+    staging = StagingFiles(str(tmpdir))
+    await staging.add(Match('dummy_url', ET.parse('squawka.xml').getroot(), 1))
+    staging.close()
+
+    conn = RecordingConn()
+    await load_staging_files(conn, staging)
+    assert conn.committed
+    assert conn.executed[0].startswith('ALTER TABLE `event` DROP INDEX IF EXISTS')
+    assert conn.executed[-1].startswith('ALTER TABLE `event` ADD INDEX IF NOT EXISTS')
+    assert 'CREATE TEMPORARY TABLE `player_staging` LIKE `player`' in conn.executed
+    assert any(sql.startswith('INSERT INTO `player` (') and 'FROM `player_staging` ON DUPLICATE KEY UPDATE' in sql
+               for sql in conn.executed)
+    assert any(sql.startswith('LOAD DATA LOCAL INFILE %s INTO TABLE `event`') for sql in conn.executed)
+
+    # indexes are rebuilt even if the load fails
+    conn = RecordingConn(fail_on='LOAD DATA LOCAL INFILE %s INTO TABLE `event`')
+    with pytest.raises(RuntimeError):
+        await load_staging_files(conn, staging)
+    assert conn.rolled_back and not conn.committed
+    assert conn.executed[-1].startswith('ALTER TABLE `event` ADD INDEX IF NOT EXISTS')
@@ -0,0 +1,31 @@
+import sys
+import xml.etree.ElementTree as ET
+sys.path.append('..')
+
+from ..models import Match
+from ..bench.fixtures import scale_root, PLAYER_ID_OFFSET
+from ..bench.run import check
+
+
+def test_scale_root():
+    root = ET.parse('squawka.xml').getroot()
+    match = Match('dummy_url', root, 34267)
+    scaled = Match('dummy_url', scale_root(root, 3), 34267)
+
+    assert len(scaled.participants) == 3 * len(match.participants)
+    assert len({p.player_id for p in scaled.participants}) == 3 * len(match.participants)
+    for eg, scaled_eg in zip(match.event_groups, scaled.event_groups):
+        assert len(scaled_eg.events) == 3 * len(eg.events)
+    assert scaled.find_event_group('tackles')[-1].counterparty_id > 2 * PLAYER_ID_OFFSET
+    # the original tree is left untouched
+    assert len(Match('dummy_url', root, 34267).participants) == len(match.participants)
+
+
+def test_check_thresholds():
+    results = [{'fixture': 'squawka.xml', 'scale': 1,
+                'measures': {'match_events_per_sec': 1000, 'peak_memory_bytes_per_event': 100,
+                             'event_class_events_per_sec': None}}]
+    thresholds = {'match_events_per_sec': {'min': 5000}, 'peak_memory_bytes_per_event': {'max': 1024},
+                  'event_class_events_per_sec': {'min': 5000}}
+    violations = check(results, thresholds)
+    assert len(violations) == 1 and 'match_events_per_sec' in violations[0]
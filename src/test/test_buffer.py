@@ -0,0 +1,172 @@
+import sys
+import asyncio
+import xml.etree.ElementTree as ET
+sys.path.append('..')
+
+import pytest
+
+from .. import buffer
+from ..buffer import WriteBuffer
+from ..models import Match, Player, Event
+
+
+@pytest.fixture
+def saved(monkeypatch):
+    saved = []
+
+    async def fake_save_in_transaction(loop, table_rows, replace_match_ids=()):
+        saved.append(dict(table_rows))
+
+    async def fake_exists_in_db(cls, loop, cond):
+        return False
+
+    monkeypatch.setattr(buffer, 'save_in_transaction', fake_save_in_transaction)
+    monkeypatch.setattr(Match, 'exists_in_db', classmethod(fake_exists_in_db))
+    return saved
+
+
+@pytest.mark.asyncio
+async def test_coalesce_rows_across_matches(event_loop, saved):
+    buf = WriteBuffer(max_rows=10 ** 6, max_bytes=10 ** 9, max_age=3600)
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    rematch = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34268)
+    await buf.add(match, event_loop)
+    await buf.add(rematch, event_loop)
+    await buf.add(rematch, event_loop)
+    assert saved == []
+    assert buf.contains_match(34268)
+
+    await buf.close(event_loop)
+    assert len(saved) == 1
+    assert len(saved[0][Player]) == 36
+    assert len(saved[0][Event]) == 2 * sum(len(eg.events) for eg in match.event_groups)
+    assert buf.num_rows == 0
+
+
+@pytest.mark.asyncio
+async def test_flush_when_row_limit_reached(event_loop, saved):
+    buf = WriteBuffer(max_rows=100, max_bytes=10 ** 9, max_age=3600)
+    await buf.add(Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267), event_loop)
+    assert len(saved) == 1
+    assert buf.num_rows == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_rows(event_loop, saved, monkeypatch):
+    fail = [True]
+
+    async def flaky_save_in_transaction(loop, table_rows, replace_match_ids=()):
+        if fail[0]:
+            raise RuntimeError('DB is gone')
+        saved.append(dict(table_rows))
+
+    monkeypatch.setattr(buffer, 'save_in_transaction', flaky_save_in_transaction)
+    buf = WriteBuffer(max_rows=10 ** 6, max_bytes=10 ** 9, max_age=3600)
+    done = []
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    await buf.add(match, event_loop, on_saved=lambda: done.append(34267))
+    num_rows = buf.num_rows
+    with pytest.raises(RuntimeError):
+        await buf.flush(event_loop)
+    assert buf.num_rows == num_rows and buf.contains_match(34267) and done == []
+
+    fail[0] = False
+    await buf.flush(event_loop)
+    assert len(saved) == 1 and done == [34267] and buf.num_rows == 0
+
+
+@pytest.mark.asyncio
+async def test_match_being_flushed_is_not_buffered_again(event_loop, saved, monkeypatch):
+    buf = WriteBuffer(max_rows=10 ** 6, max_bytes=10 ** 9, max_age=3600)
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    done = []
+
+    async def slow_save_in_transaction(loop, table_rows, replace_match_ids=()):
+        # the same match comes again while its rows are being written
+        await buf.add(match, loop, on_saved=lambda: done.append('again'))
+        saved.append(dict(table_rows))
+
+    monkeypatch.setattr(buffer, 'save_in_transaction', slow_save_in_transaction)
+    await buf.add(match, event_loop, on_saved=lambda: done.append('first'))
+    await buf.flush(event_loop)
+    assert buf.num_rows == 0 and len(saved) == 1
+    assert done == ['first', 'again']
+
+
+@pytest.mark.asyncio
+async def test_run_survives_failed_flushes(event_loop, saved, monkeypatch):
+    calls = []
+
+    async def failing_save_in_transaction(loop, table_rows, replace_match_ids=()):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('DB is gone')
+        buf._closed = True
+        saved.append(dict(table_rows))
+
+    monkeypatch.setattr(buffer, 'save_in_transaction', failing_save_in_transaction)
+    monkeypatch.setattr(buffer, 'backoff', lambda attempt, base, cap: 0)
+    buf = WriteBuffer(max_rows=10 ** 6, max_bytes=10 ** 9, max_age=0.01)
+    buf._add_rows(Player, [{'id': 1, 'name': 'x'}])
+    buf._oldest = 0
+    await buf.run(event_loop)
+    assert len(calls) == 2 and len(saved) == 1
+
+
+@pytest.mark.asyncio
+async def test_on_committed_only_after_commit(event_loop, saved, monkeypatch):
+    buf = WriteBuffer(max_rows=10 ** 6, max_bytes=10 ** 9, max_age=3600)
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    committed = []
+    await buf.add(match, event_loop, on_committed=lambda: committed.append('first'))
+    await buf.add(match, event_loop, on_committed=lambda: committed.append('again'))
+    assert committed == []
+    await buf.flush(event_loop)
+    assert committed == ['first']
+
+    async def in_db(cls, loop, cond):
+        return True
+
+    monkeypatch.setattr(Match, 'exists_in_db', classmethod(in_db))
+    done = []
+    await buf.add(match, event_loop, on_saved=lambda: done.append('saved'),
+                  on_committed=lambda: committed.append('skipped'))
+    assert done == ['saved'] and committed == ['first']
+
+
+@pytest.mark.asyncio
+async def test_replace_match_in_db(event_loop, monkeypatch):
+    flushed = []
+
+    async def fake_save_in_transaction(loop, table_rows, replace_match_ids=()):
+        flushed.append(set(replace_match_ids))
+
+    async def in_db(cls, loop, cond):
+        return True
+
+    monkeypatch.setattr(buffer, 'save_in_transaction', fake_save_in_transaction)
+    monkeypatch.setattr(Match, 'exists_in_db', classmethod(in_db))
+    buf = WriteBuffer(max_rows=10 ** 6, max_bytes=10 ** 9, max_age=3600)
+    root = ET.parse('squawka.xml').getroot()
+    await buf.add(Match('dummy_url', root, 34267), event_loop, replace=True)
+    await buf.add(Match('dummy_url', root, 34268), event_loop)
+    assert buf.contains_match(34267) and not buf.contains_match(34268)
+    await buf.flush(event_loop)
+    assert flushed == [{34267}]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_adds_of_the_same_match(event_loop, saved, monkeypatch):
+    async def slow_exists_in_db(cls, loop, cond):
+        await asyncio.sleep(0.01)
+        return False
+
+    monkeypatch.setattr(Match, 'exists_in_db', classmethod(slow_exists_in_db))
+    buf = WriteBuffer(max_rows=10 ** 6, max_bytes=10 ** 9, max_age=3600)
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    done = []
+    await asyncio.gather(*[buf.add(match, event_loop, on_saved=lambda: done.append(34267)) for _ in range(2)])
+    await buf.flush(event_loop)
+    assert len(saved) == 1
+    assert len(saved[0][Event]) == sum(len(eg.events) for eg in match.event_groups)
+    assert done == [34267, 34267]
@@ -0,0 +1,105 @@
+import sys
+import xml.etree.ElementTree as ET
+sys.path.append('..')
+
+import pytest
+
+from ..models import Match, Team, Event, DBConnection, PlayerPool, TeamPool, save_in_transaction
+
+
+def test_iter_table_rows_order():
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    tables = [model.__table_name__ for model, _ in match.iter_table_rows()]
+    assert tables == ['team', 'player', 'participation', 'match', 'event']
+    rows = dict((model.__table_name__, rows) for model, rows in match.iter_table_rows())
+    assert len(rows['player']) == len(rows['participation']) == 36
+    assert len(rows['event']) == sum(len(eg.events) for eg in match.event_groups)
+    assert all('id' not in r for r in rows['event'])
+
+
+def test_build_parameterized_upsert_sql():
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    row = match.home_team.get_row()
+    assert row == {'name': 'Barcelona', 'short_name': 'Barcelona', 'id': 73}
+    sql = Team._build_upsert_sql('team', tuple(row), tuple(Team.__pk__))
+    assert sql == "INSERT INTO `team` (`name`,`short_name`,`id`) VALUES (%s,%s,%s) " \
+                  "ON DUPLICATE KEY UPDATE `name`=VALUES(`name`),`short_name`=VALUES(`short_name`)"
+    assert Team._build_upsert_sql('team', tuple(row), tuple(Team.__pk__)) is sql
+
+    # every event has the same columns, so they all share a single statement
+    event_rows = dict(match.iter_table_rows())[Event]
+    assert len({tuple(r) for r in event_rows}) == 1
+
+
+class FakeCursor:
+    def __init__(self, executed):
+        self.executed = executed
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def execute(self, sql, args=None):
+        self.executed.append(sql)
+
+    async def executemany(self, sql, args):
+        self.executed.append(sql)
+
+
+class FakeConn:
+    def __init__(self):
+        self.executed = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self.executed)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self):
+        self.conn = FakeConn()
+
+    def acquire(self):
+        return self.conn
+
+
+@pytest.mark.asyncio
+async def test_unchanged_players_and_teams_are_written_once(event_loop, monkeypatch):
+    pool = FakePool()
+
+    async def fake_get_pool(cls, loop):
+        return pool
+
+    monkeypatch.setattr(DBConnection, 'get_pool', classmethod(fake_get_pool))
+    PlayerPool.clear()
+    TeamPool.clear()
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    other = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34268)
+    assert match.participants[0].player is other.participants[0].player
+    assert match.home_team is other.home_team
+
+    await save_in_transaction(event_loop, match.iter_table_rows())
+    assert any(sql.startswith('INSERT INTO `player`') for sql in pool.conn.executed)
+    assert any(sql.startswith('INSERT INTO `team`') for sql in pool.conn.executed)
+
+    pool.conn.executed.clear()
+    await save_in_transaction(event_loop, other.iter_table_rows())
+    assert not any(sql.startswith('INSERT INTO `player`') or sql.startswith('INSERT INTO `team`')
+                   for sql in pool.conn.executed)
+    assert any(sql.startswith('INSERT INTO `participation`') for sql in pool.conn.executed)
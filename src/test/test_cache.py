@@ -0,0 +1,95 @@
+import sys
+sys.path.append('..')
+
+import pytest
+import xml.etree.ElementTree as ET
+
+from ..cache import ResponseCache
+from ..client import HTTPClient
+from ..error import NotInCache, ContentUnchanged
+from ..models import Match, Event, DBConnection, PlayerPool, TeamPool
+from ..storage import SQLiteBackend
+from ..settings import PARSER_VERSION
+from .. import client, crawl
+
+
+URL = 'http://s3-irl-laliga.squawka.com/dp/ingame/12345'
+
+
+def test_store_and_revalidate(tmpdir):
+    cache = ResponseCache(str(tmpdir))
+    assert cache.lookup(URL) is None
+    assert cache.conditional_headers(None) == {}
+
+    body = b'<squawka></squawka>' * 100
+    entry = cache.store(URL, body, {'ETag': '"abc"', 'Last-Modified': 'Sat, 07 Oct 2017 12:00:00 GMT'}, 'utf-8')
+    cached = cache.lookup(URL)
+    assert cached.content_hash == entry.content_hash
+    assert cache.read(cached) == body
+    assert cache.conditional_headers(cached) == {'If-None-Match': '"abc"',
+                                                 'If-Modified-Since': 'Sat, 07 Oct 2017 12:00:00 GMT'}
+
+    # identical bodies of different urls share one blob
+    cache.store(URL + '0', body)
+    assert len(tmpdir.join('blobs').listdir()) == 1
+
+
+def test_processed_marker(tmpdir):
+    cache = ResponseCache(str(tmpdir))
+    match_url = 'http://la-liga.squawka.com/a-vs-b/01-01-2017/matches'
+    assert not cache.is_processed(match_url, 'h1')
+    cache.mark_processed(match_url, 'h1')
+    assert cache.is_processed(match_url, 'h1')
+    assert not cache.is_processed(match_url, 'h2')
+    assert cache.get_processed(match_url) == (PARSER_VERSION, 'h1')
+    assert not ResponseCache(str(tmpdir), enabled=False).is_processed(match_url, 'h1')
+
+
+@pytest.mark.asyncio
+async def test_fetch_offline(event_loop, tmpdir, monkeypatch):
+    cache = ResponseCache(str(tmpdir), offline=True)
+    monkeypatch.setattr(client, 'response_cache', cache)
+    with pytest.raises(NotInCache):
+        await HTTPClient.fetch(URL, event_loop)
+
+    cache.store(URL, 'données'.encode('utf-8'), encoding='utf-8')
+    body, entry, fresh = await HTTPClient.fetch(URL, event_loop)
+    assert not fresh and entry.url == URL
+    assert await HTTPClient.fetch_text(URL, event_loop) == 'données'
+
+
+@pytest.mark.asyncio
+async def test_check_processed_against_db(event_loop, tmpdir, monkeypatch):
+    cache = ResponseCache(str(tmpdir.join('cache')))
+    monkeypatch.setattr(crawl, 'response_cache', cache)
+    monkeypatch.setattr(DBConnection, 'backend', SQLiteBackend({'path': str(tmpdir.join('squawka.sqlite3'))}))
+    monkeypatch.setattr(DBConnection, '_pool', None)
+    PlayerPool.clear()
+    TeamPool.clear()
+    match_url = 'http://la-liga.squawka.com/a-vs-b/01-10-2017/matches'
+    match = Match(match_url, ET.parse('squawka.xml').getroot(), 34267)
+    cache.mark_processed(match_url, 'h1')
+
+    # processed but missing from DB (e.g. a rebuilt DB replayed from the cache): processed again
+    assert await crawl.check_processed(match_url, 34267, 'h1', event_loop) is False
+
+    await match.save(event_loop)
+    with pytest.raises(ContentUnchanged):
+        await crawl.check_processed(match_url, 34267, 'h1', event_loop)
+
+    # processed by an older parser: the stale rows are to be replaced, but are kept until then
+    monkeypatch.setattr(crawl, 'PARSER_VERSION', PARSER_VERSION + 1)
+    assert await crawl.check_processed(match_url, 34267, 'h1', event_loop) is True
+    assert await Match.exists_in_db(event_loop, {'id': 34267})
+
+    # replaced within the transaction writing the new rows
+    num_events = len(await Event.all_values(event_loop, 'match_id'))
+    for eg in match.event_groups:
+        del eg.events[1:]
+    assert await match.save(event_loop, replace=True)
+    num_new_events = sum(len(eg.events) for eg in match.event_groups)
+    assert len(await Event.all_values(event_loop, 'match_id')) == num_new_events < num_events
+    assert not await match.save(event_loop)
+    await DBConnection.close()
+    PlayerPool.clear()
+    TeamPool.clear()
@@ -0,0 +1,44 @@
+import sys
+import xml.etree.ElementTree as ET
+sys.path.append('..')
+
+import pytest
+
+from ..models import Match
+
+np = pytest.importorskip('numpy')
+
+
+def test_columnar_filter_and_count():
+    match = Match('dummy_url', ET.parse('squawka2.xml').getroot(), 34253)
+    passes = match.find_event_group('all_passes').to_columnar()
+    assert len(passes) == len(match.find_event_group('all_passes').events)
+    assert passes.count(player_id=843) == 38
+    assert len(passes.filter(player_id=843)) == 38
+    assert passes.count(player_id=[843, 232]) == 38 + 28
+    assert passes.count_by_player()[232] == 28
+    assert passes.group_by_player()[843].count() == 38
+
+    first_half = [e for e in match.find_event_group('all_passes') if e.player_id == 843 and e.minsec < 45 * 60]
+    assert passes.count(player_id=843, minsec=(0, 45 * 60)) == len(first_half)
+    assert passes.count_by_time_window(15 * 60, player_id=843).sum() == 38
+
+
+def test_columnar_rows():
+    match = Match('dummy_url', ET.parse('squawka2.xml').getroot(), 34253)
+    shots = match.find_event_group('goals_attempts')
+    columnar = shots.to_columnar()
+    for e, row in zip(shots, columnar):
+        assert (row.player_id, row.minsec, row.start_0, row.end_1, row.event_type) == \
+               (e.player_id, e.minsec, e.start_0, e.end_1, e.event_type)
+    assert columnar[0].counterparty_id is None
+
+
+def test_columnar_concat():
+    match = Match('dummy_url', ET.parse('squawka.xml').getroot(), 34267)
+    match2 = Match('dummy_url', ET.parse('squawka2.xml').getroot(), 34253)
+    from ..columnar import ColumnarEventGroup
+    season = ColumnarEventGroup.concat(m.find_event_group('crosses').to_columnar() for m in [match, match2])
+    assert season.count(player_id=9280) == 1
+    assert season.count(player_id=843) == 7
+    assert season.count_by('match_id') == {34253: 54, 34267: 19}
@@ -0,0 +1,63 @@
+import sys
+import asyncio
+sys.path.append('..')
+
+import pytest
+
+from ..dedup import BloomFilter, KnownMatches
+from ..models import Match
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    urls = [f'http://la-liga.squawka.com/match-{i}/matches' for i in range(1000)]
+    bloom.update(urls)
+    assert all(u in bloom for u in urls)
+    false_positives = sum(f'http://la-liga.squawka.com/other-{i}/matches' in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    lookups = []
+
+    async def fake_values_in_db(cls, loop, col, values):
+        lookups.append(list(values))
+        return {v for v in values if v.endswith('in-db')}
+
+    monkeypatch.setattr(Match, 'values_in_db', classmethod(fake_values_in_db))
+    return lookups
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('use_bloom', [False, True])
+async def test_known_matches(event_loop, lookups, use_bloom):
+    known = KnownMatches(use_bloom=use_bloom, capacity=1000, error_rate=0.001)
+    known.known.update(['a-known'])
+    assert await known.filter_new(['a-known', 'b-in-db', 'c', 'd', 'c'], event_loop) == ['c', 'd']
+    assert lookups == [['b-in-db', 'c', 'd']]
+
+    # in flight or known urls are never looked up again
+    assert await known.filter_new(['a-known', 'b-in-db', 'c', 'd'], event_loop) == []
+    assert len(lookups) == 1
+
+    known.mark_done('c', saved=True)
+    known.mark_done('d', saved=False)
+    assert await known.filter_new(['c', 'd'], event_loop) == ['d']
+
+    # dead urls are never looked up nor queued again
+    known.mark_done('d', saved=False, dead=True)
+    assert await known.filter_new(['d'], event_loop) == []
+    assert len(lookups) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_filter_new(event_loop, monkeypatch):
+    async def slow_values_in_db(cls, loop, col, values):
+        await asyncio.sleep(0.01)
+        return set()
+
+    monkeypatch.setattr(Match, 'values_in_db', classmethod(slow_values_in_db))
+    known = KnownMatches(use_bloom=False)
+    results = await asyncio.gather(known.filter_new(['a', 'b'], event_loop), known.filter_new(['b', 'c'], event_loop))
+    assert results == [['a', 'b'], ['c']]
@@ -0,0 +1,71 @@
+import sys
+import datetime
+import xml.etree.ElementTree as ET
+sys.path.append('..')
+
+import pytest
+
+from ..models import Match, MatchRows, DBConnection, PlayerPool, TeamPool
+from ..storage import SQLiteBackend
+from ..export import ParquetExporter, get_season
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+ds = pytest.importorskip('pyarrow.dataset')
+
+
+def test_get_season():
+    assert get_season(datetime.datetime(2017, 10, 1)) == 2017
+    assert get_season(datetime.datetime(2018, 5, 20)) == 2017
+    assert get_season('2018-07-01 15:00:00+01:00') == 2018
+
+
+def test_export_match(tmpdir):
+    exporter = ParquetExporter(str(tmpdir))
+    match = Match('http://laliga.squawka.com/dummy', ET.parse('squawka.xml').getroot(), 34267)
+    path = exporter.export_match(MatchRows(match))
+    assert path == str(tmpdir.join('league_name=laliga', 'season=2017', '34267.parquet'))
+
+    table = pq.read_table(path)
+    assert table.num_rows == sum(len(eg.events) for eg in match.event_groups)
+    assert table.schema.field('start_0').type == pa.float32()
+    assert pa.types.is_dictionary(table.schema.field('event_type').type)
+    assert set(table.column('event_type').to_pylist()) == {e.event_type for eg in match.event_groups for e in eg}
+
+    # exporting again replaces the file, other matches go next to it
+    exporter.export_match(match)
+    exporter.export_match(Match('http://laliga.squawka.com/dummy', ET.parse('squawka2.xml').getroot(), 34253))
+    dataset = ds.dataset(str(tmpdir), format='parquet', partitioning='hive')
+    table = dataset.to_table()
+    assert set(table.column('match_id').to_pylist()) == {34267, 34253}
+    assert set(table.column('league_name').to_pylist()) == {'laliga'}
+
+
+@pytest.mark.asyncio
+async def test_export_from_db(event_loop, tmpdir, monkeypatch):
+    monkeypatch.setattr(DBConnection, 'backend', SQLiteBackend({'path': str(tmpdir.join('squawka.sqlite3'))}))
+    monkeypatch.setattr(DBConnection, '_pool', None)
+    PlayerPool.clear()
+    TeamPool.clear()
+    match = Match('http://laliga.squawka.com/dummy', ET.parse('squawka.xml').getroot(), 34267)
+    await match.save(event_loop)
+
+    exporter = ParquetExporter(str(tmpdir.join('export')))
+    assert await exporter.export_from_db(event_loop, match_ids={34268}) == 0
+    assert await exporter.export_from_db(event_loop) == 1
+    assert await exporter.export_from_db(event_loop) == 0
+    assert await exporter.export_from_db(event_loop, overwrite=True, match_ids={34267}) == 1
+    table = pq.read_table(str(tmpdir.join('export', 'league_name=laliga', 'season=2017', '34267.parquet')))
+    assert table.num_rows == sum(len(eg.events) for eg in match.event_groups)
+    await DBConnection.close()
+    PlayerPool.clear()
+    TeamPool.clear()
+
+
+@pytest.mark.asyncio
+async def test_append_later(event_loop, tmpdir):
+    exporter = ParquetExporter(str(tmpdir))
+    exporter.append_later(Match('http://laliga.squawka.com/dummy', ET.parse('squawka.xml').getroot(), 34267),
+                          event_loop)
+    await exporter.join()
+    assert tmpdir.join('league_name=laliga', 'season=2017', '34267.parquet').check()
@@ -0,0 +1,46 @@
+import sys
+sys.path.append('..')
+
+import shutil
+import pickle
+
+import pytest
+import xml.etree.ElementTree as ET
+
+from ..ingest import get_match_id_from_path, parse_match_file, ingest_files
+from ..models import Match, MatchRows, Event
+from .. import ingest
+
+
+def test_get_match_id_from_path():
+    assert get_match_id_from_path('/archive/la-liga/12345.xml') == 12345
+    assert get_match_id_from_path('archive/2017/squawka-12345.xml') == 12345
+    assert get_match_id_from_path('squawka.xml') is None
+
+
+def test_parse_match_file_returns_picklable_rows(tmpdir):
+    path = str(tmpdir.join('12345.xml'))
+    shutil.copy('squawka.xml', path)
+    rows = parse_match_file(path, 12345, league_name='laliga')
+    assert rows.id == 12345 and rows.url.startswith('file://')
+    expected = list(Match('u', ET.parse('squawka.xml').getroot(), 12345).iter_table_rows())
+    rows = pickle.loads(pickle.dumps(rows))
+    assert [m for m, _ in rows.iter_table_rows()] == [m for m, _ in expected]
+    assert dict(rows.table_rows)[Event] == dict(expected)[Event]
+    assert dict(rows.table_rows)[Match][0]['league_name'] == 'laliga'
+
+
+@pytest.mark.asyncio
+async def test_ingest_files(event_loop, tmpdir, monkeypatch):
+    for name in ['123.xml', '456.xml', 'no-id.xml']:
+        shutil.copy('squawka.xml', str(tmpdir.join(name)))
+    tmpdir.join('789.xml').write('<Error>not ready</Error>')
+    saved = []
+
+    async def fake_save(self, loop):
+        saved.append(self.id)
+
+    monkeypatch.setattr(ingest, 'WRITE_BEHIND', False)
+    monkeypatch.setattr(MatchRows, 'save', fake_save)
+    assert await ingest_files(str(tmpdir), event_loop, num_processes=2, max_in_flight=2) == 2
+    assert sorted(saved) == [123, 456]
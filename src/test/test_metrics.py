@@ -0,0 +1,65 @@
+import sys
+sys.path.append('..')
+
+import asyncio
+
+import pytest
+
+from .. import metrics
+from ..metrics import Registry, handle_scrape
+
+
+def test_render_counter_and_gauge():
+    registry = Registry()
+    saved = registry.counter('saved_rows_total', 'Rows saved.')
+    saved.inc(3, table='event')
+    saved.inc(table='event')
+    saved.inc(2, table='player')
+    registry.gauge('queue_depth', 'Queue depth.', lambda: 7)
+
+    text = registry.render()
+    assert '# TYPE saved_rows_total counter' in text
+    assert 'saved_rows_total{table="event"} 4' in text
+    assert 'saved_rows_total{table="player"} 2' in text
+    assert '# TYPE queue_depth gauge' in text
+    assert 'queue_depth 7' in text
+    assert registry.counter('saved_rows_total', 'Rows saved.') is saved
+
+
+def test_histogram_buckets():
+    registry = Registry()
+    h = registry.histogram('fetch_seconds', 'Fetch time.', buckets=(.1, 1, float('inf')))
+    for v in (.05, .5, .5, 5):
+        h.observe(v)
+    with h.time():
+        pass
+
+    text = registry.render()
+    assert 'fetch_seconds_bucket{le="0.1"} 2' in text
+    assert 'fetch_seconds_bucket{le="1"} 4' in text
+    assert 'fetch_seconds_bucket{le="+Inf"} 5' in text
+    assert 'fetch_seconds_count 5' in text
+    assert h.get_count() == 5
+    assert registry.snapshot()['fetch_seconds']['value']['count'] == 5
+
+
+@pytest.mark.asyncio
+async def test_scrape(event_loop, monkeypatch):
+    # a registry of its own, as the gauges of the global one would open the real work queue
+    registry = Registry()
+    registry.counter('squawka_matches_total', 'Matches processed, per result.').inc(result='saved')
+    monkeypatch.setattr(metrics, 'registry', registry)
+    server = await asyncio.start_server(handle_scrape, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert response.startswith(b'HTTP/1.1 200 OK')
+    assert b'# TYPE squawka_matches_total counter' in response
+    assert b'squawka_matches_total{result="saved"} 1' in response
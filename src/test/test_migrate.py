@@ -0,0 +1,39 @@
+import sys
+sys.path.append('..')
+
+import pytest
+
+from ..migrate import split_statements, load_migrations, migrate, get_schema_version
+from ..storage import SQLiteBackend, SQLitePool
+
+
+def test_split_statements():
+    sql = "-- a comment; with a semicolon\ncreate index `a` on `t` (`x`);\n\nalter table `t`\n  add `y` int;\n"
+    assert split_statements(sql) == ['create index `a` on `t` (`x`)', 'alter table `t`\n  add `y` int']
+    assert split_statements('-- nothing to do here\n') == []
+
+
+def test_load_migrations():
+    mysql, sqlite = load_migrations('mysql'), load_migrations('sqlite')
+    assert [m.version for m in mysql] == [m.version for m in sqlite] == [1, 2, 3]
+    assert mysql[2].statements == ['alter table `event` drop primary key, add primary key (`id`, `match_id`)',
+                                   'alter table `event` partition by hash (`match_id`) partitions 32']
+    assert sqlite[2].statements == []
+
+
+@pytest.mark.asyncio
+async def test_migrate_sqlite(event_loop, tmpdir):
+    backend = SQLiteBackend({})
+    pool = SQLitePool(str(tmpdir.join('squawka.sqlite3')))
+    assert await migrate(pool, backend, target=1) == [1]
+    assert await migrate(pool, backend) == [2, 3]
+    assert await migrate(pool, backend) == []
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            assert await get_schema_version(cur) == 3
+            await cur.execute("EXPLAIN QUERY PLAN SELECT COUNT(*) FROM `match` WHERE `url` = ?", ('x',))
+            assert 'idx_match_url' in str(await cur.fetchall())
+            await cur.execute("EXPLAIN QUERY PLAN SELECT * FROM `event` WHERE `player_id` = ? AND `match_id` = ?",
+                              (1, 2))
+            assert 'idx_event_player_match' in str(await cur.fetchall())
+    pool.close()
@@ -5,7 +5,7 @@ from pytz import timezone as tz
 import xml.etree.ElementTree as ET
 sys.path.append('..')
 
-from ..models import Match
+from ..models import Match, Event, Pass, Offside
 
 
 # Barcelona 3 - 0 Las Palmas on 2017-10-01
@@ -105,4 +105,39 @@ def test_get_unique_event_attr():
     root = tree.getroot()
     match = Match('dummy_url', root, 34267)
     attr_cnt = defaultdict(int)
-    [attr_cnt.update({a: attr_cnt[a]+1}) for eg in match.event_groups for e in eg for a in e.__dict__.keys()]
+    [attr_cnt.update({a: attr_cnt[a]+1}) for eg in match.event_groups for e in eg for a in Event.fields
+     if getattr(e, a) is not None]
+
+
+def test_parse_event_flags_and_block_location():
+    tree = ET.parse('squawka.xml')
+    root = tree.getroot()
+    match = Match('dummy_url', root, 34267)
+    first_pass = match.find_event_group('all_passes')[0]
+    assert first_pass.k is True
+    assert first_pass.throw_ins is False
+    assert match.find_event_group('goal_keeping')[0].headed is False
+    assert match.find_event_group('blocked_events')[0].start == (69.4, 5.8)
+
+
+def test_event_slot_layouts():
+    tree = ET.parse('squawka.xml')
+    root = tree.getroot()
+    match = Match('dummy_url', root, 34267)
+    first_pass = match.find_event_group('all_passes')[0]
+    assert 'gy' not in Pass.layout() and 'start' not in Pass.layout()
+    assert first_pass.gy is None and first_pass._sparse is None
+    assert first_pass.start == (first_pass.start_0, first_pass.start_1)
+
+    # attributes out of the layout of an event type are kept aside, only when set
+    offside = match.find_event_group('offside')[0]
+    assert 'action_type' not in Offside.layout() and offside.action_type is None
+    offside.action_type = 'x'
+    assert offside.action_type == 'x' and offside._sparse == {'action_type': 'x'}
+    offside.action_type = None
+    assert offside.action_type is None and offside._sparse == {}
+
+    # repeated values are shared by the events
+    minsecs = {}
+    for e in match.find_event_group('all_passes'):
+        assert minsecs.setdefault(e.minsec, e.minsec) is e.minsec
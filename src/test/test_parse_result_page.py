@@ -1,6 +1,11 @@
 import sys
+import asyncio
 sys.path.append('..')
 
+import pytest
+from bs4 import BeautifulSoup
+
+from .. import crawl
 from ..crawl import ResultPage
 
 
@@ -20,3 +25,74 @@ def test_parse_league_id_from_result_page_url():
 def test_parse_season_from_result_page_url():
     entry_page = ResultPage('http://www.squawka.com/match-results?ctl=-1_s2017', soup='dummy')
     assert entry_page.season == '2017'
+
+
+def _result_page_html(pg_num, max_pg_num):
+    matches = ''.join(f'<td class="match-centre"><a href="http://la-liga.squawka.com/m{pg_num}-{i}/matches">'
+                      f'Match Centre</a></td>' for i in range(3))
+    last = f'<a class="pageing_text_arrow" href="http://www.squawka.com/match-results?ctl=-1_s2017&pg={max_pg_num}">' \
+           f'Last</a>'
+    return f'<html><body><table><tr>{matches}</tr></table>{last}</body></html>'
+
+
+def test_fast_path_same_as_soup():
+    url = 'http://www.squawka.com/match-results?ctl=-1_s2017'
+    html = _result_page_html(1, 25).replace('</body>', '<script>var s = "<td class=match-centre><a href=x>";</script>'
+                                                       '<table><td class="odd match-centre">unclosed'
+                                                       '<td class="match-centre"><a href="a?x=1&amp;y=2">y</a></td>'
+                                                       '</td></table><a class="pageing_text_arrow" href="pg=2">Next</a>'
+                                                       '</body>')
+    page, soup_page = ResultPage(url, html), ResultPage(url, soup=BeautifulSoup(html, 'html.parser'))
+    assert page.soup is None
+    assert page.get_match_urls() == soup_page.get_match_urls()
+    assert page.get_match_urls()[-2:] == ['a?x=1&y=2', 'a?x=1&y=2']
+    assert page.get_max_page_num() == soup_page.get_max_page_num() == 25
+    assert ResultPage(url, '<html></html>').get_max_page_num() == 1
+
+
+def test_url_components_are_cached():
+    page = ResultPage('http://www.squawka.com/match-results?ctl=-1_s2017', soup='dummy')
+    assert page.url is page.url == 'http://www.squawka.com/match-results?ctl=-1_s2017&pg=1'
+    assert page.league_id is page.league_id
+    assert page.get_page_url(3) == 'http://www.squawka.com/match-results?ctl=-1_s2017&pg=3'
+
+
+@pytest.mark.asyncio
+async def test_produce_matches_in_parallel(event_loop, monkeypatch):
+    in_flight, max_in_flight, enqueued = [0], [0], []
+
+    async def fake_get_result_page_content(url, loop):
+        in_flight[0] += 1
+        max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return _result_page_html(int(url.split('pg=')[1]), 10)
+
+    async def fake_enqueue_matches(match_urls, loop, one_off=False):
+        enqueued.extend(match_urls)
+
+    monkeypatch.setattr(crawl, 'get_result_page_content', fake_get_result_page_content)
+    monkeypatch.setattr(crawl, 'enqueue_matches', fake_enqueue_matches)
+    await crawl.produce_matches('http://www.squawka.com/match-results?ctl=-1_s2017&pg=1', event_loop,
+                                concurrency=3, page_rate=1000)
+    assert len(enqueued) == 10 * 3
+    assert len(set(enqueued)) == 10 * 3
+    assert max_in_flight[0] == 3
+
+
+@pytest.mark.asyncio
+async def test_discover_matches(event_loop, monkeypatch):
+    enqueued = []
+
+    async def fake_get_result_page_content(url, loop):
+        return _result_page_html(int(url.split('pg=')[1]), 4)
+
+    async def fake_enqueue_matches(match_urls, loop, one_off=False):
+        enqueued.extend(match_urls)
+
+    monkeypatch.setattr(crawl, 'get_result_page_content', fake_get_result_page_content)
+    monkeypatch.setattr(crawl, 'enqueue_matches', fake_enqueue_matches)
+    monkeypatch.setattr(crawl, 'queue', asyncio.Queue())
+    await crawl.discover_matches(['http://www.squawka.com/match-results?ctl=-1_s2017&pg=1'], event_loop)
+    assert len(set(enqueued)) == 4 * 3
+    assert crawl.queue.get_nowait() is None
@@ -0,0 +1,48 @@
+import sys
+sys.path.append('..')
+
+import pytest
+import xml.etree.ElementTree as ET
+
+from ..models import Match, MatchRows
+from ..workqueue import WorkQueue
+from .. import crawl
+
+
+@pytest.fixture
+def saved(monkeypatch, tmpdir):
+    saved = []
+
+    async def fake_save(self, loop, replace=False):
+        saved.append((type(self), self.id))
+
+    async def fake_get_match_data(match_url, loop):
+        if match_url.endswith('not-ready'):
+            return 3, b'<Error>not ready</Error>', None, False
+        with open('squawka.xml', 'rb') as f:
+            return int(match_url[-1]), f.read(), None, False
+
+    async def fake_get_match(match_url, loop):
+        match_id, data, _, _ = await fake_get_match_data(match_url, loop)
+        root = ET.fromstring(data)
+        return None if root.tag == 'Error' else Match(match_url, root, match_id)
+
+    monkeypatch.setattr(crawl, 'queue', WorkQueue(str(tmpdir.join('queue.sqlite3')), poll_interval=0.01))
+    monkeypatch.setattr(crawl, 'WRITE_BEHIND', False)
+    monkeypatch.setattr(crawl, 'get_match_data', fake_get_match_data)
+    monkeypatch.setattr(crawl, 'get_match', fake_get_match)
+    monkeypatch.setattr(Match, 'save', fake_save)
+    monkeypatch.setattr(MatchRows, 'save', fake_save)
+    return saved
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('executor_kind, saved_type', [('process', MatchRows), ('thread', MatchRows), (None, Match)])
+async def test_consume_matches_in_pipeline(event_loop, saved, executor_kind, saved_type):
+    for url in ['http://la-liga.squawka.com/m1', 'http://la-liga.squawka.com/m2',
+                'http://la-liga.squawka.com/not-ready', None]:
+        await crawl.queue.put(url)
+    await crawl.consume_matches(event_loop, num_workers=2, executor_kind=executor_kind, num_parsers=2)
+    assert sorted(saved) == [(saved_type, 1), (saved_type, 2)]
+    # saved ones are acked, the one not ready is to be retried
+    assert crawl.queue.qsize() == 1
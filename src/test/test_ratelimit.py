@@ -0,0 +1,73 @@
+import sys
+sys.path.append('..')
+
+from ..ratelimit import TokenBucket, HostRateLimiter, CircuitBreaker
+from .helpers import FakeClock
+
+
+def test_token_bucket_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, capacity=2, clock=clock)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 2
+    clock.now += 2
+    assert bucket.try_acquire() == 0
+
+
+def test_token_bucket_adapts():
+    bucket = TokenBucket(rate=1, capacity=1, min_rate=0.25, max_rate=1.2)
+    bucket.slow_down()
+    bucket.slow_down()
+    bucket.slow_down()
+    assert bucket.rate == 0.25
+    [bucket.speed_up() for _ in range(20)]
+    assert bucket.rate == 1.2
+
+
+def test_one_bucket_per_host():
+    limiter = HostRateLimiter(rate=1, capacity=1, min_rate=0.1, max_rate=1, slow_response_secs=5)
+    assert limiter.bucket('http://www.squawka.com/match-results?ctl=-1_s2017&pg=1') is \
+        limiter.bucket('http://www.squawka.com/match-results?ctl=-1_s2017&pg=2')
+    limiter.report('http://s3-irl-laliga.squawka.com/dp/ingame/34267', elapsed=30)
+    assert limiter.bucket('http://s3-irl-laliga.squawka.com/dp/ingame/1').rate == 0.5
+    assert limiter.bucket('http://www.squawka.com/match-results').rate == 1
+
+
+def test_circuit_breaker():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, max_reset_timeout=25, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.try_pass() == 0
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert breaker.try_pass() == 10
+
+    # a single trial request once reset_timeout has passed
+    clock.now += 10
+    assert breaker.state == 'half_open'
+    assert breaker.try_pass() == 0
+    assert breaker.try_pass() > 0
+
+    # the trial fails, so the circuit opens for twice as long
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.reset_timeout == 20
+    clock.now += 20
+    assert breaker.try_pass() == 0
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.reset_timeout == 10
+
+
+def test_one_breaker_per_host():
+    limiter = HostRateLimiter(failure_threshold=2)
+    failing = 'http://s3-irl-laliga.squawka.com/dp/ingame/34267'
+    limiter.report(failing, ok=False)
+    limiter.report(failing, ok=False, failed=True)
+    assert limiter.breaker(failing).state == 'open'
+    assert limiter.breaker('http://www.squawka.com/match-results').state == 'closed'
+
+    # e.g. a 404 slows down requests to the host but isn't a failure of the host
+    limiter.report('http://www.squawka.com/match-results', ok=False, failed=False)
+    limiter.report('http://www.squawka.com/match-results', ok=False, failed=False)
+    assert limiter.breaker('http://www.squawka.com/match-results').state == 'closed'
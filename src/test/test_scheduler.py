@@ -0,0 +1,96 @@
+import sys
+sys.path.append('..')
+
+import asyncio
+import datetime
+
+import pytest
+
+from ..scheduler import Watermarks, poll_result_pages
+from .. import scheduler, crawl
+
+
+class FakeSite:
+    """Result pages of 3 matches each, newest first."""
+    def __init__(self, num_matches):
+        self.match_urls = []
+        self.fetched = []
+        self.failing = set()
+        self.in_flight = self.max_in_flight = 0
+        self.add_matches(num_matches)
+
+    def add_matches(self, n):
+        latest = datetime.date(2017, 10, 1) + datetime.timedelta(days=len(self.match_urls))
+        new_urls = [f'http://la-liga.squawka.com/spanish-la-liga/{(latest + datetime.timedelta(days=i)):%d-%m-%Y}/'
+                    f'm{len(self.match_urls) + i}/matches' for i in range(n)]
+        self.match_urls = new_urls[::-1] + self.match_urls
+
+    async def get_result_page_content(self, url, loop):
+        self.fetched.append(url)
+        pg_num = int(url.split('pg=')[1])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        if pg_num in self.failing:
+            raise ValueError(f'page {pg_num} is gone')
+        matches = ''.join(f'<td class="match-centre"><a href="{u}">Match Centre</a></td>'
+                          for u in self.match_urls[(pg_num - 1) * 3:pg_num * 3])
+        max_pg_num = (len(self.match_urls) + 2) // 3
+        last = f'<a class="pageing_text_arrow" href="http://www.squawka.com/match-results?ctl=-1_s2017&pg=' \
+               f'{max_pg_num}">Last</a>'
+        return f'<html><body><table><tr>{matches}</tr></table>{last}</body></html>'
+
+
+@pytest.fixture
+def site(monkeypatch):
+    site = FakeSite(15)
+    known = set()
+
+    async def fake_enqueue_matches(match_urls, loop, one_off=False):
+        new_urls = [u for u in match_urls if u not in known]
+        known.update(new_urls)
+        return new_urls
+
+    for module in (scheduler, crawl):
+        monkeypatch.setattr(module, 'get_result_page_content', site.get_result_page_content)
+        monkeypatch.setattr(module, 'enqueue_matches', fake_enqueue_matches)
+    return site
+
+
+@pytest.mark.asyncio
+async def test_poll_result_pages_stops_at_known_matches_and_watermark(event_loop, site, tmpdir):
+    watermarks = Watermarks(str(tmpdir.join('state.sqlite3')))
+    url = 'http://www.squawka.com/match-results?ctl=-1_s2017&pg=1'
+
+    # the first poll goes through all pages whatever max_pages, concurrently
+    assert await poll_result_pages(url, event_loop, watermarks, max_pages=2) == 5
+    assert site.max_in_flight > 1
+    assert watermarks.get('-1', '2017') == datetime.date(2017, 10, 15)
+
+    # nothing new, a single page
+    assert await poll_result_pages(url, event_loop, watermarks, max_pages=None) == 1
+
+    # a few new matches, the first page reaches back to the watermark
+    site.add_matches(2)
+    assert await poll_result_pages(url, event_loop, watermarks, max_pages=None) == 1
+    assert watermarks.get('-1', '2017') == datetime.date(2017, 10, 17)
+
+    # a whole page of new matches, the next one has no new match
+    site.add_matches(4)
+    assert await poll_result_pages(url, event_loop, watermarks, max_pages=None) == 2
+    assert len(site.fetched) == 5 + 1 + 1 + 2
+
+
+@pytest.mark.asyncio
+async def test_first_poll_sets_no_watermark_if_a_page_failed(event_loop, site, tmpdir):
+    watermarks = Watermarks(str(tmpdir.join('state.sqlite3')))
+    url = 'http://www.squawka.com/match-results?ctl=-1_s2017&pg=1'
+    site.failing.add(4)
+    assert await poll_result_pages(url, event_loop, watermarks, max_pages=None) == 5
+    assert watermarks.get('-1', '2017') is None
+
+    # so the next poll goes through all pages again
+    site.failing.clear()
+    assert await poll_result_pages(url, event_loop, watermarks, max_pages=None) == 5
+    assert watermarks.get('-1', '2017') == datetime.date(2017, 10, 15)
@@ -0,0 +1,71 @@
+import sys
+import xml.etree.ElementTree as ET
+sys.path.append('..')
+
+import pytest
+
+from ..models import Match, Team, Player, Event, DBConnection, PlayerPool, TeamPool, save_in_transaction
+from ..storage import SQLiteBackend, MySQLBackend, get_backend
+
+
+def test_get_backend():
+    assert isinstance(get_backend({'host': 'localhost'}), MySQLBackend)
+    assert isinstance(get_backend({'backend': 'sqlite', 'path': ':memory:'}), SQLiteBackend)
+
+
+def test_sqlite_upsert_sql():
+    backend = SQLiteBackend({})
+    sql = backend.upsert_sql('team', ('name', 'short_name', 'id'), ('id',))
+    assert sql == "INSERT INTO `team` (`name`,`short_name`,`id`) VALUES (?,?,?) " \
+                  "ON CONFLICT (`id`) DO UPDATE SET `name`=excluded.`name`,`short_name`=excluded.`short_name`"
+    assert backend.upsert_sql('event', ('match_id', 'minsec'), ('id',)) == \
+        "INSERT INTO `event` (`match_id`,`minsec`) VALUES (?,?)"
+
+
+@pytest.fixture
+def sqlite_db(tmpdir, monkeypatch):
+    monkeypatch.setattr(DBConnection, 'backend', SQLiteBackend({'path': str(tmpdir.join('squawka.sqlite3'))}))
+    monkeypatch.setattr(DBConnection, '_pool', None)
+    PlayerPool.clear()
+    TeamPool.clear()
+    yield DBConnection
+    PlayerPool.clear()
+    TeamPool.clear()
+
+
+async def count(loop, table):
+    pool = await DBConnection.get_pool(loop)
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f'SELECT COUNT(*) FROM `{table}`')
+            r, = await cur.fetchone()
+            return r
+
+
+@pytest.mark.asyncio
+async def test_save_match_into_sqlite(event_loop, sqlite_db):
+    match = Match('http://laliga.squawka.com/dummy', ET.parse('squawka.xml').getroot(), 34267)
+    assert not await Match.exists_in_db(event_loop, {'id': 34267})
+
+    await match.save(event_loop)
+    assert await Match.exists_in_db(event_loop, {'id': 34267})
+    assert await count(event_loop, 'player') == 36
+    assert await count(event_loop, 'event') == sum(len(eg.events) for eg in match.event_groups)
+    assert await Team.values_in_db(event_loop, 'id', [73, 525, 1]) == {73, 525}
+
+    # saving again is a no-op, upserting again updates rows in place
+    await match.save(event_loop)
+    PlayerPool.clear()
+    await save_in_transaction(event_loop, [(Player, [p.player.get_row() for p in match.participants])])
+    assert await count(event_loop, 'player') == 36
+    assert await count(event_loop, 'event') == sum(len(eg.events) for eg in match.event_groups)
+    await DBConnection.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_transaction_rolled_back(event_loop, sqlite_db):
+    rows = [{'name': 'Barcelona', 'short_name': 'Barcelona', 'id': 73}]
+    with pytest.raises(Exception):
+        await save_in_transaction(event_loop, [(Team, rows), (Event, [{'no_such_col': 1}])])
+    assert await count(event_loop, 'team') == 0
+    await DBConnection.close()
@@ -0,0 +1,34 @@
+import sys
+import xml.etree.ElementTree as ET
+sys.path.append('..')
+
+from ..models import Match
+from ..stream import MatchStreamParser
+
+
+def _stream_parse(file_name, match_id, chunk_size=4096):
+    parser = MatchStreamParser('dummy_url', match_id)
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            parser.feed(chunk)
+    return parser.close()
+
+
+def test_stream_parse_same_as_tree_parse():
+    for file_name, match_id in [('squawka.xml', 34267), ('squawka2.xml', 34253)]:
+        streamed = _stream_parse(file_name, match_id)
+        match = Match('dummy_url', ET.parse(file_name).getroot(), match_id)
+        assert streamed.summary == match.summary
+        assert streamed.kickoff_time == match.kickoff_time
+        assert (streamed.home_team.id, streamed.away_team.id) == (match.home_team.id, match.away_team.id)
+        assert [p.player.id for p in streamed.participants] == [p.player.id for p in match.participants]
+        assert all(p.match is streamed for p in streamed.participants)
+        assert [eg.name for eg in streamed.event_groups] == [eg.name for eg in match.event_groups]
+        for seg, eg in zip(streamed.event_groups, match.event_groups):
+            assert [repr(e) for e in seg] == [repr(e) for e in eg]
+
+
+def test_stream_parse_not_ready():
+    parser = MatchStreamParser('dummy_url', 1)
+    parser.feed(b'<Error>Data not ready</Error>')
+    assert parser.close() is None
@@ -1,7 +1,13 @@
 import sys
 sys.path.append('..')
 
-from ..utils import flatten
+import asyncio
+
+import pytest
+import aiohttp
+
+from ..utils import flatten, retry, parse_retry_after
+from ..error import RetryableHTTPError, ExceedsMaxRetry
 
 
 def test_flatten():
@@ -13,3 +19,42 @@ def test_flatten():
 
     z = [[[1, 2], [3, 4]], [[5, 6], [7, 8 ]]]
     assert flatten(z) == [[1, 2], [3, 4], [5, 6], [7, 8]]
+
+
+@pytest.mark.asyncio
+async def test_retry_with_backoff(event_loop):
+    sleeps, calls = [], []
+
+    async def fake_sleep(secs):
+        sleeps.append(secs)
+
+    @retry(max_retry=4, sec_to_sleep=1, max_sec_to_sleep=3, sleep=fake_sleep)
+    async def flaky(errors):
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    errors = [asyncio.TimeoutError(), aiohttp.ClientConnectionError(), RetryableHTTPError('u', 503, retry_after=10)]
+    assert await flaky(errors) == 'ok'
+    assert len(calls) == 4
+    assert 0 <= sleeps[0] <= 1 and 0 <= sleeps[1] <= 2 and sleeps[2] == 10
+
+    # not retryable
+    calls.clear()
+    with pytest.raises(ValueError):
+        await flaky([ValueError()])
+    assert len(calls) == 1
+
+    # no sleep after the last trial
+    sleeps.clear()
+    with pytest.raises(ExceedsMaxRetry):
+        await flaky([asyncio.TimeoutError()] * 4)
+    assert len(sleeps) == 3 and max(sleeps) <= 3
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('soon') is None
@@ -0,0 +1,75 @@
+import sys
+sys.path.append('..')
+
+import pytest
+
+from ..workqueue import WorkQueue
+from .helpers import FakeClock
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(1000.0)
+
+
+@pytest.fixture
+def make_queue(tmpdir, clock):
+    def _make_queue(**kwargs):
+        return WorkQueue(str(tmpdir.join('queue.sqlite3')), visibility_timeout=60, max_attempts=2, retry_delay=10,
+                         poll_interval=0.01, clock=clock, **kwargs)
+    return _make_queue
+
+
+URL_OLD = 'http://la-liga.squawka.com/spanish-la-liga/20-09-2017/r-madrid-vs-betis/matches'
+URL_NEW = 'http://la-liga.squawka.com/spanish-la-liga/01-10-2017/barcelona-vs-las-palmas/matches'
+URL_NO_DATE = 'http://la-liga.squawka.com/m1'
+
+
+@pytest.mark.asyncio
+async def test_newest_first_and_dedup(event_loop, make_queue):
+    q = make_queue()
+    for url in [URL_NO_DATE, URL_OLD, URL_NEW, URL_OLD, None]:
+        await q.put(url)
+    assert q.qsize() == 3
+    assert [await q.get() for _ in range(4)] == [URL_NEW, URL_OLD, URL_NO_DATE, None]
+
+
+@pytest.mark.asyncio
+async def test_visibility_timeout_nack_and_dead(event_loop, make_queue, clock):
+    q = make_queue()
+    await q.put(URL_NEW)
+    assert q.get_nowait() == URL_NEW
+    assert q.get_nowait() is None
+
+    # not acked within the visibility timeout, so it's handed out again
+    clock.now += 61
+    assert q.get_nowait() == URL_NEW
+
+    # tried max_attempts times
+    assert q.nack(URL_NEW)
+    assert q.dead_urls() == [URL_NEW]
+    clock.now += 11
+    assert q.get_nowait() is None
+    assert q.qsize() == 0
+
+
+@pytest.mark.asyncio
+async def test_ack(event_loop, make_queue):
+    q = make_queue()
+    await q.put(URL_NEW)
+    q.ack(q.get_nowait())
+    await q.put(None)
+    assert await q.get() is None
+    assert q.qsize() == 0
+
+
+def test_resume_after_restart(make_queue):
+    q = make_queue()
+    q.put_nowait(URL_OLD)
+    q.put_nowait(URL_NEW)
+    assert q.get_nowait() == URL_NEW
+    q.close()
+
+    q = make_queue()
+    assert q.release_leased() == 1
+    assert [q.get_nowait(), q.get_nowait()] == [URL_NEW, URL_OLD]
@@ -1,8 +1,14 @@
 import re
 import random
 import asyncio
+import datetime
+import functools
+from email.utils import parsedate_to_datetime
 
-from .error import ExceedsMaxRetry
+import aiohttp
+
+from .error import ExceedsMaxRetry, RetryableHTTPError
+from .metrics import retries
 
 
 def flatten(x):
@@ -31,16 +37,60 @@ def get_league_name(match_url, short=True):
     return _correction.get(league_name) or league_name
 
 
-def retry(max_retry, sec_to_sleep=60, logger=None):
+def get_match_date(match_url):
+    """The date in a match url, e.g. 01-10-2017 in
+    http://la-liga.squawka.com/spanish-la-liga/01-10-2017/barcelona-vs-las-palmas/matches, None if there is none."""
+    m = re.search(r'/(\d{2})-(\d{2})-(\d{4})/', match_url)
+    try:
+        return datetime.date(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_retry_after(value):
+    """Seconds to wait as told by a Retry-After header, either delay-seconds or an HTTP-date."""
+    if not value:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    try:
+        return max(0, (parsedate_to_datetime(value) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt, base, cap):
+    """Exponential backoff with full jitter: a uniformly random delay up to min(cap, base * 2 ** attempt)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+RETRYABLE_EXCEPTIONS = (asyncio.TimeoutError, aiohttp.ClientError, RetryableHTTPError)
+
+
+def retry(max_retry, sec_to_sleep=60, logger=None, max_sec_to_sleep=None, exceptions=RETRYABLE_EXCEPTIONS,
+          sleep=asyncio.sleep):
+    """Retries the decorated coroutine function on exceptions, sleeping backoff(i, sec_to_sleep, max_sec_to_sleep)
+    after the i-th failure, or longer if the server asked for it with Retry-After. sleep is the coroutine function
+    it sleeps with."""
+    max_sec_to_sleep = max_sec_to_sleep or sec_to_sleep * 2 ** max_retry
+
     def decorator(func):
+        @functools.wraps(func)
         async def decorated(*args, **kwargs):
             for i in range(max_retry):
                 try:
                     return await func(*args, **kwargs)
-                except asyncio.TimeoutError as e:
+                except exceptions as e:
                     if logger is not None:
-                        logger.warn('Timeout when calling {}(num_trials={}). err_msg: {}'.format(func.__name__, i+1, e))
-                    await asyncio.sleep(jitter(sec_to_sleep))
+                        logger.warn('{} when calling {}(num_trials={}). err_msg: {}'.format(
+                            e.__class__.__name__, func.__name__, i+1, e))
+                    if i + 1 < max_retry:
+                        retries.inc(function=func.__name__)
+                        delay = backoff(i, sec_to_sleep, max_sec_to_sleep)
+                        retry_after = getattr(e, 'retry_after', None)
+                        await sleep(delay if retry_after is None else max(delay, retry_after))
             raise ExceedsMaxRetry('Calling {} exceeds max retry times {}.'.format(func.__name__, max_retry))
         return decorated
     return decorator
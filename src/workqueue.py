@@ -0,0 +1,136 @@
+import time
+import asyncio
+import sqlite3
+
+from .utils import get_match_date
+from .settings import logger, QUEUE_DB_PATH, QUEUE_VISIBILITY_TIMEOUT, QUEUE_MAX_ATTEMPTS, QUEUE_RETRY_DELAY, \
+    QUEUE_POLL_INTERVAL
+
+
+class WorkQueue:
+    """Durable queue of match urls in a SQLite file, with the put / get / task_done interface of asyncio.Queue
+    plus ack / nack, so discovered but unprocessed urls survive a crash or redeploy.
+
+    A url is put once (dedup on url) with the match date as its priority, newest first. get leases it for
+    visibility_timeout seconds, after which it's handed out again unless acked (done, deleted) or nacked
+    (handed out again after a delay). A url leased max_attempts times without an ack is dead and stays in the
+    table for inspection. As in asyncio.Queue, None is the stop signal, but it's kept in memory only: once
+    it's put, get returns None as soon as there's no url ready instead of waiting for one."""
+    def __init__(self, path=QUEUE_DB_PATH, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT,
+                 max_attempts=QUEUE_MAX_ATTEMPTS, retry_delay=QUEUE_RETRY_DELAY, poll_interval=QUEUE_POLL_INTERVAL,
+                 clock=time.time):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._conn = None
+        self._stopped = False
+        self._put_event = None
+
+    def __repr__(self):
+        return f'{self.__class__.__name__} ({self.path})'
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS `match_queue` ('
+                               '`url` TEXT PRIMARY KEY, '
+                               '`priority` INTEGER NOT NULL DEFAULT 0, '
+                               "`state` TEXT NOT NULL DEFAULT 'ready', "  # ready, leased or dead
+                               '`attempts` INTEGER NOT NULL DEFAULT 0, '
+                               '`visible_at` REAL NOT NULL DEFAULT 0, '
+                               '`enqueued_at` REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS `idx_match_queue_next` '
+                               'ON `match_queue` (`state`, `priority` DESC, `enqueued_at`)')
+        return self._conn
+
+    @property
+    def put_event(self):
+        if self._put_event is None:
+            self._put_event = asyncio.Event()
+        return self._put_event
+
+    @staticmethod
+    def get_priority(url):
+        match_date = get_match_date(url)
+        return 0 if match_date is None else match_date.toordinal()
+
+    def put_nowait(self, url):
+        if url is None:
+            self._stopped = True
+        else:
+            self.conn.execute('INSERT OR IGNORE INTO `match_queue` (`url`, `priority`, `enqueued_at`) VALUES (?, ?, ?)',
+                              (url, self.get_priority(url), self._clock()))
+        self.put_event.set()
+
+    async def put(self, url):
+        self.put_nowait(url)
+
+    def get_nowait(self):
+        """Leases the next url due, returns None if there is none."""
+        now = self._clock()
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.execute("UPDATE `match_queue` SET `state` = 'dead' "
+                              "WHERE `state` = 'leased' AND `visible_at` <= ? AND `attempts` >= ?",
+                              (now, self.max_attempts))
+            row = self.conn.execute('SELECT `url` FROM `match_queue` '
+                                    "WHERE `state` IN ('ready', 'leased') AND `visible_at` <= ? "
+                                    'ORDER BY `priority` DESC, `enqueued_at` LIMIT 1', (now,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE `match_queue` SET `state` = 'leased', `attempts` = `attempts` + 1, "
+                              '`visible_at` = ? WHERE `url` = ?', (now + self.visibility_timeout, row[0]))
+        return row[0]
+
+    async def get(self):
+        while True:
+            url = self.get_nowait()
+            if url is not None or self._stopped:
+                return url
+            self.put_event.clear()
+            try:
+                await asyncio.wait_for(self.put_event.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def task_done(self):
+        """Nothing to do, a url is done once it's acked."""
+
+    def ack(self, url):
+        self.conn.execute('DELETE FROM `match_queue` WHERE `url` = ?', (url,))
+
+    def nack(self, url, delay=None):
+        """Hands url out again after delay seconds, unless it has been tried max_attempts times already. Returns
+        whether url is dead."""
+        delay = self.retry_delay if delay is None else delay
+        self.conn.execute("UPDATE `match_queue` SET `visible_at` = ?, "
+                          "`state` = CASE WHEN `attempts` >= ? THEN 'dead' ELSE 'ready' END WHERE `url` = ?",
+                          (self._clock() + delay, self.max_attempts, url))
+        row = self.conn.execute('SELECT `state` FROM `match_queue` WHERE `url` = ?', (url,)).fetchone()
+        return row is not None and row[0] == 'dead'
+
+    def dead_urls(self):
+        return [r[0] for r in self.conn.execute("SELECT `url` FROM `match_queue` WHERE `state` = 'dead'")]
+
+    def release_leased(self):
+        """Makes the urls leased by a previous run that crashed available right away, rather than after their
+        visibility timeout, so that a restart resumes immediately."""
+        n = self.conn.execute("UPDATE `match_queue` SET `state` = 'ready', `visible_at` = 0 "
+                              "WHERE `state` = 'leased'").rowcount
+        if n:
+            logger.info(f'Released {n} urls leased by the previous run of {self}.')
+        return n
+
+    def qsize(self):
+        sql = "SELECT COUNT(*) FROM `match_queue` WHERE `state` IN ('ready', 'leased')"
+        return self.conn.execute(sql).fetchone()[0]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None